@@ -10,6 +10,10 @@ except Exception as e:
 import streamlit as st
 
 from utils.db_orm import init_db
+from utils.email import start_incident_notifier
+from utils.metrics import start_metrics_server
+from utils.triage import start_incident_triage
+from utils.warmup import start_warmup
 
 
 st.set_page_config(
@@ -18,6 +22,10 @@ st.set_page_config(
 )
 
 init_db()
+start_incident_notifier()
+start_incident_triage()
+start_warmup()
+start_metrics_server()
 
 st.title("🏠 VSAT App Homepage")
 st.write("Welcome to the VSAT application.")
@@ -11,6 +11,10 @@ import streamlit as st
 
 from utils.chat_app import ChatApp
 from utils.db_orm import init_db
+from utils.email import start_incident_notifier
+from utils.metrics import start_metrics_server
+from utils.triage import start_incident_triage
+from utils.warmup import get_warmup_status, start_warmup
 
 st.set_page_config(
     page_title="AI Assistant - VSAT App",
@@ -18,6 +22,13 @@ st.set_page_config(
 )
 
 init_db()
+start_incident_notifier()
+start_incident_triage()
+start_warmup()
+start_metrics_server()
+
+if not get_warmup_status()["ready"]:
+    st.sidebar.caption("Warming up the assistant; the first answer may take a little longer.")
 
 chat_app = ChatApp()
 chat_app.run()
@@ -7,21 +7,29 @@ except Exception as e:
     pass
 # ------------------------------------------------------
 
+from datetime import datetime, time, timedelta
+
 import streamlit as st
 
+from utils.chatbot import load_images_json
 from utils.db_crud import (
-    create_incident,
     delete_incident,
     get_incident_by_id,
-    list_incidents,
+    query_incidents,
     resolve_incident,
 )
 from utils.db_orm import init_db
-from utils.email import init_incident_notifier
+from utils.email import start_incident_notifier
+from utils.metrics import start_metrics_server
+from utils.image_store import gallery_path
+from utils.incident_intake import report_incident
 from utils.save_docs import (
     add_resolved_incident_to_vectordb,
     delete_incident_from_vectordb,
 )
+from utils.similar_incidents import load_similar_incidents, start_resolved_incident_backfill
+from utils.triage import start_incident_triage
+from utils.warmup import start_warmup
 
 st.set_page_config(
     page_title="Incident Management - VSAT App",
@@ -30,12 +38,20 @@ st.set_page_config(
 st.title("🚨 Incident Management")
 
 init_db()
+start_incident_notifier()
+start_incident_triage()
+start_warmup()
+start_metrics_server()
+# todo: get actual username
+start_resolved_incident_backfill(username="admin")
 
 # State for dialog
 if "show_dialog" not in st.session_state:
     st.session_state["show_dialog"] = False
 if "selected_incident_id" not in st.session_state:
     st.session_state["selected_incident_id"] = None
+if "incident_page" not in st.session_state:
+    st.session_state["incident_page"] = 1
 
 # Report new incident dialog
 if st.session_state["show_dialog"]:
@@ -60,14 +76,21 @@ if st.session_state["show_dialog"]:
             if missing_fields:
                 st.warning(f"Required field(s) missing: {', '.join(missing_fields)}.")
             else:
-                incident = create_incident(
+                incident, is_new = report_incident(
                     name,
                     description,
                     email,
                     log if log else None,
-                    sla_no_of_hours
+                    sla_no_of_hours,
+                    # todo: get actual username
+                    username="admin"
                 )
-                init_incident_notifier(incident.id)
+                if not is_new:
+                    st.session_state["selected_incident_id"] = incident.id
+                    st.info(f"Folded into open incident '{incident.name}' ({incident.occurrence_count} occurrences).")
+                elif load_similar_incidents(incident):
+                    # Open it right away so the known solutions are visible
+                    st.session_state["selected_incident_id"] = incident.id
                 st.success("Incident reported!")
                 st.session_state["show_dialog"] = False
                 st.rerun()
@@ -84,26 +107,61 @@ with col1:
         st.session_state["show_dialog"] = True
         st.rerun()
 
-# List incidents
-incidents = list_incidents()
+# Filters (any change goes back to the first page)
+def _reset_incident_page():
+    st.session_state["incident_page"] = 1
+
+
+filter_col1, filter_col2, filter_col3 = st.columns([3, 1, 2])
+with filter_col1:
+    search = st.text_input("Search", placeholder="Name, description, log or solution", on_change=_reset_incident_page)
+with filter_col2:
+    status_filter = st.selectbox("Status", ["All", "open", "resolved"], on_change=_reset_incident_page)
+with filter_col3:
+    date_range = st.date_input("Created between", value=(), on_change=_reset_incident_page)
+page_size = 20
+
+# Local calendar days, as aware datetimes; the query converts them to UTC
+created_from = created_to = None
+if len(date_range) >= 1:
+    created_from = datetime.combine(date_range[0], time.min).astimezone()
+if len(date_range) == 2:
+    created_to = (datetime.combine(date_range[1], time.min) + timedelta(days=1)).astimezone()
+
+# List incidents (one page, without logs and solutions)
+incidents, total_incidents = query_incidents(
+    status=None if status_filter == "All" else status_filter,
+    created_from=created_from,
+    created_to=created_to,
+    search=search,
+    page=st.session_state["incident_page"],
+    page_size=page_size,
+)
+page_count = max((total_incidents + page_size - 1) // page_size, 1)
+if st.session_state["incident_page"] > page_count:
+    st.session_state["incident_page"] = page_count
+    st.rerun()
+
 status_icons = {
     "open": "⚠️",
     "resolved": "✅",
 }
 if not incidents:
-    st.info("No incidents reported yet.")
+    if search or status_filter != "All" or date_range:
+        st.info("No incidents match the filters.")
+    else:
+        st.info("No incidents reported yet.")
 else:
     for incident in incidents:
         with st.expander(f"{status_icons.get(incident.status, incident.status)} {incident.name or 'No Name'}", expanded=False):
             st.write(f"**ID:** {incident.id}")
             st.write(f"**Description:** {incident.description}")
-            if incident.solution:
-                st.markdown("**Solution:**")
-                st.write(incident.solution)
             # st.write(f"**Recipient email:** {incident.email}")
             # st.write(f"**Status:** {incident.status}")
             st.write(f"**SLA time (minutes):** {incident.sla_no_of_hours:.2f}")  # minutes for testing purposes
             st.write(f"**Notified:** {'Yes' if incident.notified else 'No'}")
+            if incident.occurrence_count > 1:
+                st.write(f"**Occurrences:** {incident.occurrence_count} (last at {incident.last_occurred_at} UTC)")
             st.write(f"**Created at:** {incident.created_at} UTC")
             st.write(f"**Updated at:** {incident.updated_at} UTC")
             col_a, col_b, col_c, col_d = st.columns(4)
@@ -156,6 +214,19 @@ else:
                     st.warning("Incident deleted.")
                     st.rerun()
 
+    # Pagination
+    prev_col, page_col, next_col = st.columns([1, 3, 1])
+    with prev_col:
+        if st.button("◀ Previous", key="prev_page", disabled=st.session_state["incident_page"] <= 1):
+            st.session_state["incident_page"] -= 1
+            st.rerun()
+    with page_col:
+        st.write(f"Page {st.session_state['incident_page']} of {page_count} ({total_incidents} incidents)")
+    with next_col:
+        if st.button("Next ▶", key="next_page", disabled=st.session_state["incident_page"] >= page_count):
+            st.session_state["incident_page"] += 1
+            st.rerun()
+
 # Incident detail view
 if st.session_state["selected_incident_id"]:
     incident = get_incident_by_id(st.session_state["selected_incident_id"])
@@ -172,10 +243,30 @@ if st.session_state["selected_incident_id"]:
         if incident.solution:
             st.sidebar.markdown("**Solution:**")
             st.sidebar.write(incident.solution)
+        if incident.status != "resolved" and incident.triage_status:
+            st.sidebar.markdown("**AI suggested answer:**")
+            if incident.triage_answer:
+                if incident.triage_status in ("pending", "running"):
+                    st.sidebar.caption("Updating for the latest knowledge base...")
+                st.sidebar.markdown(incident.triage_answer)
+                for image in load_images_json(incident.triage_images_json):
+                    st.sidebar.image(gallery_path(image["path"]), caption=image["name"])
+            elif incident.triage_status == "failed":
+                st.sidebar.warning("AI triage failed; use \"Ask AI assistant\" instead.")
+            else:
+                st.sidebar.info("AI triage in progress...")
+        similar_incidents = load_similar_incidents(incident)
+        if similar_incidents and incident.status != "resolved":
+            st.sidebar.markdown("**Similar resolved incidents:**")
+            for match in similar_incidents:
+                with st.sidebar.expander(f"{match['name']} (similarity {match['score']:.0%})"):
+                    st.write(match["solution"] or "No solution recorded.")
         st.sidebar.write(f"**Status:** {incident.status}")
         st.sidebar.write(f"**SLA time (minutes):** {incident.sla_no_of_hours:.2f}")  # minutes for testing purposes
         st.sidebar.write(f"**Recipient email:** {incident.email}")
         st.sidebar.write(f"**Notified:** {'Yes' if incident.notified else 'No'}")
+        if incident.occurrence_count > 1:
+            st.sidebar.write(f"**Occurrences:** {incident.occurrence_count} (last at {incident.last_occurred_at} UTC)")
         st.sidebar.write(f"**Created at:** {incident.created_at} UTC")
         st.sidebar.write(f"**Updated at:** {incident.updated_at} UTC")
         if incident.status != "resolved":
@@ -0,0 +1,365 @@
+"""
+Bulk incident ingestion from JSONL/CSV files or a live log stream.
+
+    python -m app.utils.bulk_ingest incidents.jsonl history.csv --index-resolved
+    python -m app.utils.bulk_ingest /var/log/nms/alerts.log --follow --email noc@example.com
+
+Records use the incident column names: name, description, email, log,
+sla_no_of_hours, status, solution, created_at (ISO 8601). Log lines that are
+not JSON are grouped by log template, one incident per template and batch.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+from .db_crud import (
+    bulk_create_incidents,
+    find_duplicate_incident,
+    list_existing_incident_ids,
+    record_incident_occurrence,
+    schedule_sla_checks,
+)
+from .db_orm import Incident, get_session, init_db, utcnow
+from .incident_intake import (
+    INCIDENT_DEDUP_THRESHOLD,
+    INCIDENT_DEDUP_WINDOW_MINUTES,
+    get_incident_minhash,
+)
+from .log_templates import LogTemplateMiner
+from .minhash import encode_signature, estimate_jaccard, lsh_band_keys
+from .similar_incidents import backfill_resolved_incident_index
+from .sla_scheduler import SlaScheduler, get_sla_due_at
+from .triage import is_triage_enabled
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+INGEST_BATCH_SIZE   = 1000
+EMBED_BATCH_SIZE    = 100
+FOLLOW_POLL_SECONDS = 1.0
+MAX_LOG_LINES       = 200  # per incident created from a log stream
+INCIDENT_FIELDS     = ("name", "description", "email", "log", "sla_no_of_hours", "status", "solution", "created_at")
+
+
+@dataclass
+class IngestStats:
+    created: int = 0
+    folded: int = 0
+    skipped: int = 0
+    scheduled: int = 0
+    embedded: int = 0
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
+
+
+def iter_incident_records(path: str) -> Iterator[Optional[dict]]:
+    """Records from a .csv file, or a .jsonl/.json file with one object per line (None for invalid lines)"""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".csv"):
+            yield from csv.DictReader(f)
+            return
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                logger.warning("%s:%d: invalid JSON, skipped: %s", path, line_no, e)
+                yield None
+
+
+def log_lines_to_records(lines: List[str],
+                         email: str,
+                         sla_no_of_hours: float = 1.0) -> List[dict]:
+    """One record per log template: lines that differ only in IDs, addresses, etc. form one incident."""
+    miner = LogTemplateMiner()
+    lines_by_template: Dict[int, List[str]] = {}
+    for line in lines:
+        template = miner.add_line(line)
+        if template is not None:
+            lines_by_template.setdefault(template.cluster_id, []).append(line.strip())
+
+    records = []
+    for template in miner.templates:
+        grouped = lines_by_template[template.cluster_id]
+        records.append({
+            "name": template.template[:255],
+            "description": f"{template.count} log line(s) matching: {template.template}",
+            "email": email,
+            "log": "\n".join(grouped[-MAX_LOG_LINES:]),
+            "sla_no_of_hours": sla_no_of_hours,
+        })
+    return records
+
+
+def follow_log_stream(path: str,
+                      poll_interval: float = FOLLOW_POLL_SECONDS,
+                      from_start: bool = False) -> Iterator[List[str]]:
+    """Tail a log file forever, yielding the complete lines appended since the last poll"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+        partial = ""
+        while True:
+            chunk = f.read()
+            if not chunk:
+                if os.path.getsize(path) < f.tell():
+                    # Truncated or rotated in place: start over
+                    f.seek(0)
+                    partial = ""
+                time.sleep(poll_interval)
+                continue
+            lines = (partial + chunk).split("\n")
+            partial = lines.pop()
+            lines = [line for line in lines if line.strip()]
+            if lines:
+                yield lines
+
+
+def _to_row(record: dict, defaults: dict, notify: bool) -> Optional[dict]:
+    """Incident column dict for a record, or None if it is incomplete or malformed"""
+    if not isinstance(record, dict):
+        return None
+    row = {field: record.get(field) for field in INCIDENT_FIELDS if record.get(field) not in (None, "")}
+    for field, value in defaults.items():
+        row.setdefault(field, value)
+    if not row.get("name") or not row.get("description") or not row.get("email"):
+        return None
+
+    row["id"] = str(record.get("id") or uuid.uuid4())
+    try:
+        row["sla_no_of_hours"] = float(row.get("sla_no_of_hours", 1.0))
+        row["created_at"] = _parse_datetime(row.get("created_at")) or utcnow()
+    except (ValueError, TypeError) as e:
+        logger.warning("Record %r skipped: %s", row["name"], e)
+        return None
+    row["status"] = row.get("status", "resolved" if row.get("solution") else "open")
+    row["updated_at"] = row["created_at"]
+    # Imported history must not trigger a burst of overdue emails
+    row["notified"] = row["status"] != "open" or not notify
+    return row
+
+
+class _PendingIncidents:
+    """Open rows of the current batch, by LSH bucket, so a storm within one batch folds too"""
+
+    def __init__(self):
+        self._rows_by_band: Dict[str, List[tuple]] = {}
+
+    def add(self, row: dict, minhash: List[int]) -> None:
+        for key in lsh_band_keys(minhash):
+            self._rows_by_band.setdefault(key, []).append((row, minhash))
+
+    def find_duplicate(self, minhash: List[int], email: str, since: datetime, threshold: float) -> Optional[dict]:
+        """Same rules as `find_duplicate_incident`: open, same recipient, recent and similar enough"""
+        best, best_score, seen = None, threshold, set()
+        for key in lsh_band_keys(minhash):
+            for row, candidate in self._rows_by_band.get(key, []):
+                if row["id"] in seen:
+                    continue
+                seen.add(row["id"])
+                if row["email"] != email or (row.get("last_occurred_at") or row["created_at"]) < since:
+                    continue
+                score = estimate_jaccard(minhash, candidate)
+                if score >= best_score:
+                    best, best_score = row, score
+        return best
+
+
+def ingest_incidents(records: Iterable[dict],
+                     batch_size: int = INGEST_BATCH_SIZE,
+                     default_email: Optional[str] = None,
+                     default_sla_no_of_hours: float = 1.0,
+                     notify: bool = True,
+                     dedup: bool = False,
+                     triage: bool = False,
+                     index_resolved: bool = False,
+                     username: str = "admin",
+                     scheduler: Optional[SlaScheduler] = None) -> IngestStats:
+    """
+    Insert incident records in batched transactions.
+
+    Open incidents get their SLA checks queued in bulk (through `scheduler` when
+    running inside the app, otherwise persisted for the app's scheduler to pick
+    up). With `dedup`, open records are folded into matching open incidents like
+    interactive reports, and near-duplicates within a batch into its first
+    record. With `triage`, open incidents are marked for the app's background
+    AI triage. With `index_resolved`, resolved incidents are embedded into the
+    user's knowledge base in batches.
+    """
+    defaults = {"sla_no_of_hours": default_sla_no_of_hours}
+    if default_email:
+        defaults["email"] = default_email
+    stats = IngestStats()
+
+    with get_session() as session:
+        for batch in _batched(records, batch_size):
+            rows = []
+            pending = _PendingIncidents()
+            candidates = []
+            for record in batch:
+                row = _to_row(record, defaults, notify)
+                if row is None:
+                    stats.skipped += 1
+                    continue
+                candidates.append(row)
+            # An id that is taken (or repeated in the batch) would fail the whole batch insert
+            taken_ids = list_existing_incident_ids([row["id"] for row in candidates], session)
+            for row in candidates:
+                if row["id"] in taken_ids:
+                    logger.warning("Record %s skipped: incident id already exists", row["id"])
+                    stats.skipped += 1
+                    continue
+                if dedup and row["status"] == "open":
+                    minhash = get_incident_minhash(row["name"], row["description"], row.get("log"))
+                    since = utcnow() - timedelta(minutes=INCIDENT_DEDUP_WINDOW_MINUTES)
+                    parent = find_duplicate_incident(
+                        minhash,
+                        since=since,
+                        threshold=INCIDENT_DEDUP_THRESHOLD,
+                        email=row["email"],
+                        session=session,
+                    )
+                    if parent is not None:
+                        record_incident_occurrence(parent.id, session=session)
+                        stats.folded += 1
+                        continue
+                    pending_parent = pending.find_duplicate(minhash, row["email"], since, INCIDENT_DEDUP_THRESHOLD)
+                    if pending_parent is not None:
+                        # Not inserted yet: count the occurrence on the row itself
+                        pending_parent["occurrence_count"] = pending_parent.get("occurrence_count", 1) + 1
+                        pending_parent["last_occurred_at"] = utcnow()
+                        stats.folded += 1
+                        continue
+                    row["minhash"] = encode_signature(minhash)
+                    pending.add(row, minhash)
+                if triage and row["status"] == "open":
+                    row["triage_status"] = "pending"
+                rows.append(row)
+                taken_ids.add(row["id"])
+
+            stats.created += bulk_create_incidents(rows, session)
+
+            checks = [
+                (row["id"], get_sla_due_at(row["created_at"], row["sla_no_of_hours"]))
+                for row in rows if not row["notified"]
+            ]
+            if scheduler is not None:
+                scheduler.schedule_many(checks)
+            else:
+                schedule_sla_checks(checks, session)
+            stats.scheduled += len(checks)
+
+            if index_resolved:
+                resolved = [Incident(**row) for row in rows if row["status"] == "resolved" and row.get("solution")]
+                stats.embedded += index_resolved_incidents_in_batches(username, resolved)
+
+            logger.info("Ingested %d incidents so far", stats.created)
+    return stats
+
+
+def index_resolved_incidents_in_batches(username: str,
+                                        incidents: List[Incident],
+                                        batch_size: int = EMBED_BATCH_SIZE) -> int:
+    # Imported here so plain ingestion does not need the document-processing stack
+    from .save_docs import add_resolved_incidents_to_vectordb
+
+    embedded = 0
+    for batch in _batched(incidents, batch_size):
+        add_resolved_incidents_to_vectordb(username, batch)
+        embedded += len(batch)
+    return embedded
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk-load incidents into the incident database.")
+    parser.add_argument("paths", nargs="*", help="JSONL/CSV files, or a log file with --follow")
+    parser.add_argument("--follow", action="store_true", help="Tail a log file and report new lines as incidents")
+    parser.add_argument("--from-start", action="store_true", help="With --follow, also process existing lines")
+    parser.add_argument("--email", help="Recipient for records without an email")
+    parser.add_argument("--sla", type=float, default=1.0, help="SLA for records without one (default 1.0)")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--no-notify", action="store_true", help="Do not schedule SLA notifications for open incidents")
+    parser.add_argument("--no-triage", action="store_true",
+                        help="Do not queue open incidents for background AI triage (on when INCIDENT_TRIAGE is TRUE)")
+    parser.add_argument("--dedup", action="store_true", help="Fold near-duplicates into open incidents (always on with --follow)")
+    parser.add_argument("--index-resolved", action="store_true", help="Embed resolved incidents into the knowledge base")
+    parser.add_argument("--backfill-resolved", action="store_true",
+                        help="Index already-resolved incidents missing from the look-alike index, then exit")
+    parser.add_argument("--username", default="admin", help="Knowledge base owner for --index-resolved")
+    args = parser.parse_args(argv)
+    if not args.paths and not args.backfill_resolved:
+        parser.error("no input files")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    init_db()
+    if args.backfill_resolved:
+        logger.info("Backfilled %d resolved incidents", backfill_resolved_incident_index(args.username))
+        return
+    options = dict(
+        batch_size=args.batch_size,
+        default_email=args.email,
+        default_sla_no_of_hours=args.sla,
+        notify=not args.no_notify,
+        triage=is_triage_enabled() and not args.no_triage,
+        index_resolved=args.index_resolved,
+        username=args.username,
+    )
+
+    if args.follow:
+        if len(args.paths) != 1 or not args.email:
+            parser.error("--follow takes exactly one log file and requires --email")
+        for lines in follow_log_stream(args.paths[0], from_start=args.from_start):
+            stats = ingest_incidents(
+                log_lines_to_records(lines, args.email, args.sla),
+                dedup=True,
+                **options
+            )
+            logger.info("%d lines: %d new incidents, %d folded", len(lines), stats.created, stats.folded)
+        return
+
+    started = time.perf_counter()
+    for path in args.paths:
+        stats = ingest_incidents(iter_incident_records(path), dedup=args.dedup, **options)
+        logger.info(
+            "%s: %d created, %d folded, %d skipped, %d SLA checks queued, %d embedded",
+            path, stats.created, stats.folded, stats.skipped, stats.scheduled, stats.embedded
+        )
+    logger.info("Done in %.1fs", time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
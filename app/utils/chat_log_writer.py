@@ -0,0 +1,164 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from .db_crud import log_chat_turn, log_chat_turns
+from .db_orm import get_session, utcnow
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class ChatLogWriter:
+    """
+    Background writer that batches chat turns from all users into few commits.
+
+    The queue is bounded: when it is full, `submit` blocks for up to
+    `put_timeout` seconds (backpressure) and then falls back to a synchronous
+    write so no turn is ever dropped. Pending turns are flushed on shutdown.
+    """
+
+    def __init__(self,
+                 max_queue_size: int = 1000,
+                 batch_size: int = 200,
+                 flush_interval: float = 0.5,
+                 put_timeout: float = 5.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._pending = Counter()  # username -> turns not yet committed
+        self._pending_cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="chat-log-writer",
+            daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self,
+               username: str,
+               prompt: str,
+               response: str,
+               images_json: Optional[str] = None) -> None:
+        """Queue a human/AI pair; the timestamp is taken now, not at commit time."""
+        turn = {
+            "username": username,
+            "prompt": prompt,
+            "response": response,
+            "images_json": images_json,
+            "timestamp": utcnow(),
+        }
+        if self._stop.is_set():
+            self._write_sync(turn)
+            return
+
+        with self._pending_cond:
+            self._pending[username] += 1
+        try:
+            self._queue.put(turn, timeout=self.put_timeout)
+        except queue.Full:
+            logger.warning("Chat log queue is full, writing turn synchronously")
+            self._done([turn])
+            self._write_sync(turn)
+
+    def wait_for_user(self, username: str, timeout: float = 5.0) -> bool:
+        """Block until all queued turns of `username` are committed."""
+        with self._pending_cond:
+            return self._pending_cond.wait_for(
+                lambda: self._pending[username] <= 0,
+                timeout=timeout
+            )
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Block until every queued turn is committed."""
+        with self._pending_cond:
+            return self._pending_cond.wait_for(
+                lambda: sum(self._pending.values()) <= 0,
+                timeout=timeout
+            )
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Stop accepting turns asynchronously and flush what is queued."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        try:
+            with get_session() as session:
+                log_chat_turns(batch, session=session)
+        except Exception:
+            logger.exception("Failed to write %d chat turns in one batch, retrying one by one", len(batch))
+            for turn in batch:
+                self._write_sync(turn)
+        finally:
+            self._done(batch)
+
+    def _write_sync(self, turn: dict):
+        try:
+            with get_session() as session:
+                log_chat_turns([turn], session=session)
+        except Exception:
+            logger.exception("Failed to write chat turn for user %s", turn["username"])
+
+    def _done(self, batch):
+        with self._pending_cond:
+            for turn in batch:
+                self._pending[turn["username"]] -= 1
+            self._pending_cond.notify_all()
+
+
+def is_async_chat_log_enabled() -> bool:
+    return os.getenv("CHAT_LOG_ASYNC") == "TRUE"
+
+
+@lru_cache()
+def get_chat_log_writer() -> ChatLogWriter:
+    return ChatLogWriter(
+        max_queue_size=int(os.getenv("CHAT_LOG_QUEUE_SIZE", 1000)),
+        batch_size=int(os.getenv("CHAT_LOG_BATCH_SIZE", 200)),
+    )
+
+
+def record_chat_turn(username: str,
+                     prompt: str,
+                     response: str,
+                     images_json: Optional[str] = None) -> None:
+    """Persist a chat turn, through the background writer if enabled."""
+    if is_async_chat_log_enabled():
+        get_chat_log_writer().submit(username, prompt, response, images_json)
+    else:
+        with get_session() as session:
+            log_chat_turn(username, prompt, response, images_json, session=session)
+
+
+def wait_for_chat_log(username: str) -> None:
+    """Make sure a user's last turns are readable before loading history."""
+    if is_async_chat_log_enabled():
+        get_chat_log_writer().wait_for_user(username)
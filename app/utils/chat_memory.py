@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from dotenv import load_dotenv
+from jinja2 import Template
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_google_genai import ChatGoogleGenerativeAI
+from sqlalchemy.orm import Session
+
+from .db_crud import get_chat_summary, get_user_messages_after, save_chat_summary
+from .db_orm import get_session
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+CHARS_PER_TOKEN        = 4     # rough estimate, good enough for budgeting
+TOKEN_BUDGET           = int(os.getenv("CHAT_MEMORY_TOKEN_BUDGET", 4000))
+RECENT_MESSAGES        = int(os.getenv("CHAT_MEMORY_RECENT_MESSAGES", 8))
+SUMMARY_BATCH_MESSAGES = int(os.getenv("CHAT_MEMORY_SUMMARY_BATCH", 8))
+MAX_MESSAGES_PER_PASS  = 40
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-memory")
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text or "") // CHARS_PER_TOKEN + 1
+
+
+def build_llm_chat_history(username: str,
+                           chat_history: List[dict],
+                           token_budget: int = TOKEN_BUDGET) -> List[BaseMessage]:
+    """
+    Convert chat history to LangChain messages bounded by `token_budget`:
+    the rolling summary of older turns, then the newest turns not covered by it.
+    """
+    summary = ""
+    summarized_until = None
+    if username:
+        # Fresh session: the summary is rewritten by the background job
+        with get_session() as session:
+            chat_summary = get_chat_summary(username, session)
+            if chat_summary is not None:
+                summary = chat_summary.summary
+                summarized_until = chat_summary.summarized_until
+        schedule_summary_update(username)
+
+    # Entries without a timestamp were added during this run and are always recent
+    recent = [
+        entry for entry in chat_history
+        if summarized_until is None
+        or entry.get("timestamp") is None
+        or entry["timestamp"] > summarized_until
+    ]
+
+    budget = token_budget - (estimate_tokens(summary) if summary else 0)
+    selected = []
+    used = 0
+    for entry in reversed(recent):
+        tokens = estimate_tokens(entry.get("content", ""))
+        if used + tokens > budget:
+            break
+        selected.append(entry)
+        used += tokens
+    selected.reverse()
+    # Do not open the window with a dangling AI answer
+    while selected and selected[0].get("role") != "human":
+        selected.pop(0)
+
+    lc_chat_history: List[BaseMessage] = []
+    if summary:
+        lc_chat_history.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+    for entry in selected:
+        if entry.get("role") == "human":
+            lc_chat_history.append(HumanMessage(content=entry.get("content", "")))
+        else:
+            lc_chat_history.append(AIMessage(content=entry.get("content", "")))
+    return lc_chat_history
+
+
+def schedule_summary_update(username: str) -> None:
+    """Fold older turns into the user's summary in the background (at most one job per user)."""
+    with _in_flight_lock:
+        if username in _in_flight:
+            return
+        _in_flight.add(username)
+    _executor.submit(_update_summary_job, username)
+
+
+def _update_summary_job(username: str) -> None:
+    try:
+        with get_session() as session:
+            while update_chat_summary(username, session=session):
+                pass
+    except Exception:
+        logger.exception("Failed to update chat summary for user %s", username)
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(username)
+
+
+def update_chat_summary(username: str,
+                        session: Session = get_session()) -> bool:
+    """
+    Summarize one batch of messages that fell out of the recent window.
+    Returns True if the summary advanced and more work may remain.
+    """
+    chat_summary = get_chat_summary(username, session)
+    summary = chat_summary.summary if chat_summary else ""
+    after = chat_summary.summarized_until if chat_summary else None
+
+    messages = get_user_messages_after(
+        username,
+        after=after,
+        limit=MAX_MESSAGES_PER_PASS + RECENT_MESSAGES,
+        session=session
+    )
+    candidates = messages[:-RECENT_MESSAGES] if RECENT_MESSAGES else messages
+    candidates = candidates[:MAX_MESSAGES_PER_PASS]
+    # Never split a turn: both messages of a turn share one timestamp
+    remaining = messages[len(candidates):]
+    while candidates and remaining and candidates[-1].timestamp == remaining[0].timestamp:
+        remaining.insert(0, candidates.pop())
+    if len(candidates) < SUMMARY_BATCH_MESSAGES:
+        return False
+
+    template_str = os.getenv(
+        "CONVERSATION_SUMMARY_TEMPLATE",
+        (
+            "Summary so far: {{ summary }}\n\n"
+            "{% for message in messages %}{{ message.message }}\n{% endfor %}\n"
+            "Updated summary:"
+        )
+    )
+    prompt = Template(template_str).render(summary=summary, messages=candidates)
+
+    llm = ChatGoogleGenerativeAI(
+        model=os.getenv("GENERATIVE_AI_MODEL"),
+        temperature=0.0,
+        google_api_key=os.getenv('GOOGLE_API_KEY')
+    )
+    new_summary = llm.invoke(prompt).content
+    if isinstance(new_summary, list):
+        new_summary = "".join(part if isinstance(part, str) else part.get("text", "") for part in new_summary)
+
+    save_chat_summary(
+        username,
+        summary=new_summary.strip(),
+        summarized_until=candidates[-1].timestamp,
+        session=session
+    )
+    return True
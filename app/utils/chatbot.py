@@ -1,27 +1,33 @@
 import json
 import os
 import re
-from typing import List
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
 
 import streamlit as st
 from jinja2 import Template
 from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.outputs import ChatGenerationChunk
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
-from streamlit_carousel import carousel
 
-from .db_crud import get_user_last_n_messages, log_chat_message
-from .db_orm import Incident
+from .chat_log_writer import record_chat_turn, wait_for_chat_log
+from .chat_memory import build_llm_chat_history
+from .db_crud import get_document_images, get_kb_version, get_user_last_n_messages
+from .db_orm import Incident, get_session
+from .image_store import gallery_path
+from .log_templates import compress_log
+from .tracing import current_span, now_ns, record_span, span
 
 
 def load_chat_history_from_db(username: str) -> List[dict]:
     """
     Load chat history from database for UI rendering and LLM context.
-    Each entry: {role: "human"|"ai", content: str, images: [{name, path, source}]}.
+    Each entry: {role: "human"|"ai", content: str, images: [{name, path, source}], timestamp: datetime}.
     """
+    wait_for_chat_log(username)
     db_messages = get_user_last_n_messages(username)
     chat_history: List[dict] = []
 
@@ -37,6 +43,7 @@ def load_chat_history_from_db(username: str) -> List[dict]:
             "role": "human" if msg.is_human else "ai",
             "content": msg.message,
             "images": images,
+            "timestamp": msg.timestamp,
         })
 
     return chat_history
@@ -58,91 +65,121 @@ def chat_user_prompt(chat_history: List,
     )
 
 
-def chat_incident_prompt(incident: Incident,
-                         chat_history: List,
-                         vectordb,
-                         username: str) -> List:
+def render_incident_prompt(incident: Incident) -> str:
     template_str = os.getenv(
         "INCIDENT_PROMPT_TEMPLATE",
         (
             "Incident Name: {{ incident.name }}\n\n"
             "Description: {{ incident.description }}\n\n"
-            "Log: {{ incident.log }}"
+            "Log: {{ incident_log }}"
         )
     )
     template = Template(template_str)
-    prompt = template.render(incident=incident)
+    # Repeated log lines are collapsed into templates with counts to save prompt tokens
+    return template.render(incident=incident, incident_log=compress_log(incident.log))
+
+
+def chat_incident_prompt(incident: Incident,
+                         chat_history: List,
+                         vectordb,
+                         username: str) -> List:
+    # Imported here: triage builds on this module
+    from .triage import TRIAGE_USERNAME
+
+    precomputed_answer = None
+    # Answered by the background triage worker from TRIAGE_USERNAME's knowledge base; no need
+    # to wait for the model, unless another user asks or documents changed since
+    if incident.triage_status == "done" and incident.triage_answer and username == TRIAGE_USERNAME:
+        with get_session() as session:
+            kb_version = get_kb_version(TRIAGE_USERNAME, session)
+        if (incident.triage_kb_version or 0) >= kb_version:
+            precomputed_answer = (incident.triage_answer, load_images_json(incident.triage_images_json))
     return _chat_response_streaming(
-        prompt=prompt,
+        prompt=render_incident_prompt(incident),
         chat_history=chat_history,
         vectordb=vectordb,
-        username=username
+        username=username,
+        precomputed_answer=precomputed_answer
     )
 
 
-def _chat_response_streaming(prompt: str,
-                             chat_history: List,
-                             vectordb,
-                             username: str = None,
-                             system_instruction: str = None) -> List:
+def load_images_json(images_json: Optional[str]) -> List[dict]:
+    if not images_json:
+        return []
+    try:
+        return json.loads(images_json)
+    except Exception:
+        return []
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
     """
-    Generate chatbot response with streaming.
+    Spans for the steps LangChain runs inside a chain: `vector.search` (retriever),
+    `prompt.render`, `llm.generate` (until the last token) and `llm.first_token`.
+    They are recorded under the span current when the handler is created.
     """
-    def _render_gallery(images: List[dict], placeholder_names: List[str], gallery_key: str):
-        if not images:
-            return
-        allowed = set(placeholder_names) if placeholder_names else {img.get("name") for img in images if img.get("name")}
-        filtered = [img for img in images if img.get("name") in allowed]
-        if not filtered:
-            return
-        items = []
-        for img in filtered:
-            items.append({
-                "img": img.get("path"),
-                "title": "",
-                "text": img.get("name", ""),
-            })
-        carousel(items=items, key=f"carousel_{gallery_key}")
 
-    def _render_message(entry: dict, idx: int):
-        role_label = "AI" if entry.get("role") == "ai" else "Human"
-        content = entry.get("content", "")
-        images = entry.get("images") or []
-        placeholder_names = re.findall(r"\[IMAGE:([^\]]+)\]", content)
+    def __init__(self):
+        self.parent = current_span()
+        self._started: Dict[UUID, Tuple[str, int]] = {}
+        self._first_token_seen = set()
 
-        with st.chat_message(role_label):
-            st.markdown(content)
-            _render_gallery(images, placeholder_names, gallery_key=f"hist_{idx}")
+    def _start(self, run_id: UUID, name: str) -> None:
+        self._started[run_id] = (name, now_ns())
 
-    # Display chat messages
-    for idx, entry in enumerate(chat_history):
-        _render_message(entry, idx)
+    def _end(self, run_id: UUID, error: BaseException = None, **attributes) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            record_span(started[0], started[1], parent=self.parent, error=error, **attributes)
 
-    # Auto-scroll to bottom after rendering chat history
-    st.markdown(
-        "<script>window.scrollTo(0, document.body.scrollHeight);</script>",
-        unsafe_allow_html=True
-    )
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id, "vector.search")
 
-    # Convert to LangChain messages for the model
-    lc_chat_history = []
-    for entry in chat_history:
-        if entry.get("role") == "human":
-            lc_chat_history.append(HumanMessage(content=entry.get("content", "")))
-        else:
-            lc_chat_history.append(AIMessage(content=entry.get("content", "")))
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, documents=len(documents))
 
-    if not prompt:
-        return chat_history
-    
-    # Show user's message immediately
-    with st.chat_message("Human"):
-        st.write(prompt)
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        if kwargs.get("run_type") == "prompt":
+            self._start(run_id, "prompt.render")
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "llm.generate")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "llm.generate")
 
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if run_id in self._first_token_seen or run_id not in self._started:
+            return
+        self._first_token_seen.add(run_id)
+        record_span("llm.first_token", self._started[run_id][1], parent=self.parent)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._first_token_seen.discard(run_id)
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._first_token_seen.discard(run_id)
+        self._end(run_id, error=error)
+
+
+def build_retrieval_chain(vectordb,
+                          system_instruction: str = None,
+                          streaming: bool = True):
+    """RAG chain over a vector store. Returns (retriever, retrieval_chain, doc_prompt)."""
     llm = ChatGoogleGenerativeAI(
         model=os.getenv("GENERATIVE_AI_MODEL"),
         temperature=0.1,
-        streaming=True,
+        streaming=streaming,
         google_api_key=os.getenv('GOOGLE_API_KEY')
     )
 
@@ -150,7 +187,7 @@ def _chat_response_streaming(prompt: str,
 
     if not system_instruction:
         system_instruction = os.getenv("GENAI_SYSTEM_INSTRUCTION_TEMPLATE", "")
-    
+
     rag_prompt = ChatPromptTemplate.from_messages([
         ("system", system_instruction),
         MessagesPlaceholder(variable_name="chat_history"),
@@ -166,26 +203,193 @@ def _chat_response_streaming(prompt: str,
         document_prompt=doc_prompt,
     )
     retrieval_chain = create_retrieval_chain(retriever, chain)
+    return retriever, retrieval_chain, doc_prompt
+
 
-    # Pre-fetch docs to build image lookup (docx images) and surface filenames
-    retrieved_docs = retriever.get_relevant_documents(prompt)
+def build_image_lookup(docs) -> dict:
+    """
+    Image name -> {path, source} for the images shown in retrieved chunks. `path` is
+    None until `resolve_used_images` looks it up, except for chunks embedded with
+    their whole document's `img_paths_json`.
+    """
     image_lookup = {}
-    for doc in retrieved_docs:
+    for doc in docs:
         meta = doc.metadata or {}
         filename = meta.get("filename") or os.path.basename(str(meta.get("source", "")))
-        img_paths_json = meta.get("img_paths_json")
-        if not img_paths_json:
-            continue
-        try:
-            img_map = json.loads(img_paths_json)
-        except Exception:
-            continue
-        for name, path in img_map.items():
+        img_map = {}
+        if meta.get("img_paths_json"):
+            try:
+                img_map = json.loads(meta["img_paths_json"])
+            except Exception:
+                img_map = {}
+        names = [name.strip() for name in (meta.get("img_list") or "").split(",") if name.strip()]
+        for name in list(img_map) + names:
             if name not in image_lookup:
                 image_lookup[name] = {
-                    "path": path,
+                    "path": img_map.get(name),
                     "source": filename,
                 }
+    return image_lookup
+
+
+def resolve_used_images(response: str, image_lookup: dict, username: str = None) -> List[dict]:
+    """Images referenced by [IMAGE:name] placeholders in a response, with paths from the files' image tables"""
+    mentioned = [
+        (name, image_lookup[name])
+        for name in re.findall(r"\[IMAGE:([^\]]+)\]", response)
+        if name in image_lookup
+    ]
+    refs = [(meta["source"], name) for name, meta in mentioned if not meta.get("path")]
+    paths = {}
+    if refs and username:
+        with get_session() as session:
+            paths = get_document_images(username, refs, session)
+
+    used_images = []
+    for name, meta in mentioned:
+        path = meta.get("path") or paths.get((meta["source"], name))
+        if not path:
+            continue
+        used_images.append({"name": name, "path": path, "source": meta["source"]})
+    return used_images
+
+
+def answer_prompt(prompt: str,
+                  vectordb,
+                  system_instruction: str = None,
+                  username: str = None) -> Tuple[str, List[dict]]:
+    """Answer a standalone prompt without streaming or UI, e.g. from a background worker"""
+    with span("chat.answer", username=username or "", streaming=False):
+        _, retrieval_chain, _ = build_retrieval_chain(vectordb, system_instruction, streaming=False)
+        result = retrieval_chain.invoke(
+            {"input": prompt, "chat_history": []},
+            config={"callbacks": [TracingCallbackHandler()]}
+        )
+        answer = result.get("answer", "")
+        return answer, resolve_used_images(answer, build_image_lookup(result.get("context", [])), username)
+
+
+def _chat_response_streaming(prompt: str,
+                             chat_history: List,
+                             vectordb,
+                             username: str = None,
+                             system_instruction: str = None,
+                             precomputed_answer: Tuple[str, List[dict]] = None) -> List:
+    """
+    Generate chatbot response with streaming.
+    With `precomputed_answer` (answer, images), that answer is shown and logged instead.
+    """
+    def _render_message(entry: dict, idx: int):
+        role_label = "AI" if entry.get("role") == "ai" else "Human"
+        content = entry.get("content", "")
+        images = entry.get("images") or []
+        placeholder_names = re.findall(r"\[IMAGE:([^\]]+)\]", content)
+
+        with st.chat_message(role_label):
+            st.markdown(content)
+            _render_gallery(images, placeholder_names, gallery_key=f"hist_{idx}")
+
+    # Display chat messages
+    for idx, entry in enumerate(chat_history):
+        _render_message(entry, idx)
+
+    # Auto-scroll to bottom after rendering chat history
+    st.markdown(
+        "<script>window.scrollTo(0, document.body.scrollHeight);</script>",
+        unsafe_allow_html=True
+    )
+
+    if not prompt:
+        return chat_history
+
+    # Show user's message immediately
+    with st.chat_message("Human"):
+        st.write(prompt)
+
+    # One trace per turn: retrieval, prompt, model and chat log writes
+    with span("chat.turn", username=username or "", precomputed=precomputed_answer is not None):
+        if precomputed_answer is not None:
+            final_response, used_images = precomputed_answer
+            with st.chat_message("AI"):
+                st.markdown(final_response)
+                placeholder_names = re.findall(r"\[IMAGE:([^\]]+)\]", final_response)
+                _render_gallery(used_images, placeholder_names, gallery_key=f"resp_{len(chat_history)}")
+        else:
+            final_response, used_images = _stream_answer(
+                prompt, chat_history, vectordb, username, system_instruction
+            )
+
+        if username:
+            # Save user message and AI response (with image metadata) in one transaction
+            images_json = json.dumps(used_images) if used_images else None
+            record_chat_turn(
+                username=username,
+                prompt=prompt,
+                response=final_response,
+                images_json=images_json,
+            )
+    
+    # Update chat_history with both user and AI messages (include images for rendering)
+    chat_history = chat_history + [
+        {
+            "role": "human",
+            "content": prompt,
+            "images": [],
+        },
+        {
+            "role": "ai",
+            "content": final_response,
+            "images": used_images,
+        }
+    ]
+
+    return chat_history
+
+
+def _render_gallery(images: List[dict], placeholder_names: List[str], gallery_key: str):
+    if not images:
+        return
+    allowed = set(placeholder_names) if placeholder_names else {img.get("name") for img in images if img.get("name")}
+    filtered = [img for img in images if img.get("name") in allowed and img.get("path")]
+    if not filtered:
+        return
+    from streamlit_carousel import carousel
+
+    # The carousel inlines every image as a data URL on each rerun, so it gets the thumbnails
+    items = []
+    for img in filtered:
+        items.append({
+            "img": gallery_path(img["path"]),
+            "title": "",
+            "text": img.get("name", ""),
+        })
+    carousel(items=items, key=f"carousel_{gallery_key}")
+    # Originals are only sent once asked for
+    if st.toggle("Show full-size images", key=f"originals_{gallery_key}"):
+        for img in filtered:
+            if os.path.exists(img["path"]):
+                st.image(img["path"], caption=img.get("name", ""))
+
+
+def _stream_answer(prompt: str,
+                   chat_history: List,
+                   vectordb,
+                   username: str = None,
+                   system_instruction: str = None) -> Tuple[str, List[dict]]:
+    """Stream the model's answer into a new AI chat bubble; returns (answer, used images)."""
+    # Convert to LangChain messages for the model: rolling summary + recent turns within budget
+    with span("chat.history"):
+        lc_chat_history = build_llm_chat_history(username, chat_history)
+
+    if not system_instruction:
+        system_instruction = os.getenv("GENAI_SYSTEM_INSTRUCTION_TEMPLATE", "")
+    retriever, retrieval_chain, doc_prompt = build_retrieval_chain(vectordb, system_instruction)
+
+    # Pre-fetch docs to know which file each image name belongs to and surface filenames
+    with span("vector.search", prefetch=True) as search:
+        retrieved_docs = retriever.get_relevant_documents(prompt)
+        search.set_attribute("documents", len(retrieved_docs))
+    image_lookup = build_image_lookup(retrieved_docs)
 
     # Debug: view rendered system instruction with context
     if os.getenv("DEBUG_MODE") == "TRUE":
@@ -214,7 +418,7 @@ def _chat_response_streaming(prompt: str,
             for chunk in retrieval_chain.stream({
                 "input": prompt,
                 "chat_history": lc_chat_history
-            }):
+            }, config={"callbacks": [TracingCallbackHandler()]}):
                 content = ""
                 if isinstance(chunk, dict):
                     content = chunk.get("answer") or chunk.get("result") or ""
@@ -233,42 +437,7 @@ def _chat_response_streaming(prompt: str,
 
         # Render images referenced in the final response using carousel
         placeholder_names = re.findall(r"\[IMAGE:([^\]]+)\]", final_response)
-        used_images = []
-        for name in placeholder_names:
-            meta = image_lookup.get(name)
-            if not meta:
-                continue
-            used_images.append({"name": name, **meta})
+        used_images = resolve_used_images(final_response, image_lookup, username)
         _render_gallery(used_images, placeholder_names, gallery_key=f"resp_{len(chat_history)}")
 
-    if username:
-        # Save user message to database
-        log_chat_message(
-            username=username,
-            is_human=True,
-            message=prompt,
-        )
-        # Save AI response to database with image metadata
-        images_json = json.dumps(used_images) if used_images else None
-        log_chat_message(
-            username=username,
-            is_human=False,
-            message=final_response,
-            images_json=images_json,
-        )
-    
-    # Update chat_history with both user and AI messages (include images for rendering)
-    chat_history = chat_history + [
-        {
-            "role": "human",
-            "content": prompt,
-            "images": [],
-        },
-        {
-            "role": "ai",
-            "content": final_response,
-            "images": used_images,
-        }
-    ]
-
-    return chat_history
+    return final_response, used_images
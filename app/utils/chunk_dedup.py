@@ -0,0 +1,126 @@
+import hashlib
+import logging
+import os
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from .db_crud import add_knowledge_chunks, delete_knowledge_chunks, find_duplicate_chunks
+from .db_orm import get_session
+from .minhash import encode_signature, estimate_jaccard, lsh_band_keys, minhash_signature, word_shingles
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+CHUNK_DEDUP_THRESHOLD = float(os.getenv("CHUNK_DEDUP_THRESHOLD", 0.9))
+CHUNK_DEDUP_MODES     = ("link", "skip", "off")
+
+
+def get_chunk_dedup_mode() -> str:
+    """
+    "link": near-duplicates are not embedded but recorded against the chunk they
+    duplicate, so their file is embedded again if that chunk's file is removed.
+    "skip": near-duplicates are dropped. "off": every chunk is embedded.
+    """
+    mode = os.getenv("CHUNK_DEDUP", "link").lower()
+    return mode if mode in CHUNK_DEDUP_MODES else "link"
+
+
+@dataclass
+class ChunkDedupResult:
+    chunks: list                                    # chunks to embed
+    ids: List[str]                                  # vector ids for `chunks`
+    rows: List[dict] = field(default_factory=list)  # KnowledgeChunk rows to index once embedded
+    duplicates: int = 0                             # chunks not embedded
+
+
+def _source_filename(chunk) -> str:
+    return os.path.basename(chunk.metadata.get("source", ""))
+
+
+def dedupe_chunks(username: str,
+                  chunks: list,
+                  mode: Optional[str] = None,
+                  threshold: float = CHUNK_DEDUP_THRESHOLD,
+                  session: Session = get_session()) -> ChunkDedupResult:
+    """
+    Split `chunks` (LangChain Documents) into chunks to embed and duplicates of
+    chunks already in the user's knowledge base or earlier in `chunks`.
+    """
+    mode = mode or get_chunk_dedup_mode()
+    if mode == "off":
+        return ChunkDedupResult(list(chunks), [str(uuid.uuid4()) for _ in chunks])
+
+    content_hashes = [hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest() for chunk in chunks]
+    minhashes = [minhash_signature(word_shingles(chunk.page_content)) for chunk in chunks]
+    matches = find_duplicate_chunks(username, content_hashes, minhashes, threshold, session)
+
+    result = ChunkDedupResult([], [])
+    # Chunks embedded from this batch, so duplicates within the batch are found too
+    batch_exact: Dict[str, str] = {}
+    batch_bands: Dict[str, List[str]] = {}
+    batch_minhashes: Dict[str, List[int]] = {}
+    for chunk, content_hash, minhash, match in zip(chunks, content_hashes, minhashes, matches):
+        if match is None:
+            match = batch_exact.get(content_hash)
+        if match is None:
+            candidates = {i for key in lsh_band_keys(minhash) for i in batch_bands.get(key, ())}
+            score, best = max(((estimate_jaccard(minhash, batch_minhashes[i]), i) for i in candidates),
+                              default=(0.0, None))
+            if score >= threshold:
+                match = best
+
+        row = {
+            "filename": _source_filename(chunk),
+            "content_hash": content_hash,
+            "minhash": encode_signature(minhash),
+        }
+        if match is not None:
+            result.duplicates += 1
+            if mode == "link":
+                result.rows.append({**row, "chunk_id": str(uuid.uuid4()), "duplicate_of": match})
+            continue
+
+        chunk_id = str(uuid.uuid4())
+        result.chunks.append(chunk)
+        result.ids.append(chunk_id)
+        result.rows.append({**row, "chunk_id": chunk_id, "duplicate_of": None})
+        batch_exact[content_hash] = chunk_id
+        batch_minhashes[chunk_id] = minhash
+        for key in lsh_band_keys(minhash):
+            batch_bands.setdefault(key, []).append(chunk_id)
+
+    if result.duplicates:
+        logger.info("%s: %d of %d chunks are (near-)duplicates and not embedded",
+                    username, result.duplicates, len(chunks))
+    return result
+
+
+def index_chunks(username: str, result: ChunkDedupResult, session: Session = get_session()) -> None:
+    """Record deduplicated chunks once their embeddings are stored"""
+    add_knowledge_chunks(username, result.rows, session)
+
+
+def forget_chunks(username: str, filenames: Optional[List[str]] = None, session: Session = get_session()) -> List[str]:
+    """
+    Drop files from the chunk index (all of the user's files when None).
+    Returns the files that must now be embedded again, including transitively
+    linked ones.
+    """
+    if filenames is None:
+        delete_knowledge_chunks(username, None, session)
+        return []
+    removed = set(filenames)
+    dependents: List[str] = []
+    pending = list(filenames)
+    while pending:
+        linked = [f for f in delete_knowledge_chunks(username, pending, session) if f not in removed]
+        removed.update(linked)
+        dependents.extend(linked)
+        pending = linked
+    return dependents
@@ -0,0 +1,657 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urldefrag, urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+import lxml.html
+from dotenv import load_dotenv
+from lxml import etree
+
+from .db_crud import list_crawled_pages, save_crawled_pages
+from .db_orm import get_session, utcnow
+
+load_dotenv()
+
+# --- Constants ---
+USER_AGENT          = "Mozilla/5.0 (compatible; TNTBot/1.0)"
+CRAWL_CONCURRENCY   = int(os.getenv("CRAWL_CONCURRENCY", 8))
+CRAWL_PER_HOST      = int(os.getenv("CRAWL_PER_HOST", 2))
+CRAWL_DELAY_SECONDS = float(os.getenv("CRAWL_DELAY_SECONDS", 0.25))  # minimum gap between requests to one host
+MAX_HTML_BYTES      = int(os.getenv("CRAWL_MAX_HTML_MB", 5)) * 1024 * 1024
+MAX_PDF_BYTES       = int(os.getenv("CRAWL_MAX_PDF_MB", 50)) * 1024 * 1024
+REQUEST_TIMEOUT     = 10
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MAX_SITEMAPS        = 20  # sitemap files read per host, including sitemap indexes
+BOILERPLATE_PAGES   = 3    # pages of a site seen before any block counts as boilerplate
+BOILERPLATE_RATIO   = 0.5  # share of the site's pages a repeated block must appear on
+
+_HTML_PARSER = lxml.html.HTMLParser(encoding="utf-8", remove_comments=True)
+
+
+@dataclass
+class CrawlResult:
+    url: str
+    filename: str = ""   # empty when nothing was written
+    file_type: str = ""  # "pdf" or "html"
+    error: str = ""
+    updated: bool = False    # an existing file was rewritten with changed content
+    unchanged: bool = False  # not modified since the last crawl; nothing was written
+
+
+class _HostState:
+    """Per-host concurrency limit, politeness clock and robots.txt rules."""
+
+    def __init__(self, per_host: int, delay: float):
+        self.semaphore = asyncio.Semaphore(per_host)
+        self.lock = asyncio.Lock()
+        self.delay = delay
+        self.next_request_at = 0.0
+        self.robots: Optional[RobotFileParser] = None
+        self.robots_task: Optional[asyncio.Task] = None
+
+
+def slugify(text: str) -> str:
+    """Generate a filesystem-safe slug from the given text."""
+    slug = text.lower().strip()
+    slug = re.sub(r'[^a-z0-9]+', '_', slug)
+    return slug.strip('_')
+
+
+def normalize_url(url: str) -> str:
+    return urldefrag(url.strip())[0]
+
+
+# Structural tags whose text starts a new block
+BLOCK_TAGS = frozenset({
+    "address", "article", "aside", "blockquote", "body", "caption", "dd", "details", "div", "dl", "dt",
+    "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hr", "li", "main", "nav", "ol", "p", "section", "summary", "table", "td", "th", "title", "tr", "ul",
+})
+SKIP_TAGS = frozenset({"script", "style", "noscript", "meta", "iframe", "template", "svg"})
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg', '.webp')
+
+
+@dataclass
+class ParsedPage:
+    blocks: List[str]  # visible text, one entry per paragraph, heading, list item, cell...
+    links: List[str]   # same-domain links
+
+
+def _parse_document(html: str) -> Optional[lxml.html.HtmlElement]:
+    try:
+        # Bytes, since lxml rejects str input that carries an XML encoding declaration
+        return lxml.html.document_fromstring(html.encode("utf-8"), parser=_HTML_PARSER)
+    except (etree.ParserError, ValueError):
+        return None  # empty or unparseable document
+
+
+def _text_blocks(root: lxml.html.HtmlElement) -> List[str]:
+    """Visible text grouped by block element, whitespace collapsed (kept inside <pre>)"""
+    blocks: List[str] = []
+    buffer: List[str] = []
+
+    def flush():
+        text = " ".join(" ".join(buffer).split())
+        if text:
+            blocks.append(text)
+        buffer.clear()
+
+    # Iterative walk: deeply nested markup must not hit the recursion limit
+    stack = [(root, False)]
+    while stack:
+        element, closing = stack.pop()
+        tag = element.tag if isinstance(element.tag, str) else ""  # "" for processing instructions
+        if closing:
+            if tag in BLOCK_TAGS:
+                flush()
+        elif tag and tag not in SKIP_TAGS:
+            if tag in BLOCK_TAGS or tag in ("br", "pre"):
+                flush()
+            if tag == "pre":
+                lines = [line.rstrip() for line in element.text_content().splitlines()]
+                text = "\n".join(line for line in lines if line.strip())
+                if text:
+                    blocks.append(text)
+            else:
+                if element.text:
+                    buffer.append(element.text)
+                stack.append((element, True))
+                stack.extend((child, False) for child in reversed(element))
+                continue
+        if element.tail and element is not root:
+            buffer.append(element.tail)
+    flush()
+    return blocks
+
+
+def _same_domain_links(root: lxml.html.HtmlElement, base_url: str) -> List[str]:
+    """Same-domain links, skipping English versions and image files"""
+    base_domain = urlparse(base_url).netloc
+    links = set()
+    for a in root.iter("a"):
+        href = a.get("href")
+        if not href:
+            continue
+        href = href.strip()
+        # Ignore mailto, javascript, etc.
+        if href.startswith("#") or href.startswith("mailto:") or href.startswith("javascript:"):
+            continue
+        abs_url = urljoin(base_url, href)
+        parsed = urlparse(abs_url)
+        # Accept relative links (netloc empty) or same-domain links
+        if parsed.netloc and parsed.netloc != base_domain:
+            continue
+        if parsed.scheme not in ("http", "https", ""):
+            continue
+        # Skip English version links
+        if '/en/' in parsed.path or parsed.path.endswith('/en'):
+            continue
+        # Skip image files
+        if parsed.path.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        links.add(abs_url)
+    return list(links)
+
+
+def parse_html(html: str, base_url: str) -> ParsedPage:
+    """Text blocks and same-domain links from a single lxml parse"""
+    root = _parse_document(html)
+    if root is None:
+        return ParsedPage([], [])
+    return ParsedPage(_text_blocks(root), _same_domain_links(root, base_url))
+
+
+def extract_all_visible_text(html: str) -> str:
+    """
+    Extracts all visible text from an HTML document, excluding scripts, styles
+    and other non-content elements. Site-wide boilerplate is removed by the
+    crawler's `BoilerplateModel`, not here.
+    """
+    root = _parse_document(html)
+    return "\n\n".join(_text_blocks(root)) if root is not None else ""
+
+
+def extract_same_domain_links(html: str, base_url: str) -> List[str]:
+    """
+    Extract all same-domain links from HTML content, skipping English versions and image files.
+    """
+    root = _parse_document(html)
+    return _same_domain_links(root, base_url) if root is not None else []
+
+
+def hash_block(block: str) -> str:
+    return hashlib.blake2b(block.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class BoilerplateModel:
+    """
+    Text blocks repeated across the pages of a site (navigation, headers,
+    footers, cookie banners), learned per crawl from block hashes.
+
+    A block is boilerplate once the site has at least `min_pages` pages and
+    the block occurs on at least `min_ratio` of them.
+    """
+
+    def __init__(self,
+                 min_pages: int = BOILERPLATE_PAGES,
+                 min_ratio: float = BOILERPLATE_RATIO):
+        self.min_pages = min_pages
+        self.min_ratio = min_ratio
+        self._block_pages: Dict[str, Counter] = defaultdict(Counter)  # host -> block hash -> pages
+        self._pages: Counter = Counter()                              # host -> pages seen
+
+    def add_page(self, host: str, block_hashes: Iterable[str]) -> None:
+        self._pages[host] += 1
+        self._block_pages[host].update(set(block_hashes))
+
+    def is_boilerplate(self, host: str, block_hash: str) -> bool:
+        pages = self._pages[host]
+        if pages < self.min_pages:
+            return False
+        return self._block_pages[host][block_hash] >= max(self.min_pages, self.min_ratio * pages)
+
+    def strip(self, host: str, blocks: List[str], block_hashes: List[str]) -> List[str]:
+        return [block for block, h in zip(blocks, block_hashes) if not self.is_boilerplate(host, h)]
+
+
+def _write_atomic(path: str, text: str) -> None:
+    tmp_path = path + ".part"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """W3C datetime from a sitemap (date only or full timestamp), as naive UTC"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
+
+
+def parse_sitemap(body: bytes) -> Tuple[Dict[str, Optional[datetime]], List[str]]:
+    """
+    Parse a sitemap or sitemap index.
+    Returns ({page url: lastmod}, [child sitemap urls]).
+    """
+    if body[:2] == b"\x1f\x8b":
+        body = gzip.decompress(body)
+    pages: Dict[str, Optional[datetime]] = {}
+    sitemaps: List[str] = []
+    root = ET.fromstring(body)
+    for entry in root:
+        tag = entry.tag.rsplit("}", 1)[-1]
+        fields = {child.tag.rsplit("}", 1)[-1]: (child.text or "").strip() for child in entry}
+        if not fields.get("loc"):
+            continue
+        if tag == "url":
+            pages[normalize_url(fields["loc"])] = _parse_lastmod(fields.get("lastmod"))
+        elif tag == "sitemap":
+            sitemaps.append(fields["loc"])
+    return pages, sitemaps
+
+
+class Crawler:
+    """
+    Concurrent breadth-first crawler over one pooled HTTP session.
+
+    Pages are fetched by `concurrency` workers from a FIFO frontier, with at
+    most `per_host` requests in flight per host and at least `delay` seconds
+    between request starts to a host (or the robots.txt Crawl-delay, if larger).
+    HTML pages are saved as extracted text and PDFs are streamed to disk, both
+    subject to size caps. HTML text is written once the crawl is done, without
+    the blocks `boilerplate` found repeated across the site's pages. With
+    `crawl_links`, same-domain links are followed until `page_limit` URLs have
+    been queued.
+
+    With a `username`, the crawl is incremental: each URL's ETag,
+    Last-Modified and content hashes are stored, later crawls send conditional
+    requests, and pages the sitemap reports as unmodified are not requested
+    at all. Stored outlinks keep unchanged pages expanding the crawl. A file
+    is only rewritten when its extracted text changed.
+    """
+
+    def __init__(self,
+                 docs_dir: str,
+                 existing_docs: Optional[List[str]] = None,
+                 crawl_links: bool = False,
+                 page_limit: int = 50,
+                 concurrency: int = CRAWL_CONCURRENCY,
+                 per_host: int = CRAWL_PER_HOST,
+                 delay: float = CRAWL_DELAY_SECONDS,
+                 respect_robots: bool = True,
+                 max_html_bytes: int = MAX_HTML_BYTES,
+                 max_pdf_bytes: int = MAX_PDF_BYTES,
+                 on_result: Optional[Callable[[CrawlResult], None]] = None,
+                 username: Optional[str] = None):
+        self.docs_dir = docs_dir
+        self.existing_docs = existing_docs if existing_docs is not None else []
+        self.crawl_links = crawl_links
+        self.page_limit = page_limit
+        self.concurrency = max(concurrency, 1)
+        self.per_host = max(per_host, 1)
+        self.delay = delay
+        self.respect_robots = respect_robots
+        self.max_html_bytes = max_html_bytes
+        self.max_pdf_bytes = max_pdf_bytes
+        self.on_result = on_result
+        self.username = username
+        self.results: List[CrawlResult] = []
+        self._seen: Set[str] = set()
+        self._hosts: Dict[str, _HostState] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._known: Dict[str, dict] = {}           # url -> stored CrawledPage fields
+        self._pages: Dict[str, dict] = {}           # url -> CrawledPage fields to store
+        self._sitemap_lastmod: Dict[str, datetime] = {}
+        self._sitemap_unchanged: Set[str] = set()   # answered from stored links without a request
+        self._parsed: Dict[str, tuple] = {}         # url -> (filename, blocks, block hashes, stored record)
+        self.boilerplate = BoilerplateModel()
+
+    def run(self, urls: Iterable[str]) -> List[CrawlResult]:
+        return asyncio.run(self.crawl(urls))
+
+    async def crawl(self, urls: Iterable[str]) -> List[CrawlResult]:
+        os.makedirs(self.docs_dir, exist_ok=True)
+        urls = list(urls)
+        if self.username is not None:
+            self._known = await asyncio.to_thread(self._load_known)
+        self._queue = asyncio.Queue()
+        for url in urls:
+            self._enqueue(url, force=True)
+
+        timeout = aiohttp.ClientTimeout(total=None, connect=REQUEST_TIMEOUT, sock_read=REQUEST_TIMEOUT)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host)
+        async with aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={"User-Agent": USER_AGENT}
+        ) as session:
+            workers = [asyncio.create_task(self._worker(session)) for _ in range(self.concurrency)]
+            if self.crawl_links and self._known:
+                await self._enqueue_from_sitemaps(session, urls)
+            await self._queue.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        self._save_parsed_pages()
+        if self.username is not None and self._pages:
+            await asyncio.to_thread(self._save_pages)
+        return self.results
+
+    def _load_known(self) -> Dict[str, dict]:
+        columns = ("url", "filename", "etag", "last_modified", "content_hash", "text_hash",
+                   "links_json", "block_hashes_json", "sitemap_lastmod", "fetched_at")
+        with get_session() as session:
+            return {
+                page.url: {column: getattr(page, column) for column in columns}
+                for page in list_crawled_pages(self.username, session)
+            }
+
+    def _save_pages(self) -> None:
+        with get_session() as session:
+            save_crawled_pages(self.username, list(self._pages.values()), session)
+
+    def _record(self, url: str, **fields) -> None:
+        if self.username is None:
+            return
+        page = self._pages.setdefault(url, dict(self._known.get(url) or {"url": url}))
+        page.update(fields, fetched_at=utcnow())
+        if url in self._sitemap_lastmod:
+            page["sitemap_lastmod"] = self._sitemap_lastmod[url]
+
+    def _known_file(self, url: str) -> Optional[dict]:
+        """Stored record of `url`, if its saved file is still present"""
+        known = self._known.get(url)
+        if known is None:
+            return None
+        if known["filename"] and not os.path.exists(os.path.join(self.docs_dir, known["filename"])):
+            return None
+        return known
+
+    def _unchanged_result(self, url: str, known: dict) -> Tuple[CrawlResult, List[str]]:
+        file_type = "pdf" if (known["filename"] or "").endswith(".pdf") else "html"
+        if file_type == "html":
+            # Unchanged pages still tell the boilerplate model what the site repeats
+            self.boilerplate.add_page(urlparse(url).netloc, json.loads(known["block_hashes_json"] or "[]"))
+        return CrawlResult(url, file_type=file_type, unchanged=True), json.loads(known["links_json"] or "[]")
+
+    async def _enqueue_from_sitemaps(self, session: aiohttp.ClientSession, urls: List[str]) -> None:
+        """Queue sitemap URLs that are new or modified since they were last fetched"""
+        for origin in {f"{p.scheme}://{p.netloc}" for p in map(urlparse, urls)}:
+            state = await self._host_state(session, origin + "/")
+            pending = list(state.robots.site_maps() or []) if state.robots is not None else []
+            pending = pending or [origin + "/sitemap.xml"]
+            pages: Dict[str, Optional[datetime]] = {}
+            for _ in range(MAX_SITEMAPS):
+                if not pending:
+                    break
+                await self._wait_politely(state)
+                try:
+                    async with session.get(pending.pop(0)) as resp:
+                        if resp.status != 200:
+                            continue
+                        body = await self._read_capped(resp, self.max_html_bytes)
+                    found, children = parse_sitemap(body)
+                except Exception:
+                    continue  # no usable sitemap: the crawl discovers pages through links
+                pages.update(found)
+                pending.extend(children)
+
+            host = urlparse(origin).netloc
+            for url, lastmod in pages.items():
+                if urlparse(url).netloc != host:
+                    continue
+                if lastmod is not None:
+                    self._sitemap_lastmod[url] = lastmod
+                known = self._known_file(url)
+                if known is not None and lastmod is not None and lastmod <= known["fetched_at"]:
+                    self._sitemap_unchanged.add(url)
+                else:
+                    self._enqueue(url)
+
+    def _enqueue(self, url: str, force: bool = False) -> None:
+        url = normalize_url(url)
+        if url in self._seen:
+            return
+        if not force and len(self._seen) >= self.page_limit:
+            return
+        self._seen.add(url)
+        self._queue.put_nowait(url)
+
+    async def _worker(self, session: aiohttp.ClientSession):
+        while True:
+            url = await self._queue.get()
+            try:
+                try:
+                    result, links = await self._process(session, url)
+                except Exception as e:
+                    result, links = CrawlResult(url, error=str(e) or type(e).__name__), []
+                if result is not None:
+                    self._emit(result)
+                if self.crawl_links:
+                    for link in links:
+                        self._enqueue(link)
+            finally:
+                # Only after new links are queued, so join() cannot return early
+                self._queue.task_done()
+
+    def _emit(self, result: CrawlResult) -> None:
+        self.results.append(result)
+        if self.on_result is not None:
+            self.on_result(result)
+
+    async def _host_state(self, session: aiohttp.ClientSession, url: str) -> _HostState:
+        parsed = urlparse(url)
+        state = self._hosts.get(parsed.netloc)
+        if state is None:
+            state = self._hosts[parsed.netloc] = _HostState(self.per_host, self.delay)
+            if self.respect_robots:
+                state.robots_task = asyncio.create_task(
+                    self._load_robots(session, state, f"{parsed.scheme}://{parsed.netloc}/robots.txt")
+                )
+        if state.robots_task is not None:
+            await state.robots_task
+        return state
+
+    async def _load_robots(self, session: aiohttp.ClientSession, state: _HostState, robots_url: str):
+        robots = RobotFileParser(robots_url)
+        try:
+            async with session.get(robots_url) as resp:
+                if resp.status in (401, 403):
+                    robots.disallow_all = True
+                elif resp.status >= 400:
+                    robots.allow_all = True
+                else:
+                    body = await resp.content.read(512 * 1024)
+                    robots.parse(body.decode("utf-8", errors="replace").splitlines())
+        except Exception:
+            robots.allow_all = True  # unreachable robots.txt: assume no restrictions
+        state.robots = robots
+        crawl_delay = robots.crawl_delay(USER_AGENT)
+        if crawl_delay:
+            state.delay = max(state.delay, float(crawl_delay))
+
+    async def _wait_politely(self, state: _HostState):
+        loop = asyncio.get_running_loop()
+        async with state.lock:
+            now = loop.time()
+            start_at = max(now, state.next_request_at)
+            state.next_request_at = start_at + state.delay
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+    async def _process(self, session: aiohttp.ClientSession, url: str) -> Tuple[Optional[CrawlResult], List[str]]:
+        """Fetch one URL. HTML results are deferred (None) until the crawl's boilerplate is known."""
+        state = await self._host_state(session, url)
+        if state.robots is not None and not state.robots.can_fetch(USER_AGENT, url):
+            return CrawlResult(url, error="disallowed by robots.txt"), []
+
+        known = self._known_file(url)
+        if url in self._sitemap_unchanged and known is not None:
+            return self._unchanged_result(url, known)
+        headers = {}
+        if known is not None:
+            if known["etag"]:
+                headers["If-None-Match"] = known["etag"]
+            if known["last_modified"]:
+                headers["If-Modified-Since"] = known["last_modified"]
+
+        parsed = urlparse(url)
+        base = slugify(parsed.netloc + parsed.path)
+        async with state.semaphore:
+            await self._wait_politely(state)
+            async with session.get(url, headers=headers) as resp:
+                if resp.status == 304 and known is not None:
+                    self._record(url)
+                    return self._unchanged_result(url, known)
+                resp.raise_for_status()
+                validators = {
+                    "etag": resp.headers.get("ETag"),
+                    "last_modified": resp.headers.get("Last-Modified"),
+                }
+                ctype = resp.headers.get("Content-Type", "").lower()
+                if url.lower().endswith(".pdf") or "application/pdf" in ctype:
+                    return await self._save_pdf(url, f"{base}.pdf", resp, validators), []
+                if ctype and "html" not in ctype and not ctype.startswith("text/"):
+                    return CrawlResult(url, error=f"unsupported content type {ctype}"), []
+                body = await self._read_capped(resp, self.max_html_bytes)
+                html_text = body.decode(resp.charset or "utf-8", errors="replace")
+
+        content_hash = _sha256(body)
+        if known is not None and known["content_hash"] == content_hash:
+            # Server without validators, same bytes: no need to parse again
+            self._record(url, **validators)
+            return self._unchanged_result(url, known)
+
+        # Parsing is CPU-bound; keep the event loop free for other downloads
+        page = await asyncio.to_thread(parse_html, html_text, str(resp.url))
+        block_hashes = [hash_block(block) for block in page.blocks]
+        self.boilerplate.add_page(parsed.netloc, block_hashes)
+        self._record(url, content_hash=content_hash, links_json=json.dumps(page.links),
+                     block_hashes_json=json.dumps(sorted(set(block_hashes))), **validators)
+        self._parsed[url] = (f"{base}.html.txt", page.blocks, block_hashes, known)
+        return None, page.links
+
+    def _save_parsed_pages(self) -> None:
+        """Write the crawl's HTML pages, now that the boilerplate model has seen all of them"""
+        for url, (fname, blocks, block_hashes, known) in self._parsed.items():
+            try:
+                result = self._save_text(url, fname, blocks, block_hashes, known)
+            except OSError as e:
+                result = CrawlResult(url, file_type="html", error=str(e))
+            self._emit(result)
+        self._parsed.clear()
+
+    def _save_text(self,
+                   url: str,
+                   fname: str,
+                   blocks: List[str],
+                   block_hashes: List[str],
+                   known: Optional[dict]) -> CrawlResult:
+        text = "\n\n".join(self.boilerplate.strip(urlparse(url).netloc, blocks, block_hashes))
+        text_hash = _sha256(text.encode("utf-8"))
+        self._record(url, filename=fname if text else None, text_hash=text_hash)
+        if not text:
+            return CrawlResult(url, file_type="html")
+
+        path = os.path.join(self.docs_dir, fname)
+        existed = os.path.exists(path)
+        if existed:
+            old_hash = known["text_hash"] if known is not None and known["filename"] == fname else _file_sha256(path)
+            if old_hash == text_hash:
+                return CrawlResult(url, file_type="html", unchanged=True)
+        _write_atomic(path, text)
+        if fname not in self.existing_docs:
+            self.existing_docs.append(fname)
+        return CrawlResult(url, fname, "html", updated=existed)
+
+    @staticmethod
+    async def _read_capped(resp: aiohttp.ClientResponse, max_bytes: int) -> bytes:
+        if resp.content_length and resp.content_length > max_bytes:
+            raise ValueError(f"response larger than {max_bytes} bytes")
+        chunks, size = [], 0
+        async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise ValueError(f"response larger than {max_bytes} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def _save_pdf(self,
+                        url: str,
+                        fname: str,
+                        resp: aiohttp.ClientResponse,
+                        validators: Dict[str, Optional[str]]) -> CrawlResult:
+        if resp.content_length and resp.content_length > self.max_pdf_bytes:
+            return CrawlResult(url, file_type="pdf", error=f"PDF larger than {self.max_pdf_bytes} bytes")
+
+        path = os.path.join(self.docs_dir, fname)
+        tmp_path = path + ".part"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_pdf_bytes:
+                        raise ValueError(f"PDF larger than {self.max_pdf_bytes} bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+            content_hash = digest.hexdigest()
+            self._record(url, filename=fname, content_hash=content_hash, text_hash=None,
+                         links_json=None, **validators)
+            existed = os.path.exists(path)
+            if existed and _file_sha256(path) == content_hash:
+                return CrawlResult(url, file_type="pdf", unchanged=True)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if fname not in self.existing_docs:
+            self.existing_docs.append(fname)
+        return CrawlResult(url, fname, "pdf", updated=existed)
+
+
+def crawl_urls(urls: Iterable[str],
+               docs_dir: str,
+               existing_docs: Optional[List[str]] = None,
+               crawl_links: bool = False,
+               page_limit: int = 50,
+               on_result: Optional[Callable[[CrawlResult], None]] = None,
+               username: Optional[str] = None) -> List[CrawlResult]:
+    crawler = Crawler(
+        docs_dir,
+        existing_docs=existing_docs,
+        crawl_links=crawl_links,
+        page_limit=page_limit,
+        on_result=on_result,
+        username=username,
+    )
+    return crawler.run(urls)
@@ -1,8 +1,42 @@
-from typing import List, Optional
+import json
+import re
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, insert, or_, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only
+
+from .db_orm import (
+    INCIDENT_FTS_TABLE,
+    ChatMessage,
+    ChatSummary,
+    CrawledPage,
+    DocumentImage,
+    Incident,
+    IncidentLshBand,
+    IncidentSlaCheck,
+    KnowledgeBaseVersion,
+    KnowledgeChunk,
+    KnowledgeChunkLshBand,
+    OcrCacheEntry,
+    UploadedDocument,
+    OutboundEmail,
+    get_session,
+    to_naive_utc,
+    utcnow,
+)
+from .log_templates import get_log_signatures
+from .minhash import decode_signature, encode_signature, estimate_jaccard, lsh_band_keys
+
+# SQLite limits the number of bound parameters per statement
+IN_CLAUSE_CHUNK_SIZE = 500
+
+
+def _chunked(items: list, size: int = IN_CLAUSE_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
 
-from .db_orm import ChatMessage, Incident, get_session
 
 # =========================Incident=========================
 
@@ -11,6 +45,80 @@ def list_incidents(session: Session = get_session()) -> List[Incident]:
     return session.query(Incident).all()
 
 
+# Columns needed to render the incident list; log and solution load only when opened
+INCIDENT_LIST_COLUMNS = (
+    Incident.id,
+    Incident.name,
+    Incident.description,
+    Incident.status,
+    Incident.notified,
+    Incident.sla_no_of_hours,
+    Incident.occurrence_count,
+    Incident.last_occurred_at,
+    Incident.created_at,
+    Incident.updated_at,
+)
+
+
+def _to_fts_query(search: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, as a prefix"""
+    return " ".join(f'"{token}"*' for token in re.findall(r"\w+", search))
+
+
+def has_incident_search_index(session: Session = get_session()) -> bool:
+    if session.get_bind().dialect.name != "sqlite":
+        return False
+    row = session.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": INCIDENT_FTS_TABLE}
+    ).first()
+    return row is not None
+
+
+def query_incidents(status: Optional[str] = None,
+                    created_from: Optional[datetime] = None,
+                    created_to: Optional[datetime] = None,
+                    search: Optional[str] = None,
+                    page: int = 1,
+                    page_size: int = 20,
+                    session: Session = get_session()) -> Tuple[List[Incident], int]:
+    """
+    Get one page of incidents (newest first) and the total number of matches.
+    Only `INCIDENT_LIST_COLUMNS` are loaded; `search` uses the FTS5 index when available.
+    Timezone-aware date bounds are converted to UTC, in which `created_at` is stored.
+    """
+    query = session.query(Incident).options(load_only(*INCIDENT_LIST_COLUMNS))
+    if status:
+        query = query.filter(Incident.status == status)
+    if created_from is not None:
+        query = query.filter(Incident.created_at >= to_naive_utc(created_from))
+    if created_to is not None:
+        query = query.filter(Incident.created_at < to_naive_utc(created_to))
+    if search and search.strip():
+        fts_query = _to_fts_query(search)
+        if not fts_query:
+            return [], 0
+        if has_incident_search_index(session):
+            query = query.filter(text(
+                f"incidents.rowid IN (SELECT rowid FROM {INCIDENT_FTS_TABLE} "
+                f"WHERE {INCIDENT_FTS_TABLE} MATCH :fts_query)"
+            )).params(fts_query=fts_query)
+        else:
+            pattern = f"%{search.strip()}%"
+            query = query.filter(or_(
+                Incident.name.ilike(pattern),
+                Incident.description.ilike(pattern),
+                Incident.log.ilike(pattern),
+                Incident.solution.ilike(pattern),
+            ))
+
+    total = query.order_by(None).count()
+    incidents = query.order_by(
+        Incident.created_at.desc()
+    ).offset(max(page - 1, 0) * page_size).limit(page_size).all()
+    return incidents, total
+
+
 def get_incident_by_id(incident_id: str,
                        session: Session = get_session()) -> Optional[Incident]:
     return session.query(Incident).filter(Incident.id == incident_id).one_or_none()
@@ -21,20 +129,73 @@ def create_incident(name: str,
                     email: str,
                     log: Optional[str] = None,
                     sla_no_of_hours: float = 1.0,
+                    minhash: Optional[List[int]] = None,
                     session: Session = get_session()) -> Incident:
     incident = Incident(
         name=name,
         description=description,
         email=email,
         log=log,
+        log_signatures=" ".join(get_log_signatures(log)) or None,
         sla_no_of_hours=sla_no_of_hours,
+        minhash=encode_signature(minhash) if minhash else None,
     )
     session.add(incident)
+    if minhash:
+        session.flush()
+        session.execute(
+            insert(IncidentLshBand),
+            [{"band_key": key, "incident_id": incident.id} for key in lsh_band_keys(minhash)]
+        )
     session.commit()
     session.refresh(incident)
     return incident
 
 
+def bulk_create_incidents(rows: List[dict],
+                          session: Session = get_session()) -> int:
+    """
+    Insert incidents given as column dicts (each with an `id`) in one transaction.
+    Log signatures are derived like in `create_incident`; rows with a `minhash`
+    also get their LSH buckets.
+    """
+    if not rows:
+        return 0
+    bands = []
+    for row in rows:
+        row.setdefault("log_signatures", " ".join(get_log_signatures(row.get("log"))) or None)
+        if row.get("minhash"):
+            bands.extend(
+                {"band_key": key, "incident_id": row["id"]}
+                for key in lsh_band_keys(decode_signature(row["minhash"]))
+            )
+    session.execute(insert(Incident), rows)
+    if bands:
+        session.execute(insert(IncidentLshBand), bands)
+    session.commit()
+    return len(rows)
+
+
+def list_existing_incident_ids(incident_ids: Iterable[str],
+                               session: Session = get_session()) -> Set[str]:
+    incident_ids = list(incident_ids)
+    existing = set()
+    for chunk in _chunked(incident_ids):
+        existing.update(row.id for row in session.query(Incident.id).filter(Incident.id.in_(chunk)))
+    return existing
+
+
+def set_incident_similar_incidents(incident_id: str,
+                                   similar_incidents_json: Optional[str],
+                                   session: Session = get_session()) -> None:
+    session.execute(
+        update(Incident).where(Incident.id == incident_id).values(
+            similar_incidents_json=similar_incidents_json
+        )
+    )
+    session.commit()
+
+
 def resolve_incident(incident_id: str,
                      solution: str,
                      session: Session = get_session()) -> Optional[Incident]:
@@ -43,6 +204,8 @@ def resolve_incident(incident_id: str,
         return None
     incident.status = "resolved"
     incident.solution = solution
+    # Resolved incidents no longer absorb duplicates
+    session.execute(delete(IncidentLshBand).where(IncidentLshBand.incident_id == incident_id))
     session.commit()
     session.refresh(incident)
     return incident
@@ -54,6 +217,8 @@ def delete_incident(incident_id: str,
     if incident is None:
         return False
     session.delete(incident)
+    session.execute(delete(IncidentSlaCheck).where(IncidentSlaCheck.incident_id == incident_id))
+    session.execute(delete(IncidentLshBand).where(IncidentLshBand.incident_id == incident_id))
     session.commit()
     return True
 
@@ -80,6 +245,278 @@ def mark_incident_notified(incident_id: str,
     return incident
 
 
+def get_incidents_by_ids(incident_ids: Iterable[str],
+                         session: Session = get_session()) -> List[Incident]:
+    incident_ids = list(incident_ids)
+    incidents = []
+    for chunk in _chunked(incident_ids):
+        incidents.extend(session.query(Incident).filter(Incident.id.in_(chunk)).all())
+    return incidents
+
+
+def list_resolved_incident_ids(session: Session = get_session()) -> List[str]:
+    rows = session.query(Incident.id).filter(Incident.status == "resolved").order_by(Incident.updated_at.asc()).all()
+    return [row.id for row in rows]
+
+
+def mark_incidents_notified(incident_ids: Iterable[str],
+                            session: Session = get_session()) -> int:
+    incident_ids = list(incident_ids)
+    updated = 0
+    for chunk in _chunked(incident_ids):
+        result = session.execute(
+            update(Incident).where(Incident.id.in_(chunk)).values(notified=True)
+        )
+        updated += result.rowcount
+    session.commit()
+    return updated
+
+
+def find_duplicate_incident(minhash: List[int],
+                            since: datetime,
+                            threshold: float,
+                            email: Optional[str] = None,
+                            session: Session = get_session()) -> Optional[Incident]:
+    """
+    Most similar open incident that shares an LSH bucket with `minhash`, last
+    occurred after `since` and has an estimated Jaccard similarity >= threshold.
+    With `email`, only incidents notifying that recipient are considered.
+    """
+    candidate_ids = select(IncidentLshBand.incident_id).where(
+        IncidentLshBand.band_key.in_(lsh_band_keys(minhash))
+    ).distinct()
+    candidates = session.query(Incident).options(
+        load_only(Incident.id, Incident.minhash, Incident.created_at, Incident.last_occurred_at)
+    ).filter(
+        Incident.id.in_(candidate_ids),
+        Incident.status == "open",
+        func.coalesce(Incident.last_occurred_at, Incident.created_at) >= since,
+    )
+    if email is not None:
+        candidates = candidates.filter(Incident.email == email)
+    candidates = candidates.all()
+
+    best, best_score = None, threshold
+    for candidate in candidates:
+        if not candidate.minhash:
+            continue
+        score = estimate_jaccard(minhash, decode_signature(candidate.minhash))
+        if score >= best_score:
+            best, best_score = candidate, score
+    return best
+
+
+def record_incident_occurrence(incident_id: str,
+                               occurred_at: Optional[datetime] = None,
+                               session: Session = get_session()) -> Optional[Incident]:
+    """Fold one more occurrence into an incident (atomic counter increment)."""
+    session.execute(
+        update(Incident).where(Incident.id == incident_id).values(
+            occurrence_count=Incident.occurrence_count + 1,
+            last_occurred_at=occurred_at or utcnow(),
+        )
+    )
+    session.commit()
+    incident = get_incident_by_id(incident_id, session)
+    if incident is not None:
+        session.refresh(incident)
+    return incident
+
+
+def set_incident_triage(incident_id: str,
+                        status: str,
+                        answer: Optional[str] = None,
+                        images_json: Optional[str] = None,
+                        kb_version: Optional[int] = None,
+                        session: Session = get_session()) -> None:
+    """Update the triage state; the previous answer is kept unless a new one is given"""
+    values = {"triage_status": status, "triage_updated_at": utcnow()}
+    if answer is not None:
+        values.update(triage_answer=answer, triage_images_json=images_json)
+    if kb_version is not None:
+        values["triage_kb_version"] = kb_version
+    session.execute(update(Incident).where(Incident.id == incident_id).values(**values))
+    session.commit()
+
+
+def list_incidents_to_triage(kb_version: Optional[int] = None,
+                             outdated_limit: Optional[int] = None,
+                             session: Session = get_session()) -> List[Tuple[str, datetime, float]]:
+    """
+    Open incidents whose triage is pending or was interrupted, plus (with
+    `kb_version`) up to `outdated_limit` of those triaged against an older
+    knowledge base, least recently triaged first.
+    """
+    columns = (Incident.id, Incident.created_at, Incident.sla_no_of_hours)
+    rows = session.query(*columns).filter(
+        Incident.status == "open",
+        Incident.triage_status.in_(["pending", "running"]),
+    ).all()
+    if kb_version is not None:
+        rows += session.query(*columns).filter(
+            Incident.status == "open",
+            Incident.triage_status.in_(["done", "failed"]),
+            func.coalesce(Incident.triage_kb_version, -1) < kb_version,
+        ).order_by(Incident.triage_updated_at.asc()).limit(outdated_limit).all()
+    return [(row.id, row.created_at, row.sla_no_of_hours) for row in rows]
+
+
+# =========================IncidentSlaCheck=========================
+
+
+def schedule_sla_checks(entries: List[Tuple[str, datetime]],
+                        session: Session = get_session()) -> None:
+    """Persist (incident_id, due_at) pairs, replacing existing entries"""
+    if not entries:
+        return
+    incident_ids = [incident_id for incident_id, _ in entries]
+    for chunk in _chunked(incident_ids):
+        session.execute(delete(IncidentSlaCheck).where(IncidentSlaCheck.incident_id.in_(chunk)))
+    session.execute(
+        insert(IncidentSlaCheck),
+        [{"incident_id": incident_id, "due_at": due_at} for incident_id, due_at in entries]
+    )
+    session.commit()
+
+
+def list_sla_checks(created_after: Optional[datetime] = None,
+                    session: Session = get_session()) -> List[Tuple[str, datetime]]:
+    query = session.query(IncidentSlaCheck.incident_id, IncidentSlaCheck.due_at)
+    if created_after is not None:
+        query = query.filter(IncidentSlaCheck.created_at >= created_after)
+    return [(row.incident_id, row.due_at) for row in query.all()]
+
+
+def delete_sla_checks(incident_ids: Iterable[str],
+                      due_before: Optional[datetime] = None,
+                      session: Session = get_session()) -> None:
+    """Delete queued checks; with `due_before`, checks rescheduled later are kept"""
+    incident_ids = list(incident_ids)
+    for chunk in _chunked(incident_ids):
+        statement = delete(IncidentSlaCheck).where(IncidentSlaCheck.incident_id.in_(chunk))
+        if due_before is not None:
+            statement = statement.where(IncidentSlaCheck.due_at <= due_before)
+        session.execute(statement)
+    session.commit()
+
+
+def list_unscheduled_open_incidents(session: Session = get_session()) -> List[Tuple[str, datetime, float]]:
+    """Open, not yet notified incidents without a queued SLA check"""
+    rows = session.query(
+        Incident.id, Incident.created_at, Incident.sla_no_of_hours
+    ).outerjoin(
+        IncidentSlaCheck, IncidentSlaCheck.incident_id == Incident.id
+    ).filter(
+        IncidentSlaCheck.incident_id.is_(None),
+        Incident.status == "open",
+        Incident.notified == False,
+    ).all()
+    return [(row.id, row.created_at, row.sla_no_of_hours) for row in rows]
+
+
+# =========================OutboundEmail=========================
+
+
+def enqueue_incident_emails(emails: List[dict],
+                            session: Session = get_session()) -> List[OutboundEmail]:
+    """
+    Persist outgoing emails and hand their incidents over as notified, in one transaction.
+    Each email: {recipient, subject, body, incident_ids}.
+    """
+    now = utcnow()
+    outbound = [
+        OutboundEmail(
+            recipient=email["recipient"],
+            subject=email["subject"],
+            body=email["body"],
+            incident_ids_json=json.dumps(list(email.get("incident_ids", []))),
+            next_attempt_at=now,
+        )
+        for email in emails
+    ]
+    session.add_all(outbound)
+    incident_ids = [i for email in emails for i in email.get("incident_ids", [])]
+    for chunk in _chunked(incident_ids):
+        session.execute(update(Incident).where(Incident.id.in_(chunk)).values(notified=True))
+    session.commit()
+    return outbound
+
+
+def claim_due_emails(limit: int,
+                     session: Session = get_session()) -> List[OutboundEmail]:
+    """Mark up to `limit` due pending emails as "sending" and return them"""
+    emails = session.query(OutboundEmail).filter(
+        OutboundEmail.status == "pending",
+        OutboundEmail.next_attempt_at <= utcnow(),
+    ).order_by(
+        OutboundEmail.next_attempt_at.asc()
+    ).limit(limit).all()
+    for email in emails:
+        email.status = "sending"
+    session.commit()
+    return emails
+
+
+def get_next_email_attempt_at(session: Session = get_session()) -> Optional[datetime]:
+    row = session.query(OutboundEmail.next_attempt_at).filter(
+        OutboundEmail.status == "pending"
+    ).order_by(OutboundEmail.next_attempt_at.asc()).first()
+    return row.next_attempt_at if row else None
+
+
+def mark_email_sent(email_id: str,
+                    session: Session = get_session()) -> None:
+    session.execute(
+        update(OutboundEmail).where(OutboundEmail.id == email_id).values(
+            status="sent", sent_at=utcnow(), last_error=None
+        )
+    )
+    session.commit()
+
+
+def mark_email_failed(email_id: str,
+                      error: str,
+                      next_attempt_at: Optional[datetime] = None,
+                      renotify_at: Optional[datetime] = None,
+                      session: Session = get_session()) -> None:
+    """
+    Record a failed attempt. With `next_attempt_at` the email is retried later;
+    without it the email is given up and its incidents are marked not notified again.
+    With `renotify_at`, their open incidents also get a new SLA check at that time,
+    so the notification is sent again (as a new email) without a restart.
+    """
+    email = session.query(OutboundEmail).filter(OutboundEmail.id == email_id).one_or_none()
+    if email is None:
+        return
+    email.attempts += 1
+    email.last_error = error[:1000]
+    if next_attempt_at is not None:
+        email.status = "pending"
+        email.next_attempt_at = next_attempt_at
+    else:
+        email.status = "failed"
+        incident_ids = json.loads(email.incident_ids_json or "[]")
+        for chunk in _chunked(incident_ids):
+            session.execute(update(Incident).where(Incident.id.in_(chunk)).values(notified=False))
+        if renotify_at is not None:
+            open_ids = [
+                row.id
+                for chunk in _chunked(incident_ids)
+                for row in session.query(Incident.id).filter(Incident.id.in_(chunk), Incident.status == "open")
+            ]
+            schedule_sla_checks([(incident_id, renotify_at) for incident_id in open_ids], session)
+    session.commit()
+
+
+def reset_stuck_emails(session: Session = get_session()) -> int:
+    """Return emails left in "sending" by a crashed process to the queue"""
+    result = session.execute(
+        update(OutboundEmail).where(OutboundEmail.status == "sending").values(status="pending")
+    )
+    session.commit()
+    return result.rowcount
+
+
 # =========================ChatMessage=========================
 
 
@@ -100,6 +537,50 @@ def log_chat_message(username: str,
     return chat_message
 
 
+def log_chat_turn(username: str,
+                  prompt: str,
+                  response: str,
+                  images_json: Optional[str] = None,
+                  timestamp: Optional[datetime] = None,
+                  session: Session = get_session()) -> List[ChatMessage]:
+    """Log a human/AI message pair in a single transaction"""
+    return log_chat_turns([{
+        "username": username,
+        "prompt": prompt,
+        "response": response,
+        "images_json": images_json,
+        "timestamp": timestamp,
+    }], session)
+
+
+def log_chat_turns(turns: List[dict],
+                   session: Session = get_session()) -> List[ChatMessage]:
+    """
+    Log many chat turns with one commit and no refresh round trips.
+    Each turn: {username, prompt, response, images_json?, timestamp?}.
+    """
+    chat_messages = []
+    for turn in turns:
+        # Both messages share one timestamp so ordering falls back to is_human
+        timestamp = turn.get("timestamp") or utcnow()
+        chat_messages.append(ChatMessage(
+            username=turn["username"],
+            is_human=True,
+            message=turn["prompt"],
+            timestamp=timestamp,
+        ))
+        chat_messages.append(ChatMessage(
+            username=turn["username"],
+            is_human=False,
+            message=turn["response"],
+            images_json=turn.get("images_json"),
+            timestamp=timestamp,
+        ))
+    session.add_all(chat_messages)
+    session.commit()
+    return chat_messages
+
+
 def get_user_last_n_messages(username: str,
                              n: int = 40,
                              session: Session = get_session()) -> List[ChatMessage]:
@@ -113,11 +594,419 @@ def get_user_last_n_messages(username: str,
     return list(reversed(messages))  # return in chronological order
 
 
+def get_user_messages_after(username: str,
+                            after: Optional[datetime] = None,
+                            limit: Optional[int] = None,
+                            session: Session = get_session()) -> List[ChatMessage]:
+    """Get chat messages newer than `after` in chronological order"""
+    query = session.query(ChatMessage).filter(ChatMessage.username == username)
+    if after is not None:
+        query = query.filter(ChatMessage.timestamp > after)
+    query = query.order_by(
+        ChatMessage.timestamp.asc(),
+        ChatMessage.is_human.desc()  # human message, then AI message if same timestamp
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def list_recently_active_users(since: datetime,
+                               limit: int,
+                               session: Session = get_session()) -> List[str]:
+    """Users with chat messages after `since`, most recently active first"""
+    last_seen = func.max(ChatMessage.timestamp)
+    rows = session.execute(
+        select(ChatMessage.username)
+        .where(ChatMessage.timestamp > since)
+        .group_by(ChatMessage.username)
+        .order_by(last_seen.desc())
+        .limit(limit)
+    ).all()
+    return [username for username, in rows]
+
+
 def clear_user_chat_history(username: str,
                             session: Session = get_session()) -> int:
     """Delete all chat messages for a specific user"""
     deleted = session.query(ChatMessage).filter(
         ChatMessage.username == username
     ).delete()
+    session.query(ChatSummary).filter(
+        ChatSummary.username == username
+    ).delete()
     session.commit()
     return deleted
+
+
+# =========================ChatSummary=========================
+
+
+def get_chat_summary(username: str,
+                     session: Session = get_session()) -> Optional[ChatSummary]:
+    return session.query(ChatSummary).filter(ChatSummary.username == username).one_or_none()
+
+
+def save_chat_summary(username: str,
+                      summary: str,
+                      summarized_until: datetime,
+                      session: Session = get_session()) -> ChatSummary:
+    chat_summary = get_chat_summary(username, session)
+    if chat_summary is None:
+        chat_summary = ChatSummary(username=username)
+        session.add(chat_summary)
+    chat_summary.summary = summary
+    chat_summary.summarized_until = summarized_until
+    session.commit()
+    return chat_summary
+
+
+# =========================KnowledgeBaseVersion=========================
+
+
+def get_kb_version(username: str,
+                   session: Session = get_session()) -> int:
+    version = session.query(KnowledgeBaseVersion.version).filter(
+        KnowledgeBaseVersion.username == username
+    ).scalar()
+    return version or 0
+
+
+def bump_kb_version(username: str,
+                    session: Session = get_session()) -> int:
+    """Increment and return the user's knowledge base version"""
+    result = session.execute(
+        update(KnowledgeBaseVersion).where(KnowledgeBaseVersion.username == username).values(
+            version=KnowledgeBaseVersion.version + 1
+        )
+    )
+    if result.rowcount == 0:
+        try:
+            session.execute(insert(KnowledgeBaseVersion).values(username=username, version=1))
+        except IntegrityError:
+            # Created concurrently; bump that row instead
+            session.rollback()
+            return bump_kb_version(username, session)
+    session.commit()
+    return get_kb_version(username, session)
+
+
+# =========================CrawledPage=========================
+
+
+def list_crawled_pages(username: str,
+                       session: Session = get_session()) -> List[CrawledPage]:
+    return session.query(CrawledPage).filter(CrawledPage.username == username).all()
+
+
+def save_crawled_pages(username: str,
+                       pages: List[dict],
+                       session: Session = get_session()) -> None:
+    """Persist crawled page records (CrawledPage column dicts), replacing existing ones"""
+    if not pages:
+        return
+    urls = [page["url"] for page in pages]
+    for chunk in _chunked(urls):
+        session.execute(delete(CrawledPage).where(
+            CrawledPage.username == username,
+            CrawledPage.url.in_(chunk)
+        ))
+    session.execute(insert(CrawledPage), [{**page, "username": username} for page in pages])
+    session.commit()
+
+
+# =========================KnowledgeChunk=========================
+
+
+def find_duplicate_chunks(username: str,
+                          content_hashes: List[str],
+                          minhashes: List[List[int]],
+                          threshold: float,
+                          session: Session = get_session()) -> List[Optional[str]]:
+    """
+    For each chunk (content hash and MinHash), the id of an embedded chunk of
+    the user's knowledge base with the same text or an estimated Jaccard
+    similarity >= threshold, else None. Looked up in batches, not per chunk.
+    """
+    exact: Dict[str, str] = {}
+    for chunk in _chunked(list(set(content_hashes))):
+        exact.update(session.query(KnowledgeChunk.content_hash, KnowledgeChunk.chunk_id).filter(
+            KnowledgeChunk.username == username,
+            KnowledgeChunk.duplicate_of.is_(None),
+            KnowledgeChunk.content_hash.in_(chunk)
+        ).all())
+
+    band_keys = {i: lsh_band_keys(minhash) for i, minhash in enumerate(minhashes) if content_hashes[i] not in exact}
+    ids_by_band: Dict[str, Set[str]] = {}
+    all_keys = list({key for keys in band_keys.values() for key in keys})
+    for chunk in _chunked(all_keys):
+        for band_key, chunk_id in session.query(KnowledgeChunkLshBand.band_key, KnowledgeChunkLshBand.chunk_id).filter(
+            KnowledgeChunkLshBand.username == username,
+            KnowledgeChunkLshBand.band_key.in_(chunk)
+        ):
+            ids_by_band.setdefault(band_key, set()).add(chunk_id)
+
+    candidate_ids = list(set().union(*ids_by_band.values())) if ids_by_band else []
+    signatures: Dict[str, List[int]] = {}
+    for chunk in _chunked(candidate_ids):
+        for chunk_id, minhash in session.query(KnowledgeChunk.chunk_id, KnowledgeChunk.minhash).filter(
+            KnowledgeChunk.username == username,
+            KnowledgeChunk.chunk_id.in_(chunk)
+        ):
+            signatures[chunk_id] = decode_signature(minhash)
+
+    matches: List[Optional[str]] = []
+    for i, content_hash in enumerate(content_hashes):
+        if content_hash in exact:
+            matches.append(exact[content_hash])
+            continue
+        best, best_score = None, threshold
+        candidates = set().union(*(ids_by_band.get(key, ()) for key in band_keys[i]))
+        for chunk_id in candidates:
+            score = estimate_jaccard(minhashes[i], signatures.get(chunk_id, []))
+            if score >= best_score:
+                best, best_score = chunk_id, score
+        matches.append(best)
+    return matches
+
+
+def add_knowledge_chunks(username: str,
+                         rows: List[dict],
+                         session: Session = get_session()) -> None:
+    """
+    Index chunks given as KnowledgeChunk column dicts. Embedded chunks
+    (no `duplicate_of`) also get their LSH buckets.
+    """
+    if not rows:
+        return
+    rows = [{**row, "username": username} for row in rows]
+    bands = [
+        {"username": username, "band_key": key, "chunk_id": row["chunk_id"]}
+        for row in rows if row.get("duplicate_of") is None
+        for key in lsh_band_keys(decode_signature(row["minhash"]))
+    ]
+    session.execute(insert(KnowledgeChunk), rows)
+    if bands:
+        session.execute(insert(KnowledgeChunkLshBand), bands)
+    session.commit()
+
+
+def delete_knowledge_chunks(username: str,
+                            filenames: Optional[List[str]] = None,
+                            session: Session = get_session()) -> List[str]:
+    """
+    Remove the chunks of `filenames` (all of the user's chunks when None) from the index.
+    Returns the other files with chunks linked to a removed chunk; their content
+    is no longer embedded anywhere and must be embedded again.
+    """
+    if filenames is None:
+        session.execute(delete(KnowledgeChunkLshBand).where(KnowledgeChunkLshBand.username == username))
+        session.execute(delete(KnowledgeChunk).where(KnowledgeChunk.username == username))
+        session.commit()
+        return []
+
+    chunk_ids = []
+    for chunk in _chunked(list(filenames)):
+        chunk_ids.extend(session.scalars(select(KnowledgeChunk.chunk_id).where(
+            KnowledgeChunk.username == username,
+            KnowledgeChunk.filename.in_(chunk),
+            KnowledgeChunk.duplicate_of.is_(None)
+        )))
+    dependents: Set[str] = set()
+    for chunk in _chunked(chunk_ids):
+        dependents.update(session.scalars(select(KnowledgeChunk.filename).where(
+            KnowledgeChunk.username == username,
+            KnowledgeChunk.duplicate_of.in_(chunk)
+        )))
+        session.execute(delete(KnowledgeChunkLshBand).where(
+            KnowledgeChunkLshBand.username == username,
+            KnowledgeChunkLshBand.chunk_id.in_(chunk)
+        ))
+    for chunk in _chunked(list(filenames)):
+        session.execute(delete(KnowledgeChunk).where(
+            KnowledgeChunk.username == username,
+            KnowledgeChunk.filename.in_(chunk)
+        ))
+    session.commit()
+    return sorted(dependents - set(filenames))
+
+
+# =========================OcrCacheEntry=========================
+
+
+def get_ocr_cache_entry(key: str,
+                        session: Session = get_session()) -> Optional[str]:
+    """Cached OCR lines (JSON) for `key`, recording the hit for LRU eviction and statistics"""
+    lines_json = session.scalar(select(OcrCacheEntry.lines_json).where(OcrCacheEntry.key == key))
+    if lines_json is None:
+        return None
+    session.execute(
+        update(OcrCacheEntry).where(OcrCacheEntry.key == key).values(
+            hits=OcrCacheEntry.hits + 1,
+            last_used_at=utcnow(),
+        )
+    )
+    session.commit()
+    return lines_json
+
+
+def save_ocr_cache_entry(key: str,
+                         lines_json: str,
+                         session: Session = get_session()) -> None:
+    try:
+        session.execute(insert(OcrCacheEntry).values(key=key, lines_json=lines_json, last_used_at=utcnow()))
+        session.commit()
+    except IntegrityError:
+        # Same image recognized concurrently; the results are identical
+        session.rollback()
+
+
+def evict_ocr_cache(max_entries: int,
+                    session: Session = get_session()) -> int:
+    """Delete the least recently used entries beyond `max_entries`"""
+    excess = session.scalar(select(func.count()).select_from(OcrCacheEntry)) - max_entries
+    if excess <= 0:
+        return 0
+    oldest = select(OcrCacheEntry.key).order_by(OcrCacheEntry.last_used_at).limit(excess)
+    deleted = session.execute(delete(OcrCacheEntry).where(OcrCacheEntry.key.in_(oldest))).rowcount
+    session.commit()
+    return deleted
+
+
+def get_ocr_cache_summary(session: Session = get_session()) -> Tuple[int, int]:
+    """(entries, total hits) of the OCR cache"""
+    entries, hits = session.execute(
+        select(func.count(), func.coalesce(func.sum(OcrCacheEntry.hits), 0))
+    ).one()
+    return entries, hits
+
+
+# =========================DocumentImage=========================
+
+
+def _unreferenced_image_paths(username: str,
+                              paths: Iterable[str],
+                              session: Session) -> List[str]:
+    paths = list(set(paths))
+    referenced: Set[str] = set()
+    for chunk in _chunked(paths):
+        referenced.update(session.scalars(select(DocumentImage.path).where(
+            DocumentImage.username == username,
+            DocumentImage.path.in_(chunk)
+        )))
+    return sorted(set(paths) - referenced)
+
+
+def _remove_document_images(username: str,
+                            filenames: Optional[List[str]],
+                            session: Session) -> List[str]:
+    """Delete the image rows of `filenames` (all when None) without committing; returns their paths"""
+    if filenames is None:
+        paths = list(session.scalars(select(DocumentImage.path).where(DocumentImage.username == username)))
+        session.execute(delete(DocumentImage).where(DocumentImage.username == username))
+        return paths
+    paths = []
+    for chunk in _chunked(list(filenames)):
+        paths.extend(session.scalars(select(DocumentImage.path).where(
+            DocumentImage.username == username,
+            DocumentImage.filename.in_(chunk)
+        )))
+        session.execute(delete(DocumentImage).where(
+            DocumentImage.username == username,
+            DocumentImage.filename.in_(chunk)
+        ))
+    return paths
+
+
+def delete_document_images(username: str,
+                           filenames: Optional[List[str]] = None,
+                           session: Session = get_session()) -> List[str]:
+    """
+    Remove the image tables of `filenames` (all of the user's files when None).
+    Returns the image paths no other file of the user refers to.
+    """
+    paths = _remove_document_images(username, filenames, session)
+    orphaned = _unreferenced_image_paths(username, paths, session)
+    session.commit()
+    return orphaned
+
+
+def save_document_images(username: str,
+                         images_by_file: Dict[str, Dict[str, str]],
+                         session: Session = get_session()) -> List[str]:
+    """
+    Replace the image tables ({name: path}) of the given files.
+    Returns the image paths that were only referred to by the replaced tables.
+    """
+    if not images_by_file:
+        return []
+    previous = _remove_document_images(username, list(images_by_file), session)
+    rows = [
+        {"username": username, "filename": filename, "name": name, "path": path}
+        for filename, images in images_by_file.items()
+        for name, path in images.items()
+    ]
+    if rows:
+        session.execute(insert(DocumentImage), rows)
+    orphaned = _unreferenced_image_paths(username, previous, session)
+    session.commit()
+    return orphaned
+
+
+def get_document_images(username: str,
+                        refs: List[Tuple[str, str]],
+                        session: Session = get_session()) -> Dict[Tuple[str, str], str]:
+    """Image store paths of (filename, name) references"""
+    paths: Dict[Tuple[str, str], str] = {}
+    for chunk in _chunked(sorted({filename for filename, _ in refs})):
+        names = {name for filename, name in refs if filename in chunk}
+        for filename, name, path in session.execute(select(
+            DocumentImage.filename, DocumentImage.name, DocumentImage.path
+        ).where(
+            DocumentImage.username == username,
+            DocumentImage.filename.in_(chunk),
+            DocumentImage.name.in_(names)
+        )):
+            paths[(filename, name)] = path
+    return paths
+
+
+# =========================UploadedDocument=========================
+
+
+def find_uploaded_document(username: str,
+                           sha256: str,
+                           session: Session = get_session()) -> Optional[UploadedDocument]:
+    """The user's file uploaded with the same content, if any"""
+    return session.query(UploadedDocument).filter(
+        UploadedDocument.username == username,
+        UploadedDocument.sha256 == sha256
+    ).first()
+
+
+def record_uploaded_document(username: str,
+                             filename: str,
+                             sha256: str,
+                             size: int,
+                             session: Session = get_session()) -> None:
+    session.execute(delete(UploadedDocument).where(
+        UploadedDocument.username == username,
+        UploadedDocument.filename == filename
+    ))
+    session.execute(insert(UploadedDocument).values(username=username, filename=filename, sha256=sha256, size=size))
+    session.commit()
+
+
+def delete_uploaded_documents(username: str,
+                              filenames: Optional[List[str]] = None,
+                              session: Session = get_session()) -> None:
+    """Forget the hashes of `filenames` (all of the user's files when None)"""
+    if filenames is None:
+        session.execute(delete(UploadedDocument).where(UploadedDocument.username == username))
+    else:
+        for chunk in _chunked(list(filenames)):
+            session.execute(delete(UploadedDocument).where(
+                UploadedDocument.username == username,
+                UploadedDocument.filename.in_(chunk)
+            ))
+    session.commit()
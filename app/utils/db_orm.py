@@ -1,15 +1,18 @@
 import os
+import re
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from functools import lru_cache
 from typing import List, Optional
 
 from dotenv import load_dotenv
-from sqlalchemy import Boolean, DateTime, Float, String, create_engine, func
+from sqlalchemy import Boolean, DateTime, Float, Integer, String, create_engine, event, func, inspect
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
 
 from .template import load_templates_as_env_vars
+from .tracing import now_ns, record_span
 
 load_dotenv()
 
@@ -26,15 +29,128 @@ class Incident(Base):
     description: Mapped[str] = mapped_column(String, nullable=False)
     sla_no_of_hours: Mapped[float] = mapped_column(Float, nullable=False, default=1.0)
     log: Mapped[Optional[str]] = mapped_column(String)
+    log_signatures: Mapped[Optional[str]] = mapped_column(String)  # space-separated log template signatures
     email: Mapped[str] = mapped_column(String(255), nullable=False)
     status: Mapped[str] = mapped_column(String(20), nullable=False, default="open")  # "open" or "resolved"
     notified: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
     solution: Mapped[Optional[str]] = mapped_column(String)
+    similar_incidents_json: Mapped[Optional[str]] = mapped_column(String)  # resolved look-alikes found at report time
+    occurrence_count: Mapped[int] = mapped_column(Integer, nullable=False, default=1)  # near-duplicates folded into this incident
+    last_occurred_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    minhash: Mapped[Optional[str]] = mapped_column(String)  # encoded MinHash signature of name/description/log
+    triage_status: Mapped[Optional[str]] = mapped_column(String(20))  # "pending", "running", "done" or "failed"
+    triage_answer: Mapped[Optional[str]] = mapped_column(String)  # AI answer precomputed in the background
+    triage_images_json: Mapped[Optional[str]] = mapped_column(String)
+    triage_kb_version: Mapped[Optional[int]] = mapped_column(Integer)  # knowledge base version the answer was based on
+    triage_updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
     created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=False, server_default=func.now())
     # created_by: Mapped[Optional[str]] = mapped_column(String(255))
     updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
 
 
+class IncidentLshBand(Base):
+    """LSH buckets of open incidents, used to find near-duplicates without a full scan"""
+    __tablename__ = "incident_lsh_bands"
+
+    band_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    incident_id: Mapped[str] = mapped_column(String(36), primary_key=True, index=True)
+
+
+class IncidentSlaCheck(Base):
+    __tablename__ = "incident_sla_queue"
+
+    incident_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    due_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=False, server_default=func.now())
+
+
+class OutboundEmail(Base):
+    __tablename__ = "outbound_emails"
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    recipient: Mapped[str] = mapped_column(String(255), nullable=False)
+    subject: Mapped[str] = mapped_column(String(255), nullable=False)
+    body: Mapped[str] = mapped_column(String, nullable=False)
+    incident_ids_json: Mapped[Optional[str]] = mapped_column(String)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="pending")  # "pending", "sending", "sent" or "failed"
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=func.now(), index=True)
+    last_error: Mapped[Optional[str]] = mapped_column(String)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=False, server_default=func.now())
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+
+class CrawledPage(Base):
+    """Validators and hashes of a crawled URL, used for incremental recrawls"""
+    __tablename__ = "crawled_pages"
+
+    username: Mapped[str] = mapped_column(String(255), primary_key=True)
+    url: Mapped[str] = mapped_column(String, primary_key=True)
+    filename: Mapped[Optional[str]] = mapped_column(String)  # saved file in the user's docs folder
+    etag: Mapped[Optional[str]] = mapped_column(String)
+    last_modified: Mapped[Optional[str]] = mapped_column(String)  # Last-Modified header, verbatim
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64))  # sha256 of the response body
+    text_hash: Mapped[Optional[str]] = mapped_column(String(64))  # sha256 of the extracted text
+    links_json: Mapped[Optional[str]] = mapped_column(String)  # outlinks, so unchanged pages still expand the crawl
+    block_hashes_json: Mapped[Optional[str]] = mapped_column(String)  # text block hashes, for boilerplate detection
+    sitemap_lastmod: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class KnowledgeChunk(Base):
+    """MinHash of a chunk in a user's knowledge base, for near-duplicate detection across uploads"""
+    __tablename__ = "kb_chunks"
+
+    username: Mapped[str] = mapped_column(String(255), primary_key=True)
+    chunk_id: Mapped[str] = mapped_column(String(36), primary_key=True)  # vector id of embedded chunks
+    filename: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False, index=True)  # sha256 of the chunk text
+    minhash: Mapped[str] = mapped_column(String, nullable=False)  # base64-encoded signature
+    duplicate_of: Mapped[Optional[str]] = mapped_column(String(36), index=True)  # embedded chunk this one was linked to
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=func.now())
+
+
+class KnowledgeChunkLshBand(Base):
+    """LSH buckets of embedded knowledge base chunks"""
+    __tablename__ = "kb_chunk_lsh_bands"
+
+    username: Mapped[str] = mapped_column(String(255), primary_key=True)
+    band_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    chunk_id: Mapped[str] = mapped_column(String(36), primary_key=True, index=True)
+
+
+class OcrCacheEntry(Base):
+    """OCR result of an image, shared across documents and users"""
+    __tablename__ = "ocr_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256 of pixels, shape, language and engine version
+    lines_json: Mapped[str] = mapped_column(String, nullable=False)  # recognized text lines
+    hits: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=func.now())
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)  # LRU eviction order
+
+
+class DocumentImage(Base):
+    """Image referenced by [IMAGE:name] placeholders in a knowledge base file, resolved when an answer mentions it"""
+    __tablename__ = "document_images"
+
+    username: Mapped[str] = mapped_column(String(255), primary_key=True)
+    filename: Mapped[str] = mapped_column(String, primary_key=True)
+    name: Mapped[str] = mapped_column(String, primary_key=True)  # placeholder name, unique within the file
+    path: Mapped[str] = mapped_column(String, nullable=False, index=True)  # image store path
+
+
+class UploadedDocument(Base):
+    """Content hash of an uploaded knowledge base file, for duplicate uploads and conversion caching"""
+    __tablename__ = "uploaded_documents"
+
+    username: Mapped[str] = mapped_column(String(255), primary_key=True)
+    filename: Mapped[str] = mapped_column(String, primary_key=True)  # saved name (.docx for converted .doc uploads)
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False, index=True)  # of the uploaded bytes
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    uploaded_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=func.now())
+
+
 class ChatMessage(Base):
     __tablename__ = "chat_history"
 
@@ -46,6 +162,36 @@ class ChatMessage(Base):
     timestamp: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=False, server_default=func.now())
 
 
+class ChatSummary(Base):
+    __tablename__ = "chat_summaries"
+
+    username: Mapped[str] = mapped_column(String(255), primary_key=True)
+    summary: Mapped[str] = mapped_column(String, nullable=False, default="")
+    # all messages with timestamp <= summarized_until are folded into the summary
+    summarized_until: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+
+class KnowledgeBaseVersion(Base):
+    __tablename__ = "knowledge_base_versions"
+
+    username: Mapped[str] = mapped_column(String(255), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # bumped whenever the user's vector store changes
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+
+def utcnow() -> datetime:
+    """Naive UTC timestamp, matching what `func.now()` stores on SQLite."""
+    return datetime.now(tz=timezone.utc).replace(tzinfo=None)
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Timezone-aware datetime as naive UTC, for comparing with stored timestamps; naive values pass through"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
 def _ensure_sqlite_dir(db_url: str) -> str:
     """For sqlite URLs, ensure the parent directory exists before connecting."""
     if not db_url.startswith("sqlite"):
@@ -75,15 +221,171 @@ def get_engine(connection_url: str = None) -> Engine:
         connection_url = os.getenv("DATABASE_URL", f"sqlite:///{default_path}")
 
     connection_url = _ensure_sqlite_dir(connection_url)
-    return create_engine(connection_url)
+    engine = create_engine(connection_url)
+    _trace_writes(engine)
+    return engine
+
+
+WRITE_STATEMENT = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE)\b(?:\s+OR\s+\w+)?(?:\s+INTO|\s+FROM)?\s+"?(\w+)', re.IGNORECASE)
+
+
+def _trace_writes(engine: Engine) -> None:
+    """Record a `db.write` span per INSERT/UPDATE/DELETE statement run on `engine`"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("statement_start_ns", []).append(now_ns())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["statement_start_ns"].pop()
+        match = WRITE_STATEMENT.match(statement)
+        if match:
+            record_span("db.write", started, op=match.group(1).upper(), table=match.group(2), rows=cursor.rowcount)
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        starts = context.connection.info.get("statement_start_ns") if context.connection is not None else None
+        if starts:
+            started = starts.pop()
+            match = WRITE_STATEMENT.match(context.statement or "")
+            if match:
+                record_span("db.write", started, error=context.original_exception,
+                            op=match.group(1).upper(), table=match.group(2))
+
+
+@event.listens_for(Session, "before_commit")
+def _before_session_commit(session: Session) -> None:
+    session.info["commit_start_ns"] = now_ns()
+
+
+@event.listens_for(Session, "after_commit")
+def _after_session_commit(session: Session) -> None:
+    # Covers the flush of pending objects and the database commit
+    started = session.info.pop("commit_start_ns", None)
+    if started is not None:
+        record_span("db.commit", started)
 
 
 def get_session(engine: Engine = get_engine()) -> Session:
     return Session(engine)
 
 
+# Columns covered by the incident full-text search index
+INCIDENT_FTS_TABLE = "incidents_fts"
+INCIDENT_FTS_COLUMNS = ["name", "description", "log", "solution", "log_signatures"]
+
+
+def create_incident_search_index(engine: Engine = get_engine()) -> bool:
+    """
+    Create the SQLite FTS5 index over incidents plus the triggers that keep it in sync.
+    Returns False when the database is not SQLite or FTS5 is unavailable.
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+
+    cols = ", ".join(INCIDENT_FTS_COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in INCIDENT_FTS_COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in INCIDENT_FTS_COLUMNS)
+    with engine.begin() as conn:
+        existing = [row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({INCIDENT_FTS_TABLE})")]
+        if existing == INCIDENT_FTS_COLUMNS:
+            if _incident_rowids_drifted(conn):
+                # E.g. the database was vacuumed outside the app
+                conn.exec_driver_sql(f"INSERT INTO {INCIDENT_FTS_TABLE}({INCIDENT_FTS_TABLE}) VALUES ('rebuild')")
+            return True
+        if existing:
+            # Indexed columns changed: rebuild from scratch
+            conn.exec_driver_sql(f"DROP TABLE {INCIDENT_FTS_TABLE}")
+        for suffix in ("ai", "ad", "au"):
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {INCIDENT_FTS_TABLE}_{suffix}")
+        try:
+            conn.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE {INCIDENT_FTS_TABLE} USING fts5("
+                f"{cols}, content='incidents', content_rowid='rowid', "
+                # remove_diacritics 2 folds Vietnamese letters with stacked marks
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            return False
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {INCIDENT_FTS_TABLE}_ai AFTER INSERT ON incidents BEGIN "
+            f"INSERT INTO {INCIDENT_FTS_TABLE}(rowid, {cols}) VALUES (new.rowid, {new_cols}); END"
+        )
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {INCIDENT_FTS_TABLE}_ad AFTER DELETE ON incidents BEGIN "
+            f"INSERT INTO {INCIDENT_FTS_TABLE}({INCIDENT_FTS_TABLE}, rowid, {cols}) "
+            f"VALUES ('delete', old.rowid, {old_cols}); END"
+        )
+        # Only re-index when searchable columns change (not on e.g. `notified` updates)
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {INCIDENT_FTS_TABLE}_au AFTER UPDATE OF {cols} ON incidents BEGIN "
+            f"INSERT INTO {INCIDENT_FTS_TABLE}({INCIDENT_FTS_TABLE}, rowid, {cols}) "
+            f"VALUES ('delete', old.rowid, {old_cols}); "
+            f"INSERT INTO {INCIDENT_FTS_TABLE}(rowid, {cols}) VALUES (new.rowid, {new_cols}); END"
+        )
+        conn.exec_driver_sql(f"INSERT INTO {INCIDENT_FTS_TABLE}({INCIDENT_FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def _incident_rowids_drifted(conn) -> bool:
+    """
+    The index is keyed on the implicit rowid of `incidents`, which VACUUM may renumber
+    (the table has a string primary key). Renumbering shows up as indexed rowids
+    that no longer exist in the table.
+    """
+    row = conn.exec_driver_sql(
+        f"SELECT EXISTS (SELECT 1 FROM {INCIDENT_FTS_TABLE}_docsize "
+        f"WHERE id NOT IN (SELECT rowid FROM incidents))"
+    ).first()
+    return bool(row[0])
+
+
+def vacuum_database(engine: Engine = get_engine()) -> None:
+    """VACUUM the SQLite database and rebuild the incident search index, whose rowids it may renumber"""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM")
+    with engine.begin() as conn:
+        if conn.exec_driver_sql(f"PRAGMA table_info({INCIDENT_FTS_TABLE})").first() is not None:
+            conn.exec_driver_sql(f"INSERT INTO {INCIDENT_FTS_TABLE}({INCIDENT_FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _sql_literal(value) -> str:
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def add_missing_columns(engine: Engine = get_engine()) -> None:
+    """
+    Add columns introduced after a table was created, since `create_all` never alters tables.
+    New columns must be nullable or have a scalar default.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.default is not None and column.default.is_scalar:
+                    ddl += f" DEFAULT {_sql_literal(column.default.arg)}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.exec_driver_sql(ddl)
+
+
 def create_all_tables(engine: Engine = get_engine()) -> None:
     Base.metadata.create_all(engine)
+    add_missing_columns(engine)
+    create_incident_search_index(engine)
 
 
 def init_db():
@@ -0,0 +1,213 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+DOC_CONVERT_WORKERS         = int(os.getenv("DOC_CONVERT_WORKERS", min(2, os.cpu_count() or 1)))
+DOC_CONVERT_TIMEOUT_SECONDS = float(os.getenv("DOC_CONVERT_TIMEOUT_SECONDS", 120))
+DOC_CONVERT_CACHE_DIR       = os.getenv("DOC_CONVERT_CACHE_DIR", "data/doc_cache")
+WORKER_STOP_TIMEOUT         = 5.0
+
+# Fresh interpreters: no Streamlit state or threads inherited through fork
+_mp = multiprocessing.get_context("spawn")
+
+
+@dataclass
+class DocConversion:
+    doc_path: str
+    docx_path: Optional[str] = None
+    error: Optional[str] = None
+    cached: bool = False  # converted earlier from identical bytes
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _convert(doc_path: str, docx_path: str) -> None:
+    from spire.doc import Document as SpireDocument, FileFormat
+
+    doc = SpireDocument()
+    doc.LoadFromFile(doc_path)
+    doc.SaveToFile(docx_path, FileFormat.Docx2019)
+    doc.Close()
+
+
+def _worker_main(conn) -> None:
+    """Worker process: converts (doc_path, docx_path) jobs until it receives None"""
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        try:
+            _convert(*job)
+            conn.send(None)
+        except Exception as e:
+            conn.send(f"{type(e).__name__}: {e}")
+
+
+class _WorkerProcess:
+    """One Spire.Doc process, replaced when it crashes or exceeds the timeout"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._start()
+
+    def _start(self) -> None:
+        self._conn, child_conn = _mp.Pipe()
+        self._process = _mp.Process(target=_worker_main, args=(child_conn,), name=self.name, daemon=True)
+        self._process.start()
+        child_conn.close()
+
+    def _restart(self) -> None:
+        self._process.kill()
+        self._process.join(WORKER_STOP_TIMEOUT)
+        self._conn.close()
+        self._start()
+
+    def convert(self, doc_path: str, docx_path: str, timeout: float) -> Optional[str]:
+        """None on success, else the error"""
+        if not self._process.is_alive():
+            # Died while idle (e.g. killed by the OOM killer); don't fail the next file for it
+            self._restart()
+        try:
+            self._conn.send((doc_path, docx_path))
+            if not self._conn.poll(timeout):
+                logger.warning("%s: converting %s timed out, restarting", self.name, os.path.basename(doc_path))
+                self._restart()
+                return f"conversion timed out after {timeout:.0f}s"
+            return self._conn.recv()
+        except (EOFError, OSError):
+            exitcode = self._process.exitcode
+            logger.warning("%s crashed on %s (exit code %s), restarting", self.name, os.path.basename(doc_path), exitcode)
+            self._restart()
+            return f"converter process crashed (exit code {exitcode})"
+
+    def stop(self) -> None:
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        self._process.join(WORKER_STOP_TIMEOUT)
+        if self._process.is_alive():
+            self._process.kill()
+        self._conn.close()
+
+
+class DocConverter:
+    """
+    Persistent pool of worker processes converting legacy .doc files to .docx.
+
+    Each file gets its own timeout; a worker that hangs or crashes is replaced
+    without affecting the others. Results are cached by the SHA-256 of the .doc
+    bytes, so an identical upload (by any user) is converted once.
+    """
+
+    def __init__(self,
+                 workers: int = DOC_CONVERT_WORKERS,
+                 timeout: float = DOC_CONVERT_TIMEOUT_SECONDS,
+                 cache_dir: str = DOC_CONVERT_CACHE_DIR):
+        self.timeout = timeout
+        self.cache_dir = cache_dir
+        self._workers = [_WorkerProcess(f"doc-convert-{i}") for i in range(max(workers, 1))]
+        self._idle: "queue.Queue[_WorkerProcess]" = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+        self._executor = ThreadPoolExecutor(max_workers=len(self._workers), thread_name_prefix="doc-convert")
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def stop(self) -> None:
+        self._executor.shutdown(wait=True)
+        for worker in self._workers:
+            worker.stop()
+
+    def _cache_path(self, sha256: str) -> str:
+        return os.path.join(self.cache_dir, f"{sha256}.docx")
+
+    def _convert_cached(self, doc_path: str, sha256: str) -> Optional[str]:
+        """Fill the cache entry for `sha256` from `doc_path`; None on success, else the error"""
+        cache_path = self._cache_path(sha256)
+        if os.path.exists(cache_path):
+            return None
+        # Spire picks the output format by extension, so the temporary name keeps .docx
+        tmp_path = os.path.join(self.cache_dir, f"{sha256}.{uuid.uuid4().hex}.docx")
+        worker = self._idle.get()
+        try:
+            error = worker.convert(os.path.abspath(doc_path), os.path.abspath(tmp_path), self.timeout)
+        finally:
+            self._idle.put(worker)
+        if error is None and not os.path.exists(tmp_path):
+            error = "converter produced no output"
+        if error is not None:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return error
+        os.replace(tmp_path, cache_path)
+        return None
+
+    def convert_many(self,
+                     doc_paths: List[str],
+                     hashes: Optional[Dict[str, str]] = None) -> List[DocConversion]:
+        """
+        Convert `doc_paths` in parallel, replacing each .doc with a .docx next to it.
+        `hashes` may give known SHA-256s of the files. Failed files are left in place.
+        """
+        hashes = hashes or {}
+        digests = {path: hashes.get(path) or _file_sha256(path) for path in doc_paths}
+        cached = {digest for digest in digests.values() if os.path.exists(self._cache_path(digest))}
+
+        # One conversion per distinct content, also within this batch
+        first_path_by_digest: Dict[str, str] = {}
+        for path, digest in digests.items():
+            if digest not in cached:
+                first_path_by_digest.setdefault(digest, path)
+        errors = dict(zip(
+            first_path_by_digest,
+            self._executor.map(lambda item: self._convert_cached(item[1], item[0]), first_path_by_digest.items())
+        ))
+
+        results = []
+        for path in doc_paths:
+            digest = digests[path]
+            error = errors.get(digest)
+            if error is not None:
+                results.append(DocConversion(path, error=error))
+                continue
+            docx_path = os.path.splitext(path)[0] + ".docx"
+            shutil.copyfile(self._cache_path(digest), docx_path)
+            os.remove(path)
+            results.append(DocConversion(path, docx_path, cached=digest in cached))
+        return results
+
+
+@lru_cache()
+def get_doc_converter() -> DocConverter:
+    """Process-wide converter; its worker processes start on first use and are kept"""
+    return DocConverter()
+
+
+def convert_doc_files(doc_paths: List[str], hashes: Optional[Dict[str, str]] = None) -> List[DocConversion]:
+    if not doc_paths:
+        return []
+    return get_doc_converter().convert_many(doc_paths, hashes)
@@ -0,0 +1,161 @@
+import json
+import os
+import posixpath
+import zipfile
+from typing import List
+
+from langchain.docstore.document import Document
+from lxml import etree
+
+from .image_store import store_image
+
+# --- Constants ---
+DOCX_NS = {
+    "w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "v": "urn:schemas-microsoft-com:vml",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "mc": "http://schemas.openxmlformats.org/markup-compatibility/2006",
+}
+
+
+def _docx_tag(prefix: str, local: str) -> str:
+    return f"{{{DOCX_NS[prefix]}}}{local}"
+
+
+def _docx_image_targets(archive: zipfile.ZipFile) -> dict:
+    """Relationship id -> zip member of the images embedded in word/document.xml"""
+    try:
+        rels_xml = archive.read("word/_rels/document.xml.rels")
+    except KeyError:
+        return {}
+    targets = {}
+    for rel in etree.fromstring(rels_xml):
+        if rel.get("TargetMode") == "External" or not rel.get("Type", "").endswith("/image"):
+            continue
+        target = rel.get("Target", "")
+        targets[rel.get("Id")] = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("word", target))
+    return targets
+
+
+def load_text_from_docx_file(filepath: str) -> List[Document]:
+    """
+    Paragraphs, tables ("a | b" rows) and DrawingML/VML images of a DOCX in document
+    order, from a single iterparse pass over word/document.xml. Images go to the image
+    store as they are met; finished body elements are freed as the parse goes.
+    """
+    dirname = os.path.dirname(filepath)
+    basename = os.path.basename(filepath)
+
+    paragraph, table, row, cell = (_docx_tag("w", t) for t in ("p", "tbl", "tr", "tc"))
+    text, tab, breaks = _docx_tag("w", "t"), _docx_tag("w", "tab"), (_docx_tag("w", "br"), _docx_tag("w", "cr"))
+    blip, imagedata = _docx_tag("a", "blip"), _docx_tag("v", "imagedata")
+    blip_rid, imagedata_rid = _docx_tag("r", "embed"), _docx_tag("r", "id")
+    fallback, body = _docx_tag("mc", "Fallback"), _docx_tag("w", "body")
+
+    text_list = []
+    img_paths = {}
+    names_by_path = {}  # an image repeated in the document keeps one name
+    paragraphs: List[List[str]] = []  # open paragraphs (text boxes nest them)
+    tables: List[dict] = []           # open tables: finished rows, current row, current cell
+    in_fallback = 0                   # mc:Fallback repeats the mc:Choice content (e.g. VML copy of a drawing)
+
+    def _emit(block: str):
+        if tables:
+            tables[-1]["cell"].append(block)
+        else:
+            text_list.append(block)
+
+    def _flush_paragraph():
+        if paragraphs:
+            para_text = "".join(paragraphs[-1]).strip()
+            paragraphs[-1].clear()
+            if para_text:
+                _emit(para_text)
+
+    with zipfile.ZipFile(filepath) as archive:
+        image_targets = _docx_image_targets(archive)
+
+        def _save_image(_rid: str):
+            member = image_targets.get(_rid)
+            if member is None:
+                return
+            try:
+                image_bytes = archive.read(member)
+            except KeyError:
+                return
+            stored = store_image(image_bytes, dirname, fallback_ext=posixpath.splitext(member)[1])
+            img_name = names_by_path.get(stored.path)
+            if img_name is None:
+                img_name = f"image_{len(names_by_path) + 1}.{stored.ext}"
+                names_by_path[stored.path] = img_name
+            _flush_paragraph()
+            _emit(f"[IMAGE:{img_name}]")
+            img_paths[img_name] = stored.path
+
+        with archive.open("word/document.xml") as xml_file:
+            for event, elem in etree.iterparse(xml_file, events=("start", "end")):
+                tag = elem.tag
+                if event == "start":
+                    if tag == fallback:
+                        in_fallback += 1
+                    elif in_fallback:
+                        pass
+                    elif tag == paragraph:
+                        paragraphs.append([])
+                    elif tag == table:
+                        tables.append({"rows": [], "row": [], "cell": []})
+                    elif tag == row and tables:
+                        tables[-1]["row"] = []
+                    elif tag == cell and tables:
+                        tables[-1]["cell"] = []
+                    continue
+
+                if tag == fallback:
+                    in_fallback -= 1
+                elif in_fallback:
+                    continue
+                elif tag == text and paragraphs:
+                    paragraphs[-1].append(elem.text or "")
+                elif tag == tab and paragraphs:
+                    paragraphs[-1].append("\t")
+                elif tag in breaks and paragraphs:
+                    paragraphs[-1].append("\n")
+                elif tag == blip and elem.get(blip_rid):
+                    _save_image(elem.get(blip_rid))
+                elif tag == imagedata and elem.get(imagedata_rid):
+                    _save_image(elem.get(imagedata_rid))
+                elif tag == paragraph and paragraphs:
+                    _flush_paragraph()
+                    paragraphs.pop()
+                elif tag == cell and tables:
+                    tables[-1]["row"].append(" ".join(tables[-1]["cell"]))
+                    tables[-1]["cell"] = []
+                elif tag == row and tables:
+                    if any(tables[-1]["row"]):
+                        tables[-1]["rows"].append(" | ".join(tables[-1]["row"]))
+                elif tag == table and tables:
+                    rows = tables.pop()["rows"]
+                    if rows:
+                        _emit("\n".join(rows))
+
+                # Body-level elements are done with: free them and what came before
+                parent = elem.getparent()
+                if parent is not None and parent.tag == body:
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del parent[0]
+
+    full_text = "\n\n".join(text_list)
+    spire_watermark = "Evaluation Warning: The document was created with Spire.Doc for Python."
+    full_text = full_text.replace(spire_watermark, "").strip()
+
+    return [Document(
+        page_content=full_text,
+        metadata={
+            "source": filepath,
+            "filename": basename,
+            "img_paths_json": json.dumps(img_paths),
+            "img_list": ", ".join(img_paths.keys())
+        }
+    )]
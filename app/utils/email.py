@@ -1,70 +1,86 @@
 import os
-import smtplib
-import threading
-import time
-from datetime import timedelta
-from email.mime.text import MIMEText
+from collections import defaultdict
+from functools import lru_cache
+from typing import List
 
 from dotenv import load_dotenv
 from jinja2 import Template
 
-from .db_crud import (
-    get_incident_by_id,
-    is_incident_overdue,
-    mark_incident_notified,
-)
-from .db_orm import Incident
+from .db_crud import get_incident_by_id, get_incidents_by_ids
+from .db_orm import Incident, get_session
+from .mail_queue import get_mail_queue
+from .sla_scheduler import SlaScheduler, get_sla_due_at
 
 load_dotenv()
 
 
 def render_incident_email(incident: Incident) -> str:
+    return render_incident_digest([incident])
+
+
+def render_incident_digest(incidents: List[Incident]) -> str:
     template_str = os.getenv(
         "INCIDENT_EMAIL_TEMPLATE",
-        "{{ incident.name }} \n\n {{ incident.description }}"
+        "{% for incident in incidents %}{{ incident.name }} \n\n {{ incident.description }}\n\n{% endfor %}"
     )
     template = Template(template_str)
-    return template.render(incident=incident)
+    return template.render(incidents=incidents)
 
 
-def send_incident_email_delay(incident_id: str,
-                              subject: str = "Overdue Incident Notification"):
-    incident = get_incident_by_id(incident_id)
-    if incident is None:
-        return
+def is_email_digest_enabled() -> bool:
+    return os.getenv("EMAIL_DIGEST") == "TRUE"
+
+
+def notify_overdue_incidents(incident_ids: List[str],
+                             subject: str = "Overdue Incident Notification") -> None:
+    """
+    Queue notifications for every incident in the batch that is still open and
+    not yet notified. With EMAIL_DIGEST=TRUE, incidents for the same recipient
+    are coalesced into one email.
+    """
+    with get_session() as session:
+        incidents = [
+            incident for incident in get_incidents_by_ids(incident_ids, session)
+            if incident.status == "open" and not incident.notified
+        ]
+        if not incidents:
+            return
+
+        if is_email_digest_enabled():
+            by_recipient = defaultdict(list)
+            for incident in incidents:
+                by_recipient[incident.email].append(incident)
+            groups = list(by_recipient.values())
+        else:
+            groups = [[incident] for incident in incidents]
 
-    delay_time = incident.sla_no_of_hours * 60  # leave as minutes for testing purposes
-    time.sleep(delay_time)
+        emails = []
+        for group in groups:
+            emails.append({
+                "recipient": group[0].email,
+                "subject": subject if len(group) == 1 else f"{subject} ({len(group)} incidents)",
+                "body": render_incident_digest(group),
+                "incident_ids": [incident.id for incident in group],
+            })
+    get_mail_queue().enqueue(emails)
 
+
+@lru_cache()
+def get_sla_scheduler() -> SlaScheduler:
+    """Process-wide SLA scheduler; pending checks are reloaded on first use."""
+    return SlaScheduler(on_overdue=notify_overdue_incidents).start()
+
+
+def start_incident_notifier() -> None:
+    get_mail_queue()
+    get_sla_scheduler()
+
+
+def init_incident_notifier(incident_id: str):
     incident = get_incident_by_id(incident_id)
-    if incident is None or not is_incident_overdue(incident.id):
+    if incident is None:
         return
-
-    smtp_server = os.getenv("SMTP_SERVER", "localhost")
-    smtp_port = int(os.getenv("SMTP_PORT", 1025))
-    smtp_user = os.getenv("SMTP_USER", "")
-    smtp_password = os.getenv("SMTP_PASSWORD", "")
-    from_email = os.getenv("FROM_EMAIL", "noreply@example.com")
-
-    body = render_incident_email(incident)
-    msg = MIMEText(body, "html")
-    msg["Subject"] = subject
-    msg["From"] = from_email
-    msg["To"] = incident.email
-
-    with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-        if smtp_user and smtp_password:
-            server.login(smtp_user, smtp_password)
-        server.sendmail(from_email, [incident.email], msg.as_string())
-    
-    mark_incident_notified(incident_id)
-
-
-def init_incident_notifier(incident_id: str):    
-    thread = threading.Thread(
-        target=send_incident_email_delay,
-        args=(incident_id,),
-        daemon=True
+    get_sla_scheduler().schedule(
+        incident.id,
+        get_sla_due_at(incident.created_at, incident.sla_no_of_hours)
     )
-    thread.start()
-    # thread.join()
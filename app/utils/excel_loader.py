@@ -0,0 +1,118 @@
+import os
+import zipfile
+from datetime import date, datetime, time
+from typing import Iterable, Iterator, List, Tuple
+
+import openpyxl
+import xlrd
+from langchain.docstore.document import Document
+
+# --- Constants ---
+EXCEL_GROUP_ROWS  = 50    # data rows per spreadsheet Document, each with the header repeated
+EXCEL_GROUP_CHARS = 6000  # keeps a row group within one chunk
+
+
+def _format_cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == time() else value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    return " ".join(str(value).split())
+
+
+def _format_row(values: Iterable) -> str:
+    cells = [_format_cell(value) for value in values]
+    while cells and not cells[-1]:
+        cells.pop()
+    return " | ".join(cells)
+
+
+def _iter_xlsx_sheets(filepath: str) -> Iterator[Tuple[str, Iterator[tuple]]]:
+    # read_only streams rows from the sheet XML instead of building every cell object.
+    # Opened as a file object, since openpyxl rejects an .xls extension.
+    with open(filepath, "rb") as f:
+        workbook = openpyxl.load_workbook(f, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                yield sheet.title, sheet.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+
+def _iter_xls_sheets(filepath: str) -> Iterator[Tuple[str, Iterator[list]]]:
+    # on_demand parses one sheet at a time
+    workbook = xlrd.open_workbook(filepath, on_demand=True)
+    try:
+        for index in range(workbook.nsheets):
+            sheet = workbook.sheet_by_index(index)
+            datemode = workbook.datemode
+
+            def _rows(sheet=sheet, datemode=datemode):
+                for row in sheet.get_rows():
+                    yield [
+                        xlrd.xldate_as_datetime(cell.value, datemode) if cell.ctype == xlrd.XL_CELL_DATE else cell.value
+                        for cell in row
+                    ]
+            yield sheet.name, _rows()
+            workbook.unload_sheet(index)
+    finally:
+        workbook.release_resources()
+
+
+def load_text_from_excel_file(filepath: str) -> List[Document]:
+    """
+    Spreadsheet rows streamed sheet by sheet into Documents of up to EXCEL_GROUP_ROWS
+    rows as "a | b | c" lines. The sheet's first non-empty row is its header and is
+    repeated in every group, so each chunk can be read on its own.
+    """
+    basename = os.path.basename(filepath)
+    # By content, not extension: .xls files are often renamed .xlsx workbooks
+    if zipfile.is_zipfile(filepath):
+        sheets = _iter_xlsx_sheets(filepath)
+    else:
+        sheets = _iter_xls_sheets(filepath)
+
+    docs = []
+
+    def _add_group(sheet_name: str, header: str, lines: List[str], row_start: int, row_end: int):
+        docs.append(Document(
+            page_content="\n".join([f"Sheet: {sheet_name} (rows {row_start}-{row_end})", header] + lines),
+            metadata={
+                "source": filepath,
+                "filename": basename,
+                "sheet": sheet_name,
+                "row_start": row_start,
+                "row_end": row_end,
+                "img_list": ""
+            }
+        ))
+
+    for sheet_name, rows in sheets:
+        header, header_row = None, 0
+        group: List[str] = []
+        group_chars = row_start = row_end = 0
+        for row_number, values in enumerate(rows, start=1):
+            line = _format_row(values)
+            if not line.replace("|", "").strip():
+                continue
+            if header is None:
+                header, header_row = line, row_number
+                continue
+            if group and (len(group) >= EXCEL_GROUP_ROWS or group_chars + len(line) > EXCEL_GROUP_CHARS):
+                _add_group(sheet_name, header, group, row_start, row_end)
+                group, group_chars = [], 0
+            if not group:
+                row_start = row_number
+            group.append(line)
+            group_chars += len(line) + 1
+            row_end = row_number
+        if group:
+            _add_group(sheet_name, header, group, row_start, row_end)
+        elif header is not None:
+            # Only one row, e.g. a title or a key/value sheet
+            _add_group(sheet_name, header, [], header_row, header_row)
+    return docs
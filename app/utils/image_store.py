@@ -0,0 +1,122 @@
+import hashlib
+import io
+import logging
+import os
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+IMAGE_STORE_DIR         = "_store"  # under <docs>/images
+THUMBNAIL_SUFFIX        = ".thumb.webp"
+IMAGE_THUMBNAIL_SIZE    = int(os.getenv("IMAGE_THUMBNAIL_SIZE", 640))  # px, longest side
+IMAGE_THUMBNAIL_QUALITY = int(os.getenv("IMAGE_THUMBNAIL_QUALITY", 80))
+
+# Pillow format -> file extension
+PIL_EXTENSIONS = {
+    "JPEG": "jpg",
+    "PNG": "png",
+    "GIF": "gif",
+    "BMP": "bmp",
+    "TIFF": "tiff",
+    "WEBP": "webp",
+    "WMF": "wmf",
+    "EMF": "emf",
+    "ICO": "ico",
+    "JPEG2000": "jp2",
+}
+
+
+@dataclass
+class StoredImage:
+    path: str             # original bytes, stored once per distinct image
+    thumb: Optional[str]  # WebP rendition for galleries; None when the format can't be decoded
+    ext: str
+
+
+def get_store_dir(docs_dir: str) -> str:
+    return os.path.join(docs_dir, "images", IMAGE_STORE_DIR)
+
+
+def thumbnail_path(path: str) -> str:
+    return os.path.splitext(path)[0] + THUMBNAIL_SUFFIX
+
+
+def gallery_path(path: str) -> str:
+    """Thumbnail of a stored image if there is one, else the image itself (e.g. images extracted before the store)"""
+    thumb = thumbnail_path(path)
+    return thumb if os.path.exists(thumb) else path
+
+
+def _detect_extension(image_bytes: bytes, fallback_ext: Optional[str]) -> str:
+    # Pillow is only needed while documents are processed, not to show the chat page
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            ext = PIL_EXTENSIONS.get(img.format or "")
+    except (UnidentifiedImageError, OSError):
+        ext = None
+    if ext:
+        return ext
+    fallback_ext = (fallback_ext or "").lower().lstrip(".")
+    return "jpg" if fallback_ext == "jpeg" else (fallback_ext or "bin")
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _write_thumbnail(image_bytes: bytes, path: str) -> bool:
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            img.thumbnail((IMAGE_THUMBNAIL_SIZE, IMAGE_THUMBNAIL_SIZE))
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+            buffer = io.BytesIO()
+            img.save(buffer, format="WEBP", quality=IMAGE_THUMBNAIL_QUALITY, method=4)
+    except (UnidentifiedImageError, OSError, ValueError) as e:
+        logger.info("No thumbnail for %s: %s", os.path.basename(path), e)
+        return False
+    _write_atomic(path, buffer.getvalue())
+    return True
+
+
+def store_image(image_bytes: bytes, docs_dir: str, fallback_ext: Optional[str] = None) -> StoredImage:
+    """
+    Save `image_bytes` under images/_store/<sha[:2]>/<sha>.<ext> in `docs_dir`, with a
+    WebP thumbnail next to it. Identical images from any document share one file.
+    `fallback_ext` is used when Pillow can't identify the format (e.g. the DOCX part's extension).
+    """
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    ext = _detect_extension(image_bytes, fallback_ext)
+    shard_dir = os.path.join(get_store_dir(docs_dir), digest[:2])
+    path = os.path.join(shard_dir, f"{digest}.{ext}")
+    thumb = thumbnail_path(path)
+
+    if not os.path.exists(path):
+        os.makedirs(shard_dir, exist_ok=True)
+        _write_atomic(path, image_bytes)
+    if not os.path.exists(thumb) and not _write_thumbnail(image_bytes, thumb):
+        thumb = None
+    return StoredImage(path=path, thumb=thumb, ext=ext)
+
+
+def remove_images(paths: Iterable[str]) -> None:
+    """Delete stored images (and their thumbnails) no document refers to any more"""
+    for path in paths:
+        for file_path in (path, thumbnail_path(path)):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
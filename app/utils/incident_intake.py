@@ -0,0 +1,69 @@
+import os
+import threading
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from .db_crud import create_incident, find_duplicate_incident, record_incident_occurrence
+from .db_orm import Incident, get_session, utcnow
+from .email import init_incident_notifier
+from .log_templates import mine_log_templates
+from .minhash import minhash_signature, shingle
+from .similar_incidents import attach_similar_incidents
+from .sla_scheduler import get_sla_due_at
+from .triage import triage_incident_in_background
+
+load_dotenv()
+
+# --- Constants ---
+INCIDENT_DEDUP_WINDOW_MINUTES = float(os.getenv("INCIDENT_DEDUP_WINDOW_MINUTES", 30))
+INCIDENT_DEDUP_THRESHOLD      = float(os.getenv("INCIDENT_DEDUP_THRESHOLD", 0.8))
+
+# Serializes lookup + insert so two reports of the same storm cannot both become parents
+_intake_lock = threading.Lock()
+
+
+def is_incident_dedup_enabled() -> bool:
+    return os.getenv("INCIDENT_DEDUP", "TRUE") == "TRUE"
+
+
+def get_incident_minhash(name: str, description: str, log: Optional[str] = None) -> List[int]:
+    """MinHash of the incident text, with the log reduced to its templates so IDs and timestamps do not matter"""
+    parts = [name, description] + [template.template for template in mine_log_templates(log)]
+    return minhash_signature(shingle("\n".join(parts)))
+
+
+def report_incident(name: str,
+                    description: str,
+                    email: str,
+                    log: Optional[str] = None,
+                    sla_no_of_hours: float = 1.0,
+                    username: str = "admin",
+                    session: Session = get_session()) -> Tuple[Incident, bool]:
+    """
+    Report an incident. A near-duplicate of an open incident for the same recipient
+    that last occurred within the dedup window is folded into it instead of creating
+    a new one; a report for another recipient gets its own incident and notification.
+    Returns the (new or parent) incident and whether it was created.
+    """
+    minhash = get_incident_minhash(name, description, log)
+    with _intake_lock:
+        if is_incident_dedup_enabled():
+            parent = find_duplicate_incident(
+                minhash,
+                since=utcnow() - timedelta(minutes=INCIDENT_DEDUP_WINDOW_MINUTES),
+                threshold=INCIDENT_DEDUP_THRESHOLD,
+                email=email,
+                session=session,
+            )
+            if parent is not None:
+                # The parent's SLA timer and notification cover this occurrence
+                return record_incident_occurrence(parent.id, session=session), False
+        incident = create_incident(name, description, email, log, sla_no_of_hours, minhash, session)
+
+    init_incident_notifier(incident.id)
+    triage_incident_in_background(incident.id, get_sla_due_at(incident.created_at, incident.sla_no_of_hours))
+    attach_similar_incidents(username=username, incident=incident, session=session)
+    return incident, True
@@ -0,0 +1,33 @@
+import importlib
+import os
+import re
+from typing import Callable, Dict, List, Optional
+
+# Marks where an extracted image appears in a document's text
+IMAGE_PLACEHOLDER = re.compile(r"\[IMAGE:([^\]]+)\]")
+
+# Extension -> "module:function" of its loader (path -> LangChain Documents). Loader modules
+# are imported on first use, so PyMuPDF, lxml, openpyxl, xlrd or PaddleOCR are only loaded
+# once a file of their format is processed, not when the app starts.
+LOADERS: Dict[str, str] = {
+    ".pdf": "pdf_loader:load_pdf",
+    ".txt": "text_loader:load_text_from_txt_file",
+    ".docx": "docx_loader:load_text_from_docx_file",
+    ".xls": "excel_loader:load_text_from_excel_file",
+    ".xlsx": "excel_loader:load_text_from_excel_file",
+}
+
+
+def register_loader(extension: str, target: str) -> None:
+    """Add or replace the loader of an extension, e.g. (".md", "text_loader:load_text_from_txt_file")"""
+    LOADERS[extension.lower()] = target
+
+
+def get_loader(filename: str) -> Optional[Callable[[str], List]]:
+    """Loader for `filename` by extension, importing its module if needed; None if unsupported"""
+    target = LOADERS.get(os.path.splitext(filename)[1].lower())
+    if target is None:
+        return None
+    module_name, function_name = target.split(":")
+    module = importlib.import_module(f".{module_name}", __package__)
+    return getattr(module, function_name)
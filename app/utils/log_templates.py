@@ -0,0 +1,171 @@
+import hashlib
+import re
+from typing import Dict, Iterable, List, Optional
+
+# --- Constants ---
+WILDCARD        = "<*>"
+TREE_DEPTH      = 4     # token-count level + (TREE_DEPTH - 2) leading tokens
+SIM_THRESHOLD   = 0.5   # share of positions that must match to join a template
+MAX_CHILDREN    = 100
+MAX_EXAMPLES    = 3
+MAX_TOKENS      = 200   # longer lines are truncated before mining
+
+# Variable parts masked before clustering, most specific first
+_MASKS = [
+    re.compile(r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"),  # ISO timestamp
+    re.compile(r"\b\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?\b"),                                        # time of day
+    re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"),  # UUID
+    re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"),                                         # IPv4[:port]
+    re.compile(r"\b(?:[0-9a-fA-F]{2}[:-]){5}[0-9a-fA-F]{2}\b"),                                 # MAC address
+    re.compile(r"\b0x[0-9a-fA-F]+\b"),                                                          # hex literal
+    re.compile(r"\b(?=[0-9a-fA-F]*\d)(?=[0-9a-fA-F]*[a-fA-F])[0-9a-fA-F]{8,}\b"),                # long hex id
+    re.compile(r"[-+]?\b\d+(?:\.\d+)?\b"),                                                      # number
+]
+_MASK_TOKEN = "\x00"
+
+
+class LogTemplate:
+    """One cluster of log lines that differ only in their variable parts."""
+
+    def __init__(self, tokens: List[str], cluster_id: int):
+        self.tokens = tokens
+        self.cluster_id = cluster_id
+        self.count = 0
+        self.examples: List[List[str]] = []  # variable values of the first distinct lines
+
+    @property
+    def template(self) -> str:
+        return " ".join(self.tokens)
+
+    @property
+    def signature(self) -> str:
+        """Stable short hash of the template text, usable as a search keyword"""
+        return "lt" + hashlib.sha1(self.template.encode("utf-8")).hexdigest()[:12]
+
+    def add_example(self, variables: List[str]) -> None:
+        if variables and len(self.examples) < MAX_EXAMPLES and variables not in self.examples:
+            self.examples.append(variables)
+
+
+def _mask_line(line: str):
+    """Replace variable substrings by WILDCARD; return tokens and the extracted values."""
+    values = []
+
+    def _collect(match):
+        values.append(match.group(0))
+        return _MASK_TOKEN
+
+    for pattern in _MASKS:
+        line = pattern.sub(_collect, line)
+    tokens = line.split()[:MAX_TOKENS]
+    # Values are collected per pattern, not in line order; keep them as a bag
+    tokens = [t.replace(_MASK_TOKEN, WILDCARD) for t in tokens]
+    return tokens, values
+
+
+class LogTemplateMiner:
+    """
+    Streaming Drain-style log template miner.
+
+    Lines are routed through a fixed-depth prefix tree (token count, then the
+    first tokens), and joined to the most similar template in the leaf if
+    enough positions match; differing positions become wildcards.
+    """
+
+    def __init__(self,
+                 depth: int = TREE_DEPTH,
+                 sim_threshold: float = SIM_THRESHOLD,
+                 max_children: int = MAX_CHILDREN):
+        self.depth = max(depth - 2, 1)
+        self.sim_threshold = sim_threshold
+        self.max_children = max_children
+        self.root: Dict[int, dict] = {}
+        self.templates: List[LogTemplate] = []
+
+    def add_line(self, line: str) -> Optional[LogTemplate]:
+        line = line.strip()
+        if not line:
+            return None
+        tokens, values = _mask_line(line)
+        if not tokens:
+            return None
+
+        leaf = self._leaf_for(tokens)
+        best, best_sim = None, -1.0
+        for template in leaf:
+            sim = self._similarity(template.tokens, tokens)
+            if sim > best_sim:
+                best, best_sim = template, sim
+        if best is None or best_sim < self.sim_threshold:
+            best = LogTemplate(tokens, len(self.templates))
+            self.templates.append(best)
+            leaf.append(best)
+        else:
+            merged = []
+            for old, new in zip(best.tokens, tokens):
+                if old == new:
+                    merged.append(old)
+                else:
+                    merged.append(WILDCARD)
+                    values.append(new)
+            best.tokens = merged
+
+        best.count += 1
+        best.add_example(values)
+        return best
+
+    def add_lines(self, lines: Iterable[str]) -> "LogTemplateMiner":
+        for line in lines:
+            self.add_line(line)
+        return self
+
+    def _leaf_for(self, tokens: List[str]) -> list:
+        node = self.root.setdefault(len(tokens), {})
+        for token in tokens[:self.depth]:
+            # Tokens with digits are likely variables; route them together
+            key = WILDCARD if any(c.isdigit() for c in token) else token
+            if key not in node and len(node) >= self.max_children:
+                key = WILDCARD
+            node = node.setdefault(key, {})
+        return node.setdefault("_templates", [])
+
+    @staticmethod
+    def _similarity(template_tokens: List[str], tokens: List[str]) -> float:
+        same = sum(1 for a, b in zip(template_tokens, tokens) if a == b)
+        return same / max(len(tokens), 1)
+
+
+def mine_log_templates(log: str) -> List[LogTemplate]:
+    """Templates of a log in order of first appearance"""
+    if not log:
+        return []
+    return LogTemplateMiner().add_lines(log.splitlines()).templates
+
+
+def compress_log(log: Optional[str], max_templates: int = 50) -> Optional[str]:
+    """
+    Render a log as its distinct templates with counts and example variables,
+    e.g. "[x120] <*> link down on <*> (e.g. 10.0.0.1, eth0)".
+    """
+    if not log:
+        return log
+    templates = mine_log_templates(log)
+    lines = []
+    for template in templates[:max_templates]:
+        line = f"[x{template.count}] {template.template}"
+        if template.examples and WILDCARD in template.tokens:
+            examples = "; ".join(", ".join(example[:5]) for example in template.examples)
+            line += f" (e.g. {examples})"
+        lines.append(line)
+    if len(templates) > max_templates:
+        rest = sum(template.count for template in templates[max_templates:])
+        lines.append(f"... {len(templates) - max_templates} more templates ({rest} lines)")
+    compressed = "\n".join(lines)
+    # Short logs with no repetition are clearer verbatim
+    return compressed if len(compressed) < len(log) else log
+
+
+def get_log_signatures(log: Optional[str]) -> List[str]:
+    if not log:
+        return []
+    return [template.signature for template in mine_log_templates(log)]
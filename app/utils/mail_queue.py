@@ -0,0 +1,198 @@
+import logging
+import os
+import smtplib
+import threading
+from datetime import timedelta
+from email.mime.text import MIMEText
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+from dotenv import load_dotenv
+
+from .db_crud import (
+    claim_due_emails,
+    enqueue_incident_emails,
+    get_next_email_attempt_at,
+    mark_email_failed,
+    mark_email_sent,
+    reset_stuck_emails,
+)
+from .db_orm import get_session, utcnow
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+SEND_BATCH_SIZE    = 20
+MAX_ATTEMPTS       = 5
+BACKOFF_SECONDS    = 30.0  # doubled after every failed attempt
+MAX_BACKOFF        = 3600.0
+RENOTIFY_SECONDS   = float(os.getenv("MAIL_RENOTIFY_SECONDS", 3600))  # after giving up, notify again this much later
+POLL_SECONDS       = 30.0
+
+
+def smtp_connect() -> smtplib.SMTP:
+    """
+    Open an authenticated SMTP connection from environment settings.
+    SMTP_SECURITY is "ssl" (default), "starttls" or "none"; use "none" against a
+    local stand-in such as `python -m aiosmtpd -n -l localhost:1025`.
+    """
+    smtp_server = os.getenv("SMTP_SERVER", "localhost")
+    smtp_port = int(os.getenv("SMTP_PORT", 1025))
+    smtp_user = os.getenv("SMTP_USER", "")
+    smtp_password = os.getenv("SMTP_PASSWORD", "")
+    security = os.getenv("SMTP_SECURITY", "ssl").lower()
+
+    if security == "ssl":
+        server = smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=30)
+    else:
+        server = smtplib.SMTP(smtp_server, smtp_port, timeout=30)
+        if security == "starttls":
+            server.starttls()
+    if smtp_user and smtp_password:
+        server.login(smtp_user, smtp_password)
+    return server
+
+
+class SmtpConnection:
+    """One reusable SMTP connection, reopened when the server drops it."""
+
+    def __init__(self, factory: Callable[[], smtplib.SMTP] = smtp_connect):
+        self.factory = factory
+        self._server: Optional[smtplib.SMTP] = None
+
+    def send(self, from_email: str, to_email: str, message: str) -> None:
+        for attempt in range(2):
+            if self._server is None:
+                self._server = self.factory()
+            try:
+                self._server.sendmail(from_email, [to_email], message)
+                return
+            except smtplib.SMTPServerDisconnected:
+                # Idle connections get closed by the server; reconnect once
+                self._server = None
+                if attempt:
+                    raise
+
+    def close(self) -> None:
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            pass
+        self._server = None
+
+
+def get_backoff_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(BACKOFF_SECONDS * (2 ** max(attempts - 1, 0)), MAX_BACKOFF))
+
+
+class MailQueue:
+    """
+    Persistent outbound mail queue backed by `outbound_emails`.
+
+    Each worker thread keeps one authenticated SMTP connection and sends the
+    due emails in batches over it. Failures are retried with exponential
+    backoff; queued emails survive restarts. After the last attempt, the
+    incidents get a new SLA check `RENOTIFY_SECONDS` later.
+    """
+
+    def __init__(self,
+                 workers: int = 1,
+                 batch_size: int = SEND_BATCH_SIZE,
+                 max_attempts: int = MAX_ATTEMPTS,
+                 smtp_factory: Callable[[], smtplib.SMTP] = smtp_connect):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.smtp_factory = smtp_factory
+        self.from_email = os.getenv("FROM_EMAIL", "noreply@example.com")
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._claim_lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"mail-queue-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self) -> "MailQueue":
+        with get_session() as session:
+            reset = reset_stuck_emails(session)
+        if reset:
+            logger.info("Requeued %d emails interrupted by a restart", reset)
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def enqueue(self, emails: List[dict]) -> None:
+        """Persist emails ({recipient, subject, body, incident_ids}) and wake a worker."""
+        if not emails:
+            return
+        with get_session() as session:
+            enqueue_incident_emails(emails, session)
+        self._wakeup.set()
+
+    def _worker(self):
+        connection = SmtpConnection(self.smtp_factory)
+        try:
+            while not self._stop.is_set():
+                if not self._send_batch(connection):
+                    connection.close()  # do not hold idle connections open
+                    self._wait_for_work()
+        finally:
+            connection.close()
+
+    def _wait_for_work(self):
+        # Clear first so an enqueue racing with the lookup still wakes us up
+        self._wakeup.clear()
+        with get_session() as session:
+            next_attempt_at = get_next_email_attempt_at(session)
+        timeout = POLL_SECONDS
+        if next_attempt_at is not None:
+            timeout = max(0.0, min(timeout, (next_attempt_at - utcnow()).total_seconds()))
+        self._wakeup.wait(timeout)
+
+    def _send_batch(self, connection: SmtpConnection) -> bool:
+        """Send one batch of due emails. Returns False when nothing was due."""
+        with get_session() as session:
+            with self._claim_lock:
+                emails = claim_due_emails(self.batch_size, session)
+            if not emails:
+                return False
+
+            for email in emails:
+                try:
+                    msg = MIMEText(email.body, "html")
+                    msg["Subject"] = email.subject
+                    msg["From"] = self.from_email
+                    msg["To"] = email.recipient
+                    connection.send(self.from_email, email.recipient, msg.as_string())
+                except Exception as e:
+                    connection.close()
+                    attempts = email.attempts + 1
+                    next_attempt_at = renotify_at = None
+                    if attempts < self.max_attempts:
+                        next_attempt_at = utcnow() + get_backoff_delay(attempts)
+                    else:
+                        renotify_at = utcnow() + timedelta(seconds=RENOTIFY_SECONDS)
+                    logger.warning(
+                        "Failed to send email %s to %s (attempt %d): %s",
+                        email.id, email.recipient, attempts, e
+                    )
+                    mark_email_failed(email.id, repr(e), next_attempt_at, renotify_at, session)
+                    continue
+                mark_email_sent(email.id, session)
+            return True
+
+
+@lru_cache()
+def get_mail_queue() -> MailQueue:
+    """Process-wide mail queue; emails left over from a previous run are resumed."""
+    return MailQueue(workers=int(os.getenv("MAIL_QUEUE_WORKERS", 1))).start()
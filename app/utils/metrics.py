@@ -0,0 +1,107 @@
+import logging
+import os
+import threading
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .tracing import get_span_exporter, get_stage_histogram
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+METRICS_HOST   = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT   = int(os.getenv("METRICS_PORT", 9464))  # 0 disables the endpoint
+METRICS_PREFIX = "vsat_"
+
+# name -> (help, callback returning the current value)
+_gauges: Dict[str, Tuple[str, Callable[[], Optional[float]]]] = {}
+
+
+def register_gauge(name: str, help_text: str, callback: Callable[[], Optional[float]]) -> None:
+    """Expose `callback()` as a gauge on /metrics; None values are left out"""
+    _gauges[name] = (help_text, callback)
+
+
+def _format_le(le: float) -> str:
+    return "+Inf" if le == float("inf") else repr(le)
+
+
+def render_metrics() -> str:
+    """Stage latency histograms and registered gauges in the Prometheus text format"""
+    lines: List[str] = []
+    name = f"{METRICS_PREFIX}stage_latency_seconds"
+    stages = get_stage_histogram().snapshot()
+    lines.append(f"# HELP {name} Latency of traced stages (span names)")
+    lines.append(f"# TYPE {name} histogram")
+    for stage, data in sorted(stages.items()):
+        for le, count in data["buckets"]:
+            lines.append(f'{name}_bucket{{stage="{stage}",le="{_format_le(le)}"}} {count}')
+        lines.append(f'{name}_sum{{stage="{stage}"}} {data["sum"]:.6f}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {data["count"]}')
+
+    name = f"{METRICS_PREFIX}stage_errors_total"
+    lines.append(f"# HELP {name} Traced stages that raised")
+    lines.append(f"# TYPE {name} counter")
+    for stage, data in sorted(stages.items()):
+        lines.append(f'{name}{{stage="{stage}"}} {data["errors"]}')
+
+    exporter = get_span_exporter()
+    name = f"{METRICS_PREFIX}spans_dropped_total"
+    lines.append(f"# HELP {name} Spans not exported because the export queue was full")
+    lines.append(f"# TYPE {name} counter")
+    lines.append(f"{name} {exporter.dropped if exporter else 0}")
+
+    for gauge, (help_text, callback) in sorted(_gauges.items()):
+        try:
+            value = callback()
+        except Exception:
+            logger.exception("Metric %s failed", gauge)
+            continue
+        if value is None:
+            continue
+        lines.append(f"# HELP {METRICS_PREFIX}{gauge} {help_text}")
+        lines.append(f"# TYPE {METRICS_PREFIX}{gauge} gauge")
+        lines.append(f"{METRICS_PREFIX}{gauge} {float(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics: " + format, *args)
+
+
+@lru_cache()
+def get_metrics_server() -> Optional[ThreadingHTTPServer]:
+    """Process-wide /metrics endpoint for Prometheus, served from a daemon thread"""
+    if not METRICS_PORT:
+        return None
+    try:
+        server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), _MetricsHandler)
+    except OSError as e:
+        # E.g. a second app process on the same host; its stages are not exposed
+        logger.warning("Metrics endpoint not started on %s:%d: %s", METRICS_HOST, METRICS_PORT, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Serving metrics on http://%s:%d/metrics", METRICS_HOST, METRICS_PORT)
+    return server
+
+
+def start_metrics_server() -> None:
+    get_metrics_server()
@@ -0,0 +1,77 @@
+import base64
+import hashlib
+import random
+import re
+import struct
+from typing import Iterable, List, Set
+
+# --- Constants ---
+NUM_PERM          = 128
+LSH_BANDS         = 32      # 32 bands x 4 rows: pairs above ~0.5 Jaccard almost always collide
+SHINGLE_SIZE      = 5       # characters
+WORD_SHINGLE_SIZE = 5       # words, for long texts such as document chunks
+_MERSENNE         = (1 << 61) - 1
+_MAX_HASH         = (1 << 32) - 1
+
+_rng = random.Random(1)  # fixed seed: signatures are persisted and must stay comparable
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)]
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def shingle(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Character shingles of normalized text; short texts yield a single shingle."""
+    text = normalize_text(text)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def word_shingles(text: str, size: int = WORD_SHINGLE_SIZE) -> Set[str]:
+    """Word n-grams of normalized text; far fewer than character shingles for long texts."""
+    words = normalize_text(text).split()
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _hash_shingle(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def minhash_signature(shingles: Iterable[str]) -> List[int]:
+    """One minimum per permutation; empty input gives an all-max signature."""
+    hashes = [_hash_shingle(s) for s in shingles]
+    if not hashes:
+        return [_MAX_HASH] * NUM_PERM
+    return [
+        min(((a * h + b) % _MERSENNE) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def estimate_jaccard(signature_a: List[int], signature_b: List[int]) -> float:
+    if not signature_a or len(signature_a) != len(signature_b):
+        return 0.0
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / len(signature_a)
+
+
+def lsh_band_keys(signature: List[int], bands: int = LSH_BANDS) -> List[str]:
+    """Bucket keys; two signatures are LSH candidates if they share any key."""
+    rows = len(signature) // bands
+    keys = []
+    for band in range(bands):
+        chunk = struct.pack(f"<{rows}I", *signature[band * rows:(band + 1) * rows])
+        keys.append(f"{band}:{hashlib.blake2b(chunk, digest_size=8).hexdigest()}")
+    return keys
+
+
+def encode_signature(signature: List[int]) -> str:
+    return base64.b64encode(struct.pack(f"<{len(signature)}I", *signature)).decode("ascii")
+
+
+def decode_signature(value: str) -> List[int]:
+    raw = base64.b64decode(value)
+    return list(struct.unpack(f"<{len(raw) // 4}I", raw))
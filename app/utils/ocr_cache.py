@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from importlib.metadata import PackageNotFoundError, version
+from typing import List
+
+from dotenv import load_dotenv
+
+from .db_crud import evict_ocr_cache, get_ocr_cache_entry, get_ocr_cache_summary, save_ocr_cache_entry
+from .db_orm import get_session
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", 50000))
+OCR_CACHE_EVICT_EVERY = 100  # new entries between LRU size checks
+
+
+def is_ocr_cache_enabled() -> bool:
+    return os.getenv("OCR_CACHE", "TRUE") == "TRUE"
+
+
+@dataclass
+class OcrCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+# Since process start; persistent per-entry hit counts are in the ocr_cache table
+_stats = OcrCacheStats()
+_stats_lock = threading.Lock()
+_inserts_since_evict = 0
+
+
+@lru_cache()
+def get_ocr_engine_version() -> str:
+    try:
+        return f"paddleocr-{version('paddleocr')}"
+    except PackageNotFoundError:
+        return "paddleocr-unknown"
+
+
+def ocr_cache_key(img_array, lang: str) -> str:
+    """Hash of the decoded pixels, so re-encoded copies of an image share one entry"""
+    digest = hashlib.sha256()
+    digest.update(f"{img_array.shape}|{img_array.dtype}|{lang}|{get_ocr_engine_version()}|".encode("utf-8"))
+    digest.update(img_array.tobytes())
+    return digest.hexdigest()
+
+
+def _recognize(ocr, img_array) -> List[str]:
+    result = ocr.ocr(img_array, cls=True)
+    return [box[1][0] for line in result or [] for box in line or []]
+
+
+def cached_ocr(ocr, img_array, lang: str) -> List[str]:
+    """Text lines in `img_array` (decoded image), recognized once per distinct image, language and engine"""
+    global _inserts_since_evict
+    if not is_ocr_cache_enabled():
+        return _recognize(ocr, img_array)
+
+    key = ocr_cache_key(img_array, lang)
+    with get_session() as session:
+        lines_json = get_ocr_cache_entry(key, session)
+    if lines_json is not None:
+        with _stats_lock:
+            _stats.hits += 1
+        return json.loads(lines_json)
+
+    lines = _recognize(ocr, img_array)
+    with _stats_lock:
+        _stats.misses += 1
+        _inserts_since_evict += 1
+        evict = _inserts_since_evict >= OCR_CACHE_EVICT_EVERY
+        if evict:
+            _inserts_since_evict = 0
+    with get_session() as session:
+        save_ocr_cache_entry(key, json.dumps(lines, ensure_ascii=False), session)
+        if evict:
+            evicted = evict_ocr_cache(OCR_CACHE_MAX_ENTRIES, session)
+            if evicted:
+                logger.info("Evicted %d least recently used OCR cache entries", evicted)
+    return lines
+
+
+def get_ocr_cache_stats() -> dict:
+    with get_session() as session:
+        entries, total_hits = get_ocr_cache_summary(session)
+    with _stats_lock:
+        return {
+            "entries": entries,
+            "max_entries": OCR_CACHE_MAX_ENTRIES,
+            "total_hits": total_hits,
+            "process_hits": _stats.hits,
+            "process_misses": _stats.misses,
+            "process_hit_rate": round(_stats.hit_rate, 3),
+        }
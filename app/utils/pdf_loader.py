@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+from typing import List
+
+import fitz  # PyMuPDF
+import streamlit as st
+from langchain.docstore.document import Document
+
+from .image_store import store_image
+from .ocr_cache import cached_ocr, get_ocr_cache_stats
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+MIN_PDF_IMAGE_SIDE = 32  # px; smaller PDF images are rules, bullets and spacers
+
+
+def is_gibberish(text, threshold=0.3):
+    if not text:
+        return True
+    alnum = sum(c.isalnum() for c in text)
+    ratio = alnum / max(len(text), 1)
+    return ratio < threshold
+
+
+@st.cache_resource
+def get_ocr(lang: str):
+    from paddleocr import PaddleOCR
+    return PaddleOCR(lang=lang, use_angle_cls=True, show_log=False)
+
+
+def ocr_pdf_with_paddleocr(pdf_path, lang='vi'):  # Vietnamese support
+    import cv2
+    import numpy as np
+
+    ocr = get_ocr(lang)
+    stats_before = get_ocr_cache_stats()
+    doc = fitz.open(pdf_path)
+    all_text = []
+    for page_num in range(len(doc)):
+        page = doc.load_page(page_num)
+        images = page.get_images(full=True)
+        page_text = []
+        for img_index, img in enumerate(images):
+            xref = img[0]
+            base_image = doc.extract_image(xref)
+            image_bytes = base_image["image"]
+            img_array = np.frombuffer(image_bytes, np.uint8)
+            img_cv = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+            if img_cv is not None:
+                # Logos, letterheads and stamps repeat on every page: recognized once, then cached
+                page_text.extend(cached_ocr(ocr, img_cv, lang))
+        # If no images, try to render the page as an image and OCR it
+        if not images:
+            pix = page.get_pixmap()
+            img_cv = np.frombuffer(pix.samples, dtype=np.uint8).reshape((pix.height, pix.width, pix.n))
+            page_text.extend(cached_ocr(ocr, img_cv, lang))
+        if page_text:
+            all_text.append(f"Page {page_num+1}:\n" + "\n".join(page_text))
+    doc.close()
+    stats_after = get_ocr_cache_stats()
+    logger.info(
+        "OCR of %s: %d cache hits, %d misses (%d cached images)",
+        os.path.basename(pdf_path),
+        stats_after["process_hits"] - stats_before["process_hits"],
+        stats_after["process_misses"] - stats_before["process_misses"],
+        stats_after["entries"],
+    )
+    if all_text:
+        return [Document(
+            page_content="\n\n".join(all_text),
+            metadata={
+                "source": pdf_path,
+                "filename": os.path.basename(pdf_path)
+            }
+        )]
+    return []
+
+
+def load_text_from_pdf_file(filepath: str) -> List[Document]:
+    """
+    One Document per PDF page, extracted with PyMuPDF. Embedded images go to the
+    image store like DOCX images and are marked with [IMAGE:name] placeholders where they appear.
+    """
+    dirname = os.path.dirname(filepath)
+    basename = os.path.basename(filepath)
+    names_by_path = {}  # logos repeated on every page keep one name
+    docs = []
+
+    with fitz.open(filepath) as pdf:
+        for page in pdf:
+            parts = []
+            img_paths = {}
+            for block in page.get_text("dict")["blocks"]:
+                if block["type"] == 0:
+                    text = "\n".join(
+                        "".join(span["text"] for span in line["spans"]) for line in block["lines"]
+                    ).strip()
+                    if text:
+                        parts.append(text)
+                    continue
+                if block["width"] < MIN_PDF_IMAGE_SIDE or block["height"] < MIN_PDF_IMAGE_SIDE:
+                    continue
+                stored = store_image(block["image"], dirname, fallback_ext=block["ext"])
+                img_name = names_by_path.get(stored.path)
+                if img_name is None:
+                    img_name = f"image_{len(names_by_path) + 1}.{stored.ext}"
+                    names_by_path[stored.path] = img_name
+                parts.append(f"[IMAGE:{img_name}]")
+                img_paths[img_name] = stored.path
+
+            if parts:
+                docs.append(Document(
+                    page_content="\n\n".join(parts),
+                    metadata={
+                        "source": filepath,
+                        "filename": basename,
+                        "page": page.number,
+                        "img_paths_json": json.dumps(img_paths),
+                        "img_list": ", ".join(img_paths.keys())
+                    }
+                ))
+    return docs
+
+
+def has_text_layer(filepath: str) -> bool:
+    """Whether the PDF has readable text; scanned PDFs only have page images"""
+    with fitz.open(filepath) as pdf:
+        all_text = " ".join(page.get_text("text") for page in pdf)
+    return not is_gibberish(all_text.strip())
+
+
+def load_pdf(filepath: str) -> List[Document]:
+    """Text layer read with PyMuPDF, or PaddleOCR for scanned PDFs"""
+    # Decided before extraction, so page scans are never written to the image store
+    # for a PDF that is OCR'd instead (nothing would refer to them)
+    if has_text_layer(filepath):
+        loaded = load_text_from_pdf_file(filepath)
+        if loaded:
+            return loaded
+    st.warning(f"⚠️ Falling back to PaddleOCR for: {os.path.basename(filepath)}")
+    try:
+        return ocr_pdf_with_paddleocr(filepath, lang='vi')
+    except Exception:
+        return []
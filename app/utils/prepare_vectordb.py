@@ -1,34 +1,34 @@
-import hashlib
 import json
+import logging
 import os
-import re
 import shutil
-import uuid
 from collections import defaultdict
 from datetime import datetime, timezone
-from typing import List, Tuple
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, List, Tuple
 
-import fitz  # PyMuPDF for PDF image extraction
 import nest_asyncio
-import pandas as pd
 import streamlit as st
-from docx import Document as DocxDocument
-from docx.oxml.ns import qn
 from dotenv import load_dotenv
-from langchain.docstore.document import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import (
-    Docx2txtLoader,
-    PyPDFLoader,
-    TextLoader,
-    UnstructuredWordDocumentLoader,
-)
-from langchain_community.vectorstores import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain_core.embeddings import Embeddings
+
+from .chunk_dedup import dedupe_chunks, forget_chunks, index_chunks
+from .db_crud import bump_kb_version, delete_document_images, delete_uploaded_documents, save_document_images
+from .db_orm import get_session
+from .image_store import remove_images
+from .loader_registry import IMAGE_PLACEHOLDER, get_loader
+from .tracing import span
+
+if TYPE_CHECKING:
+    # Chroma and the Gemini client pull in chromadb, gRPC and protobuf; imported when first used
+    from langchain_community.vectorstores import Chroma
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
 nest_asyncio.apply()
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # --- Constants ---
 DEFAULT_DOCS_DIR    = "docs"
 DEFAULT_PERSIST_DIR = "Vector_DB - Documents"
@@ -54,249 +54,25 @@ def _format_cache_line(filename: str, ids: List[str]) -> str:
     return f"{filename}\\{'/'.join(ids)}" if ids else filename
 
 
-def is_gibberish(text, threshold=0.3):
-    if not text:
-        return True
-    alnum = sum(c.isalnum() for c in text)
-    ratio = alnum / max(len(text), 1)
-    return ratio < threshold
-
-
-@st.cache_resource
-def get_ocr(lang: str):
-    from paddleocr import PaddleOCR
-    return PaddleOCR(lang=lang, use_angle_cls=True, show_log=False)
-
-
-def ocr_pdf_with_paddleocr(pdf_path, lang='vi'):  # Vietnamese support
-    ocr = get_ocr(lang)
-    doc = fitz.open(pdf_path)
-    all_text = []
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        images = page.get_images(full=True)
-        page_text = []
-        for img_index, img in enumerate(images):
-            xref = img[0]
-            base_image = doc.extract_image(xref)
-            image_bytes = base_image["image"]
-            import cv2
-            import numpy as np
-            img_array = np.frombuffer(image_bytes, np.uint8)
-            img_cv = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-            if img_cv is not None:
-                result = ocr.ocr(img_cv, cls=True)
-                for line in result:
-                    for box in line:
-                        text = box[1][0]
-                        page_text.append(text)
-        # If no images, try to render the page as an image and OCR it
-        if not images:
-            pix = page.get_pixmap()
-            img_cv = np.frombuffer(pix.samples, dtype=np.uint8).reshape((pix.height, pix.width, pix.n))
-            result = ocr.ocr(img_cv, cls=True)
-            for line in result:
-                for box in line:
-                    text = box[1][0]
-                    page_text.append(text)
-        if page_text:
-            all_text.append(f"Page {page_num+1}:\n" + "\n".join(page_text))
-    doc.close()
-    if all_text:
-        return [Document(
-            page_content="\n\n".join(all_text),
-            metadata={
-                "source": pdf_path,
-                "filename": os.path.basename(pdf_path)
-            }
-        )]
-    return []
-
-
-def load_text_from_txt_file(filepath: str) -> List[Document]:
-    encodings = ['utf-8', 'utf-16', 'cp1252', 'iso-8859-1', 'gbk']
-    for encoding in encodings:
-        try:
-            with open(filepath, 'r', encoding=encoding) as f:
-                content = f.read()
-                return [Document(
-                    page_content=content,
-                    metadata={
-                        "source": filepath,
-                        "filename": os.path.basename(filepath),
-                        "img_list": ""
-                    }
-                )]
-        except (UnicodeDecodeError, LookupError):
-            continue
-
-    st.error(f"Cannot decode text file: {filepath}")
-    return []
-
-
-def load_text_from_docx_file(filepath: str) -> List[Document]:
-    dirname = os.path.dirname(filepath)
-    basename = os.path.basename(filepath)
-    img_dir = os.path.join(dirname, "images", basename)
-    os.makedirs(img_dir, exist_ok=True)
-
-    doc = DocxDocument(filepath)
-    rels = doc.part.rels
-    text_list = []
-    img_counter = 0
-    img_paths = {}
-    ns = {
-        "w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
-        "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
-        "v": "urn:schemas-microsoft-com:vml",
-        "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
-    }
-
-    def _save_image(_rid: str):
-        nonlocal img_counter
-        # if rid not in rels:
-        #     return
-        image_part = rels[_rid].target_part
-        image_bytes = image_part.blob
-        img_counter += 1
-        img_name = f"image_{img_counter}.png"
-        img_path = os.path.join(img_dir, img_name)
-        with open(img_path, "wb") as f:
-            f.write(image_bytes)
-        text_list.append(f"[IMAGE:{img_name}]")
-        img_paths[img_name] = img_path
-
-    for para in doc.paragraphs:
-        para_text = ""
-        for run in para.runs:
-            # normal text
-            if run.text:
-                para_text += run.text
-
-            # DrawingML images (native DOCX)
-            drawings = run._element.findall(".//w:drawing", namespaces=ns)
-            if drawings:
-                # # flush accumulated text first
-                # text_list.append(para_text)
-                # para_text = ""
-                para_text = para_text.strip()
-                if para_text:
-                    text_list.append(para_text)
-                    para_text = ""
-                # extract embedded image
-                for drawing in drawings:
-                    blips = drawing.findall(".//a:blip", namespaces=ns)
-                    for blip in blips:
-                        rid = blip.get(qn("r:embed"))
-                        if rid:
-                            _save_image(rid)
-
-            # VML images (DOC → Spire → DOCX)
-            picts = run._element.findall(".//w:pict", namespaces=ns)
-            if picts:
-                para_text = para_text.strip()
-                if para_text:
-                    text_list.append(para_text)
-                    para_text = ""
-                for pict in picts:
-                    imagedata = pict.findall(".//v:imagedata", namespaces=ns)
-                    for img in imagedata:
-                        rid = img.get(qn("r:id"))
-                        if rid:
-                            _save_image(rid)
-
-        # # flush remaining paragraph text
-        # text_list.append(para_text)
-        para_text = para_text.strip()
-        if para_text:
-            text_list.append(para_text)
-    
-    full_text = "\n\n".join(text_list)
-    spire_watermark = "Evaluation Warning: The document was created with Spire.Doc for Python."
-    full_text = full_text.replace(spire_watermark, "").strip()
-
-    return [Document(
-        page_content=full_text,
-        metadata={
-            "source": filepath,
-            "filename": basename,
-            "img_paths_json": json.dumps(img_paths),
-            "img_list": ", ".join(img_paths.keys())
-        }
-    )]
-
-
 def extract_text(file_list: List[str], docs_dir: str = DEFAULT_DOCS_DIR):
     docs = []
     for fn in file_list:
         path = os.path.join(docs_dir, fn)
         try:
-            if fn.lower().endswith(".pdf"):
-                loaded = PyPDFLoader(path).load()
-                for d in loaded:
-                    d.metadata["filename"] = os.path.basename(path)
-                    d.metadata.setdefault("img_list", "")
-                all_text = " ".join(doc.page_content for doc in loaded)
-                if not loaded or is_gibberish(all_text):
-                    st.warning(f"⚠️ Falling back to PaddleOCR for: {fn}")
-                    try:
-                        ocr_loaded = ocr_pdf_with_paddleocr(path, lang='vi')
-                        docs.extend(ocr_loaded)
-                    except Exception as ocr_e:
-                        continue
-                else:
-                    docs.extend(loaded)
-            elif fn.lower().endswith(".txt"):
-                docs.extend(load_text_from_txt_file(path))
-            elif fn.lower().endswith(".docx"):
-                # loaded = Docx2txtLoader(path).load()
-                # for d in loaded:
-                #     d.metadata["filename"] = os.path.basename(path)
-                # docs.extend(loaded)
-                docs.extend(load_text_from_docx_file(path))
             # If the code runs as expected, it will never reach this branch
             # because .doc files are already converted to .docx during upload.
-            elif fn.lower().endswith(".doc"):
-                # loaded = UnstructuredWordDocumentLoader(path).load()
-                # for d in loaded:
-                #     d.metadata["filename"] = os.path.basename(path)
-                #     d.metadata.setdefault("img_list", "")
-                # docs.extend(loaded)
-                #
-                # path = convert_doc2docx(path)
-                # docs.extend(load_text_from_docx_file(path))
+            if fn.lower().endswith(".doc"):
                 with open('tmp_log.txt', 'a', encoding='utf-8') as logf:
                     logf.write(f"Skipping .doc file (not supported): {fn}\n")
-            elif fn.lower().endswith(".xls") or fn.lower().endswith(".xlsx"):
-                # Excel support for both .xls and .xlsx, with engine selection
-                try:
-                    if fn.lower().endswith(".xls"):
-                        df = pd.read_excel(path, sheet_name=None, engine="xlrd")
-                    else:
-                        df = pd.read_excel(path, sheet_name=None, engine="openpyxl")
-                except Exception as e:
-                    # Fallback to default engine if specified engine fails
-                    try:
-                        df = pd.read_excel(path, sheet_name=None)
-                    except Exception as e2:
-                        st.error(f"❌ Failed to read Excel file {fn}: {e2}")
-                        continue
-                text = ""
-                for sheet, data in df.items():
-                    text += f"Sheet: {sheet}\n"
-                    text += data.to_string(index=False)
-                    text += "\n\n"
-                if text.strip():
-                    docs.append(Document(
-                        page_content=text,
-                        metadata={
-                            "source": path,
-                            "filename": os.path.basename(path),
-                            "img_list": ""
-                        }
-                    ))
-            else:
+                continue
+            loader = get_loader(fn)
+            if loader is None:
                 st.warning(f"⚠️ Unsupported file type: {fn}")
+                continue
+            with span("extract", filename=fn, format=os.path.splitext(fn)[1].lower()) as extract:
+                loaded = loader(path)
+                extract.set_attribute("documents", len(loaded))
+            docs.extend(loaded)
         except Exception as e:
             st.error(f"❌ Failed to process {fn}: {e}")
 
@@ -316,12 +92,38 @@ def get_text_chunks(
     chunk_size: int = CHUNK_SIZE,
     chunk_overlap: int = CHUNK_OVERLAP
 ):
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        separators=["\n\n", "\n", " ", ""],
-    )
-    return splitter.split_documents(docs)
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    with span("chunk", documents=len(docs)) as chunking:
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            separators=["\n\n", "\n", " ", ""],
+        )
+        chunks = splitter.split_documents(docs)
+        for chunk in chunks:
+            # Only the images this chunk shows; the paths stay in the file's image table
+            names = dict.fromkeys(IMAGE_PLACEHOLDER.findall(chunk.page_content))
+            chunk.metadata["img_list"] = ", ".join(names)
+        chunking.set_attribute("chunks", len(chunks))
+    return chunks
+
+
+def pop_document_images(docs) -> dict:
+    """
+    Take the {name: path} image maps out of loaded documents' metadata, so the
+    splitter doesn't copy them onto every chunk. Returns them merged per file;
+    every file gets an entry, so re-embedded files drop images they no longer have.
+    """
+    images_by_file = {}
+    for doc in docs:
+        meta = doc.metadata or {}
+        filename = meta.get("filename") or os.path.basename(str(meta.get("source", "")))
+        images = images_by_file.setdefault(filename, {})
+        img_paths_json = meta.pop("img_paths_json", None)
+        if img_paths_json:
+            images.update(json.loads(img_paths_json))
+    return images_by_file
 
 
 def save_text_chunks(
@@ -344,10 +146,6 @@ def save_text_chunks(
     print(f"✅ Exported {len(chunks)} chunks to '{chunks_dir}/'")
 
 
-def hash_text(text: str) -> str:
-    return hashlib.sha256(text.encode("utf-8")).hexdigest()
-
-
 # --- User-specific Constants ---
 def get_user_dirs(username: str):
     """Get user-specific directory paths"""
@@ -367,6 +165,89 @@ def ensure_user_dirs(username: str):
     return dirs
 
 
+class TracedEmbeddings(Embeddings):
+    """Embedding model wrapper recording an `embed` span per call, for documents and queries"""
+
+    def __init__(self, embeddings: "GoogleGenerativeAIEmbeddings"):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with span("embed", kind="documents", texts=len(texts)):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with span("embed", kind="query", texts=1):
+            return self.embeddings.embed_query(text)
+
+
+@lru_cache()
+def get_embedding_function() -> TracedEmbeddings:
+    """Shared embedding client, so the API handshake happens once per process"""
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    return TracedEmbeddings(GoogleGenerativeAIEmbeddings(
+        model=os.getenv('TEXT_EMBEDDING_MODEL'),
+        google_api_key=os.getenv('GOOGLE_API_KEY')
+    ))
+
+
+def open_vectorstore_user(username: str,
+                          collection_name: str = None,
+                          collection_metadata: dict = None) -> "Chroma":
+    """Open a user's vectorstore (or another collection in it) without processing files"""
+    from langchain_community.vectorstores import Chroma
+
+    dirs = ensure_user_dirs(username)
+    kwargs = {}
+    if collection_name:
+        kwargs["collection_name"] = collection_name
+    if collection_metadata:
+        kwargs["collection_metadata"] = collection_metadata
+    return Chroma(
+        persist_directory=dirs['vectordb'],
+        embedding_function=get_embedding_function(),
+        **kwargs
+    )
+
+
+def warm_vectorstore_user(username: str) -> bool:
+    """
+    Open a user's vectorstore and load its index with a search by a stored vector (no
+    embedding call), so the user's first question doesn't wait for it. False if the
+    user has no vectors yet.
+    """
+    if not os.path.isdir(get_user_dirs(username)['vectordb']):
+        return False
+    vectordb = open_vectorstore_user(username)
+    sample = vectordb.get(limit=1, include=["embeddings"])
+    embeddings = sample.get("embeddings")
+    if embeddings is None or len(embeddings) == 0:
+        return False
+    vectordb.similarity_search_by_vector([float(x) for x in embeddings[0]], k=1)
+    return True
+
+
+# Called with (username, new_version) after a user's vector store changed
+_kb_listeners: List[Callable[[str, int], None]] = []
+
+
+def add_knowledge_base_listener(listener: Callable[[str, int], None]) -> None:
+    if listener not in _kb_listeners:
+        _kb_listeners.append(listener)
+
+
+def mark_knowledge_base_changed(username: str) -> int:
+    """Bump the user's knowledge base version and notify listeners (e.g. incident triage)"""
+    with get_session() as session:
+        version = bump_kb_version(username, session)
+    for listener in list(_kb_listeners):
+        try:
+            listener(username, version)
+        except Exception:
+            logger.exception("Knowledge base listener failed for %s", username)
+    return version
+
+
 def has_new_files_user(username: str, current_files: List[str]) -> bool:
     """Check for new files in user's directory"""
     dirs = get_user_dirs(username)
@@ -380,10 +261,49 @@ def has_new_files_user(username: str, current_files: List[str]) -> bool:
     return set(current_files) != cached_files
 
 
+def forget_embedded_files(username: str, filenames: List[str]) -> int:
+    """
+    Delete the vectors of `filenames` and drop them from the file cache, so the
+    next `get_vectorstore_user` call embeds their current content again.
+    Returns the number of vectors deleted.
+    """
+    dirs = get_user_dirs(username)
+    cache_path = os.path.join(dirs['vectordb'], "files.txt")
+    if not filenames or not os.path.exists(cache_path):
+        return 0
+
+    # Files whose duplicate chunks were linked to these files' chunks lose their only embedding too
+    with get_session() as session:
+        linked_files = forget_chunks(username, list(filenames), session)
+    filenames = set(filenames) | set(linked_files)
+    ids_to_delete: List[str] = []
+    remaining_lines: List[str] = []
+    with open(cache_path, "r", encoding="utf-8") as f:
+        for line in f:
+            fname, ids = _parse_cache_line(line)
+            if not fname:
+                continue
+            if fname in filenames:
+                ids_to_delete.extend(ids)
+                continue
+            remaining_lines.append(line.strip())
+
+    with open(cache_path, "w", encoding="utf-8") as f:
+        for line in remaining_lines:
+            f.write(line + "\n")
+
+    if ids_to_delete:
+        vectordb = open_vectorstore_user(username)
+        vectordb.delete(ids=ids_to_delete)
+        vectordb.persist()
+        mark_knowledge_base_changed(username)
+    return len(ids_to_delete)
+
+
 def get_vectorstore_user(
         username: str,
         file_list: List[str] = []
-) -> Chroma:
+) -> "Chroma":
     """
     Get user-specific vectorstore
     """
@@ -391,16 +311,8 @@ def get_vectorstore_user(
     # Ensure user directories exist
     dirs = ensure_user_dirs(username)
 
-    embedding = GoogleGenerativeAIEmbeddings(
-        model=os.getenv('TEXT_EMBEDDING_MODEL'),
-        google_api_key=os.getenv('GOOGLE_API_KEY')
-    )
-
     # Load or create user-specific vectorstore
-    vectordb = Chroma(
-        persist_directory=dirs['vectordb'],
-        embedding_function=embedding
-    )
+    vectordb = open_vectorstore_user(username)
 
     # Load previously embedded file list
     cache_path = os.path.join(dirs['vectordb'], "files.txt")
@@ -408,6 +320,10 @@ def get_vectorstore_user(
     if os.path.exists(cache_path):
         with open(cache_path, "r", encoding="utf-8") as f:
             prev_files = set(_parse_cache_line(line)[0] for line in f)
+    else:
+        # New vector store: chunks indexed for an earlier one no longer exist
+        with get_session() as session:
+            forget_chunks(username, session=session)
 
     # Filter new files
     new_files = [f for f in file_list if f not in prev_files]
@@ -416,48 +332,52 @@ def get_vectorstore_user(
 
     st.info(f"🆕 Processing {len(new_files)} new files for user: {username}")
 
-    # Extract text from new files
-    docs = extract_text(new_files, dirs['docs'])
-    chunks = get_text_chunks(docs)
-
-    # Deduplicate by chunk content hash
-    seen_hashes = set()
-    unique_chunks: List[Document] = []
-    ids_by_file: defaultdict[str, List[str]] = defaultdict(list)
-    for chunk in chunks:
-        content_hash = hash_text(chunk.page_content)
-        if content_hash not in seen_hashes:
-            seen_hashes.add(content_hash)
-            unique_chunks.append(chunk)
-
-    # Add only unique chunks
-    if unique_chunks:
-        all_ids: List[str] = []
-
-        # Assign UUIDs per chunk and keep track by source filename
-        for chunk in unique_chunks:
-            src_path = chunk.metadata.get("source", "")
-            fname = os.path.basename(src_path)
-            cid = str(uuid.uuid4())
-            ids_by_file[fname].append(cid)
-            all_ids.append(cid)
-
-        vectordb.add_documents(unique_chunks, ids=all_ids)
-        vectordb.persist()
-
-        # st.success(f"✅ Added {len(unique_chunks)} unique chunks for {username}")
-
-        # Lưu thông báo vào session state thay vì st.success
-        st.session_state[f'vectorstore_success_{username}'] = f"✅ Added {len(unique_chunks)} unique chunks for {username}"
-
-    # Update file cache
-    with open(cache_path, "a", encoding="utf-8") as f:
-        for fname in new_files:
-            ids = ids_by_file.get(fname, [])
-            f.write(_format_cache_line(fname, ids) + "\n")
-
-    # Save chunks for inspection
-    save_text_chunks(unique_chunks, chunks_dir=dirs['chunks'], overwrite=False)
+    # One trace per ingestion job: extract, chunk, dedup, embed, vector add and DB writes
+    with span("ingest", username=username, files=len(new_files)):
+        # Extract text from new files
+        docs = extract_text(new_files, dirs['docs'])
+        images_by_file = pop_document_images(docs)
+        chunks = get_text_chunks(docs)
+
+        # Skip chunks that (nearly) duplicate chunks already in the user's knowledge base
+        with span("dedup", chunks=len(chunks)), get_session() as session:
+            dedup = dedupe_chunks(username, chunks, session=session)
+        unique_chunks = dedup.chunks
+        ids_by_file: defaultdict[str, List[str]] = defaultdict(list)
+
+        # Add only unique chunks
+        if unique_chunks:
+            # Keep track of vector ids by source filename
+            for chunk, cid in zip(unique_chunks, dedup.ids):
+                fname = os.path.basename(chunk.metadata.get("source", ""))
+                ids_by_file[fname].append(cid)
+
+            # Embedding calls show up as `embed` spans inside this one
+            with span("vector.add", chunks=len(unique_chunks)):
+                vectordb.add_documents(unique_chunks, ids=dedup.ids)
+                vectordb.persist()
+            mark_knowledge_base_changed(username)
+
+            # st.success(f"✅ Added {len(unique_chunks)} unique chunks for {username}")
+
+            # Lưu thông báo vào session state thay vì st.success
+            message = f"✅ Added {len(unique_chunks)} unique chunks for {username}"
+            if dedup.duplicates:
+                message += f" ({dedup.duplicates} duplicate chunks not embedded)"
+            st.session_state[f'vectorstore_success_{username}'] = message
+
+        with get_session() as session:
+            index_chunks(username, dedup, session)
+            remove_images(save_document_images(username, images_by_file, session))
+
+        # Update file cache
+        with open(cache_path, "a", encoding="utf-8") as f:
+            for fname in new_files:
+                ids = ids_by_file.get(fname, [])
+                f.write(_format_cache_line(fname, ids) + "\n")
+
+        # Save chunks for inspection
+        save_text_chunks(unique_chunks, chunks_dir=dirs['chunks'], overwrite=False)
 
     return vectordb
 
@@ -465,6 +385,10 @@ def get_vectorstore_user(
 def cleanup_user_data(username: str):
     """Clean up all user data"""
     user_base = f"data/kb/{username}"
+    with get_session() as session:
+        forget_chunks(username, session=session)
+        delete_document_images(username, session=session)
+        delete_uploaded_documents(username, session=session)
     if os.path.exists(user_base):
         shutil.rmtree(user_base)
         st.success(f"🗑️ Cleaned up all data for user: {username}")
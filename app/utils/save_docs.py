@@ -1,17 +1,28 @@
 import os
 import shutil
 from datetime import datetime, timezone
+from typing import List
 
 import streamlit as st
 from jinja2 import Template
 from langchain.docstore.document import Document
-from spire.doc import Document as SpireDocument, FileFormat
 
-from .db_orm import Incident
+from .db_crud import (
+    delete_document_images,
+    delete_uploaded_documents,
+    find_uploaded_document,
+    record_uploaded_document,
+)
+from .db_orm import Incident, get_session
+from .doc_convert import convert_doc_files
+from .image_store import remove_images
 from .prepare_vectordb import (
     ensure_user_dirs, get_user_dirs,
     get_vectorstore_user,
+    mark_knowledge_base_changed,
 )
+from .similar_incidents import index_resolved_incidents, remove_resolved_incident
+from .uploads import MAX_UPLOAD_BYTES, USER_QUOTA_BYTES, get_docs_usage, save_upload
 
 
 def save_docs_to_vectordb_user(username: str, uploaded_docs, existing_docs):
@@ -26,16 +37,6 @@ def save_docs_to_vectordb_user(username: str, uploaded_docs, existing_docs):
     Returns:
     - List of newly saved filenames
     """
-    def convert_doc2docx(doc_path: str) -> str:
-        """Convert `.doc` file to `.docx` and return new path."""
-        docx_path = os.path.splitext(doc_path)[0] + ".docx"
-        doc = SpireDocument()
-        doc.LoadFromFile(doc_path)
-        doc.SaveToFile(docx_path, FileFormat.Docx2019)
-        doc.Close()
-        os.remove(doc_path)
-        return docx_path
-
     # Get user-specific directories
     dirs = ensure_user_dirs(username)
     docs_dir = dirs['docs']
@@ -45,24 +46,66 @@ def save_docs_to_vectordb_user(username: str, uploaded_docs, existing_docs):
     new_file_names = []
 
     if new_files and st.button("Process"):
+        doc_paths = []
+        saved_by_name = {}
+        quota_left = USER_QUOTA_BYTES - get_docs_usage(docs_dir)
         for doc in new_files:
             file_path = os.path.join(docs_dir, doc.name)
-            fn = doc.name
+            if quota_left <= 0:
+                st.error(f"❌ Not saved {doc.name}: storage quota of {USER_QUOTA_BYTES // (1024 * 1024)} MB reached")
+                continue
             try:
-                with open(file_path, "wb") as f:
-                    f.write(doc.getvalue())
+                # Streamed in chunks and hashed on the way, instead of copying the whole upload with getvalue()
+                saved = save_upload(doc, file_path, max_bytes=min(MAX_UPLOAD_BYTES, quota_left))
                 # st.success(f"✅ Saved for {username}: {doc.name}")
-
-                if os.path.splitext(doc.name)[1].lower() == ".doc":
-                    file_path = convert_doc2docx(file_path)
-                    fn = os.path.basename(file_path)
-                    st.info(f"ℹ️ Converted .doc to .docx: {fn}")
-
-                new_file_names.append(fn)
             except Exception as e:
                 st.error(f"❌ Failed to save {doc.name}: {e}")
                 continue
 
+            duplicate = next((name for name, other in saved_by_name.items() if other.sha256 == saved.sha256), None)
+            if duplicate is None:
+                with get_session() as session:
+                    uploaded = find_uploaded_document(username, saved.sha256, session)
+                if uploaded is not None and os.path.exists(os.path.join(docs_dir, uploaded.filename)):
+                    duplicate = uploaded.filename
+            if duplicate is not None:
+                os.remove(file_path)
+                st.info(f"ℹ️ {doc.name} is identical to {duplicate}, skipped")
+                continue
+
+            quota_left -= saved.size
+            saved_by_name[doc.name] = saved
+            if os.path.splitext(doc.name)[1].lower() == ".doc":
+                doc_paths.append(file_path)
+            else:
+                new_file_names.append(doc.name)
+
+        # Legacy .doc files are converted to .docx in parallel worker processes
+        if doc_paths:
+            with st.spinner(f"Converting {len(doc_paths)} .doc files..."):
+                conversions = convert_doc_files(
+                    doc_paths,
+                    hashes={path: saved_by_name[os.path.basename(path)].sha256 for path in doc_paths},
+                )
+            for conversion in conversions:
+                name = os.path.basename(conversion.doc_path)
+                if conversion.error:
+                    # Unconvertible files are not extracted; do not keep them around (or count them in the quota)
+                    if os.path.exists(conversion.doc_path):
+                        os.remove(conversion.doc_path)
+                    saved_by_name.pop(name, None)
+                    st.error(f"❌ Failed to convert {name}: {conversion.error}")
+                    continue
+                fn = os.path.basename(conversion.docx_path)
+                saved_by_name[fn] = saved_by_name.pop(name)
+                new_file_names.append(fn)
+                st.info(f"ℹ️ Converted .doc to .docx: {fn}" + (" (cached)" if conversion.cached else ""))
+
+        with get_session() as session:
+            for fn in new_file_names:
+                saved = saved_by_name[fn]
+                record_uploaded_document(username, fn, saved.sha256, saved.size, session)
+
         return new_file_names
 
     return []
@@ -77,17 +120,16 @@ def get_user_documents(username: str):
         filenames = os.listdir(docs_dir)
         if "images" in filenames:
             filenames.remove("images")  # Exclude images directory
-        return filenames
+        return [fn for fn in filenames if not fn.startswith(".upload-")]  # uploads in progress
     return []
 
 
 def delete_user_document(username: str, filename: str):
     """Delete specific document for user and update cache"""
-    from .prepare_vectordb import get_user_dirs, get_vectorstore_user
+    from .prepare_vectordb import forget_embedded_files, get_user_dirs
 
     dirs = get_user_dirs(username)
     file_path = os.path.join(dirs['docs'], filename)
-    cache_path = os.path.join(dirs['vectordb'], "files.txt")
 
     if not os.path.exists(file_path):
         return False
@@ -95,52 +137,24 @@ def delete_user_document(username: str, filename: str):
     # 1) Delete physical file
     os.remove(file_path)
 
-    # 2) Delete image folder
+    # 2) Delete its images no other document shows, and the image folder of documents
+    #    extracted before the shared image store
+    with get_session() as session:
+        remove_images(delete_document_images(username, [filename], session))
+        delete_uploaded_documents(username, [filename], session)
     img_dir = os.path.join(dirs['docs'], "images", filename)
     if os.path.exists(img_dir):
         shutil.rmtree(img_dir)
 
     # 3) Remove vectors tied to this file using stored IDs
-    vectordb = get_vectorstore_user(username)
-    ids_to_delete = []
-    remaining_lines = []
-
-    if os.path.exists(cache_path):
-        with open(cache_path, "r", encoding="utf-8") as f:
-            for line in f:
-                raw = line.strip()
-                if not raw:
-                    continue
-                if "\\" in raw:
-                    fname, ids_part = raw.split("\\", 1)
-                    ids = [i for i in ids_part.split("/") if i]
-                else:
-                    fname, ids = raw, []
-
-                if fname == filename:
-                    ids_to_delete = ids
-                    continue  # skip writing this entry back
-                remaining_lines.append(raw)
-
-        with open(cache_path, "w", encoding="utf-8") as f:
-            for line in remaining_lines:
-                f.write(line + "\n")
-
-    if ids_to_delete:
-        vectordb.delete(ids=ids_to_delete)
-        vectordb.persist()
+    forget_embedded_files(username, [filename])
 
     st.success(f"🗑️ Deleted {filename} for user {username}")
     return True
 
 
-def add_resolved_incident_to_vectordb(
-    username: str,
-    incident: Incident,
-) -> str:
-    """Add resolved incident details to user's vectorstore"""
-    _ = ensure_user_dirs(username)
-
+def render_resolved_incident_doc(incident: Incident) -> Document:
+    """Knowledge-base document for a resolved incident"""
     template_str = os.getenv(
         "RESOLVED_INCIDENT_TEMPLATE",
         (
@@ -152,7 +166,7 @@ def add_resolved_incident_to_vectordb(
     template = Template(template_str)
     content = template.render(incident=incident)
     incident_id = f"incident_{incident.id}"
-    doc = Document(
+    return Document(
         page_content=content,
         metadata={
             "source": incident_id,
@@ -162,10 +176,34 @@ def add_resolved_incident_to_vectordb(
         }
     )
 
+
+def add_resolved_incidents_to_vectordb(
+    username: str,
+    incidents: List[Incident],
+) -> List[str]:
+    """Add many resolved incidents with one embedding call per collection"""
+    if not incidents:
+        return []
+    _ = ensure_user_dirs(username)
+
+    docs = [render_resolved_incident_doc(incident) for incident in incidents]
+    ids = [doc.metadata["source"] for doc in docs]
     vectordb = get_vectorstore_user(username)
-    vectordb.add_documents([doc], ids=[incident_id])
+    vectordb.add_documents(docs, ids=ids)
     vectordb.persist()
 
+    # Also index their symptoms for instant look-alike matching of new incidents
+    index_resolved_incidents(username, incidents)
+    mark_knowledge_base_changed(username)
+    return ids
+
+
+def add_resolved_incident_to_vectordb(
+    username: str,
+    incident: Incident,
+) -> str:
+    """Add resolved incident details to user's vectorstore"""
+    incident_id = add_resolved_incidents_to_vectordb(username, [incident])[0]
     st.success(f"✅ Added resolved incident '{incident.name}' to vectorstore for user: {username}")
     return incident_id
 
@@ -182,3 +220,5 @@ def delete_incident_from_vectordb(
 
     vectordb.delete(ids=[incident_id])
     vectordb.persist()
+    remove_resolved_incident(username, incident_id)
+    mark_knowledge_base_changed(username)
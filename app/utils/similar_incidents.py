@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import threading
+from functools import lru_cache
+from typing import List
+
+from dotenv import load_dotenv
+from langchain.docstore.document import Document
+from sqlalchemy.orm import Session
+
+from .db_crud import get_incidents_by_ids, list_resolved_incident_ids, set_incident_similar_incidents
+from .db_orm import Incident, get_session
+from .log_templates import compress_log, get_log_signatures
+from .prepare_vectordb import open_vectorstore_user
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+RESOLVED_INCIDENTS_COLLECTION = "resolved_incidents"
+SIMILAR_INCIDENTS_TOP_K       = int(os.getenv("SIMILAR_INCIDENTS_TOP_K", 3))
+SIMILAR_INCIDENTS_MIN_SCORE   = float(os.getenv("SIMILAR_INCIDENTS_MIN_SCORE", 0.75))
+MAX_LOG_CHARS                 = 2000
+LOG_SIGNATURE_WEIGHT          = float(os.getenv("LOG_SIGNATURE_WEIGHT", 0.2))
+BACKFILL_BATCH_SIZE           = 100
+
+
+def render_incident_symptoms(incident: Incident) -> str:
+    """Text that describes what an incident looks like (never its solution)"""
+    parts = [f"Name: {incident.name}", f"Description: {incident.description}"]
+    if incident.log:
+        # Mined templates keep distinct error patterns that raw truncation would cut off
+        parts.append(f"Log: {compress_log(incident.log)[:MAX_LOG_CHARS]}")
+    return "\n\n".join(parts)
+
+
+def _incident_signatures(incident: Incident) -> set:
+    if incident.log_signatures:
+        return set(incident.log_signatures.split())
+    return set(get_log_signatures(incident.log))
+
+
+def _signature_overlap(a: set, b: set) -> float:
+    return len(a & b) / len(a | b)
+
+
+def open_resolved_incident_index(username: str):
+    return open_vectorstore_user(
+        username,
+        collection_name=RESOLVED_INCIDENTS_COLLECTION,
+        collection_metadata={"hnsw:space": "cosine"},
+    )
+
+
+def index_resolved_incident(username: str, incident: Incident) -> None:
+    """Add (or replace) a resolved incident in the user's resolved-incident index"""
+    index_resolved_incidents(username, [incident])
+
+
+def index_resolved_incidents(username: str, incidents: List[Incident]) -> None:
+    if not incidents:
+        return
+    docs = [
+        Document(
+            page_content=render_incident_symptoms(incident),
+            metadata={
+                "incident_id": incident.id,
+                "name": incident.name,
+                "solution": incident.solution or "",
+                "resolved_at": str(incident.updated_at),
+                "log_signatures": " ".join(sorted(_incident_signatures(incident))),
+            }
+        )
+        for incident in incidents
+    ]
+    ids = [f"incident_{incident.id}" for incident in incidents]
+    index = open_resolved_incident_index(username)
+    index.delete(ids=ids)
+    index.add_documents(docs, ids=ids)
+
+
+def backfill_resolved_incident_index(username: str, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Index resolved incidents missing from the user's resolved-incident index, in batches
+    (one embedding call each), and return how many. Incidents resolved before the index
+    existed are only picked up here; once they are in, there is nothing left to do.
+    """
+    index = open_resolved_incident_index(username)
+    indexed = set(index.get(include=[])["ids"])
+    with get_session() as session:
+        missing = [
+            incident_id for incident_id in list_resolved_incident_ids(session)
+            if f"incident_{incident_id}" not in indexed
+        ]
+        for start in range(0, len(missing), batch_size):
+            index_resolved_incidents(username, get_incidents_by_ids(missing[start:start + batch_size], session))
+            logger.info("Backfilled %d of %d resolved incidents", min(start + batch_size, len(missing)), len(missing))
+    return len(missing)
+
+
+def _run_backfill(username: str) -> None:
+    try:
+        backfill_resolved_incident_index(username)
+    except Exception:
+        # Look-alike matching just stays incomplete until the next start
+        logger.exception("Backfilling the resolved-incident index failed")
+
+
+@lru_cache()
+def _start_backfill_thread(username: str) -> threading.Thread:
+    thread = threading.Thread(target=_run_backfill, args=(username,), name="resolved-incident-backfill", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_resolved_incident_backfill(username: str) -> None:
+    """Backfill the user's resolved-incident index in the background, once per process"""
+    _start_backfill_thread(username)
+
+
+def remove_resolved_incident(username: str, incident_id: str) -> None:
+    if not incident_id.startswith("incident_"):
+        incident_id = f"incident_{incident_id}"
+    open_resolved_incident_index(username).delete(ids=[incident_id])
+
+
+def find_similar_resolved_incidents(username: str,
+                                    incident: Incident,
+                                    k: int = SIMILAR_INCIDENTS_TOP_K,
+                                    min_score: float = SIMILAR_INCIDENTS_MIN_SCORE) -> List[dict]:
+    """
+    Nearest resolved incidents: [{incident_id, name, score, solution}], best first.
+    When both sides have logs, the score blends in the overlap of their log templates.
+    """
+    index = open_resolved_incident_index(username)
+    results = index.similarity_search_with_relevance_scores(render_incident_symptoms(incident), k=k)
+    signatures = _incident_signatures(incident)
+    matches = []
+    for doc, score in results:
+        meta = doc.metadata or {}
+        if meta.get("incident_id") == incident.id:
+            continue
+        other_signatures = set(meta.get("log_signatures", "").split())
+        if signatures and other_signatures:
+            score = ((1 - LOG_SIGNATURE_WEIGHT) * score
+                     + LOG_SIGNATURE_WEIGHT * _signature_overlap(signatures, other_signatures))
+        if score < min_score:
+            continue
+        matches.append({
+            "incident_id": meta.get("incident_id"),
+            "name": meta.get("name", ""),
+            "score": round(float(score), 4),
+            "solution": meta.get("solution", ""),
+        })
+    matches.sort(key=lambda match: match["score"], reverse=True)
+    return matches
+
+
+def attach_similar_incidents(username: str,
+                             incident: Incident,
+                             session: Session = get_session()) -> List[dict]:
+    """Look up resolved look-alikes of a new incident and store them on it"""
+    try:
+        matches = find_similar_resolved_incidents(username, incident)
+    except Exception:
+        # The lookup is an optimization; never block incident creation on it
+        return []
+    set_incident_similar_incidents(
+        incident.id,
+        json.dumps(matches, ensure_ascii=False) if matches else None,
+        session
+    )
+    return matches
+
+
+def load_similar_incidents(incident: Incident) -> List[dict]:
+    if not incident.similar_incidents_json:
+        return []
+    try:
+        return json.loads(incident.similar_incidents_json)
+    except Exception:
+        return []
@@ -0,0 +1,180 @@
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from .db_crud import (
+    delete_sla_checks,
+    list_sla_checks,
+    list_unscheduled_open_incidents,
+    schedule_sla_checks,
+)
+from .db_orm import get_session, utcnow
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+FIRE_BATCH_SIZE  = 500
+MAX_WAIT_SECONDS = 60.0  # re-check periodically in case of clock jumps
+SYNC_SECONDS     = 60.0  # how often checks queued by other processes are picked up
+SYNC_MARGIN      = timedelta(seconds=2)  # created_at may be stored with second precision
+
+
+def get_sla_due_at(created_at: datetime, sla_no_of_hours: float) -> datetime:
+    # leave as minutes for testing purposes
+    return created_at + timedelta(minutes=sla_no_of_hours)
+
+
+class SlaScheduler:
+    """
+    Single-thread SLA timer for all incidents.
+
+    Due times are persisted in `incident_sla_queue` and mirrored in an
+    in-memory min-heap. The thread sleeps until the earliest deadline, then
+    hands every overdue incident ID to `on_overdue` in batches.
+    """
+
+    def __init__(self,
+                 on_overdue: Callable[[List[str]], None],
+                 batch_size: int = FIRE_BATCH_SIZE):
+        self.on_overdue = on_overdue
+        self.batch_size = batch_size
+        self._heap: List[Tuple[datetime, str]] = []
+        self._due: Dict[str, datetime] = {}  # latest due time per incident; stale heap entries are skipped
+        self._cond = threading.Condition()
+        self._stop = False
+        self._synced_at = utcnow()
+        self._thread = threading.Thread(target=self._run, name="sla-scheduler", daemon=True)
+
+    def start(self) -> "SlaScheduler":
+        """Reload pending checks (and backfill open incidents) before starting the timer thread."""
+        self._synced_at = utcnow() - SYNC_MARGIN
+        with get_session() as session:
+            backfill = [
+                (incident_id, get_sla_due_at(created_at, sla_no_of_hours))
+                for incident_id, created_at, sla_no_of_hours in list_unscheduled_open_incidents(session)
+            ]
+            schedule_sla_checks(backfill, session)
+            entries = list_sla_checks(session=session)
+
+        with self._cond:
+            for incident_id, due_at in entries:
+                self._due[incident_id] = due_at
+            self._heap = [(due_at, incident_id) for incident_id, due_at in entries]
+            heapq.heapify(self._heap)
+        self._thread.start()
+        logger.info("SLA scheduler started with %d pending checks", len(entries))
+        return self
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+
+    def schedule(self, incident_id: str, due_at: datetime) -> None:
+        self.schedule_many([(incident_id, due_at)])
+
+    def schedule_many(self, entries: List[Tuple[str, datetime]]) -> None:
+        """Persist and enqueue (incident_id, due_at) pairs."""
+        if not entries:
+            return
+        with get_session() as session:
+            schedule_sla_checks(entries, session)
+        with self._cond:
+            for incident_id, due_at in entries:
+                self._due[incident_id] = due_at
+                heapq.heappush(self._heap, (due_at, incident_id))
+            self._cond.notify()
+
+    def sync(self) -> int:
+        """Load checks persisted by other processes (e.g. bulk ingestion) since the last sync."""
+        synced_at = utcnow() - SYNC_MARGIN
+        with get_session() as session:
+            entries = list_sla_checks(created_after=self._synced_at, session=session)
+        self._synced_at = synced_at
+        added = 0
+        with self._cond:
+            for incident_id, due_at in entries:
+                if self._due.get(incident_id) == due_at:
+                    continue
+                self._due[incident_id] = due_at
+                heapq.heappush(self._heap, (due_at, incident_id))
+                added += 1
+            if added:
+                self._cond.notify()
+        return added
+
+    def cancel(self, incident_id: str) -> None:
+        with self._cond:
+            self._due.pop(incident_id, None)
+        with get_session() as session:
+            delete_sla_checks([incident_id], session=session)
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._due)
+
+    def next_due_at(self):
+        with self._cond:
+            self._drop_stale_head()
+            return self._heap[0][0] if self._heap else None
+
+    def _pop_due_batch(self) -> List[str]:
+        """Wait for the next deadline, then pop up to `batch_size` overdue IDs."""
+        with self._cond:
+            while not self._stop:
+                self._drop_stale_head()
+                now = utcnow()
+                if self._heap and self._heap[0][0] <= now:
+                    break
+                until_sync = SYNC_SECONDS - (now - self._synced_at).total_seconds()
+                if until_sync <= 0:
+                    return []  # let the run loop sync first
+                timeout = min(MAX_WAIT_SECONDS, until_sync)
+                if self._heap:
+                    timeout = min(timeout, (self._heap[0][0] - now).total_seconds())
+                self._cond.wait(timeout)
+            if self._stop:
+                return []
+
+            now = utcnow()
+            batch = []
+            while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+                due_at, incident_id = heapq.heappop(self._heap)
+                if self._due.get(incident_id) != due_at:
+                    continue
+                del self._due[incident_id]
+                batch.append(incident_id)
+            return batch
+
+    def _drop_stale_head(self):
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def _run(self):
+        while True:
+            if (utcnow() - self._synced_at).total_seconds() >= SYNC_SECONDS:
+                try:
+                    added = self.sync()
+                    if added:
+                        logger.info("Picked up %d SLA checks queued elsewhere", added)
+                except Exception:
+                    logger.exception("Failed to sync SLA checks")
+            batch = self._pop_due_batch()
+            fired_at = utcnow()
+            if not batch:
+                if self._stop:
+                    return
+                continue
+            try:
+                self.on_overdue(batch)
+            except Exception:
+                logger.exception("SLA check failed for %d incidents", len(batch))
+            # Rows are removed only after the callback ran, so a crash re-fires them on restart
+            try:
+                with get_session() as session:
+                    delete_sla_checks(batch, due_before=fired_at, session=session)
+            except Exception:
+                logger.exception("Failed to remove %d fired SLA checks", len(batch))
@@ -0,0 +1,26 @@
+import os
+from typing import List
+
+import streamlit as st
+from langchain.docstore.document import Document
+
+
+def load_text_from_txt_file(filepath: str) -> List[Document]:
+    encodings = ['utf-8', 'utf-16', 'cp1252', 'iso-8859-1', 'gbk']
+    for encoding in encodings:
+        try:
+            with open(filepath, 'r', encoding=encoding) as f:
+                content = f.read()
+                return [Document(
+                    page_content=content,
+                    metadata={
+                        "source": filepath,
+                        "filename": os.path.basename(filepath),
+                        "img_list": ""
+                    }
+                )]
+        except (UnicodeDecodeError, LookupError):
+            continue
+
+    st.error(f"Cannot decode text file: {filepath}")
+    return []
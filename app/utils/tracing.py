@@ -0,0 +1,281 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+SERVICE_NAME        = os.getenv("SERVICE_NAME", "vsat-chatbot")
+TRACE_DIR           = os.getenv("TRACE_DIR", "logs/traces")
+TRACE_FILE_MAX_MB   = float(os.getenv("TRACE_FILE_MAX_MB", 100))  # rotated once to <name>.1 beyond this
+TRACE_QUEUE_SIZE    = 10000  # spans waiting for export; further spans are counted as dropped
+TRACE_BATCH_SIZE    = 500
+TRACE_FLUSH_SECONDS = 1.0
+LATENCY_BUCKETS     = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def is_tracing_enabled() -> bool:
+    return os.getenv("TRACING", "TRUE") == "TRUE"
+
+
+def get_trace_exporters() -> List[str]:
+    """File exporters to write spans with: `jsonl` and/or `otlp` (OTLP/JSON, as read by the collector's otlpjsonfile receiver)"""
+    return [name.strip().lower() for name in os.getenv("TRACE_EXPORTERS", "jsonl").split(",") if name.strip()]
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_ns: int = 0  # Unix epoch nanoseconds
+    end_ns: int = 0
+    attributes: Dict[str, object] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration_seconds(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram per stage (span name), in Prometheus bucket layout"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counts: Dict[str, List[int]] = {}  # stage -> per-bucket counts, last one is +Inf
+        self._sums: Dict[str, float] = {}
+        self._errors: Dict[str, int] = {}
+
+    def observe(self, stage: str, seconds: float, error: bool = False) -> None:
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            counts = self._counts.setdefault(stage, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[stage] = self._sums.get(stage, 0.0) + seconds
+            if error:
+                self._errors[stage] = self._errors.get(stage, 0) + 1
+
+    def snapshot(self) -> Dict[str, dict]:
+        """stage -> {buckets: [(le, cumulative count)], count, sum, errors}"""
+        with self._lock:
+            result = {}
+            for stage, counts in self._counts.items():
+                cumulative, running = [], 0
+                for le, count in zip(list(self.buckets) + [float("inf")], counts):
+                    running += count
+                    cumulative.append((le, running))
+                result[stage] = {
+                    "buckets": cumulative,
+                    "count": running,
+                    "sum": self._sums[stage],
+                    "errors": self._errors.get(stage, 0),
+                }
+            return result
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp_json(spans: List[Span]) -> dict:
+    """ExportTraceServiceRequest in the OTLP/JSON encoding"""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{
+            "scope": {"name": __name__},
+            "spans": [{
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            } for span in spans],
+        }],
+    }]}
+
+
+class SpanExporter:
+    """
+    Background thread writing finished spans to local files in batches, so exporting
+    never blocks a chat turn: `spans.jsonl` (one span per line) and/or `spans.otlp.jsonl`
+    (one OTLP/JSON request per batch). When the queue is full, spans are dropped and counted.
+    """
+
+    def __init__(self,
+                 exporters: List[str],
+                 trace_dir: str = TRACE_DIR,
+                 max_bytes: int = int(TRACE_FILE_MAX_MB * 1024 * 1024)):
+        self.exporters = exporters
+        self.trace_dir = trace_dir
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        os.makedirs(trace_dir, exist_ok=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            try:
+                batch = [self._queue.get(timeout=TRACE_FLUSH_SECONDS)]
+            except queue.Empty:
+                continue
+            while len(batch) < TRACE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception("Failed to export %d spans", len(batch))
+
+    def _append(self, filename: str, lines: List[str]) -> None:
+        path = os.path.join(self.trace_dir, filename)
+        if os.path.exists(path) and os.path.getsize(path) > self.max_bytes:
+            os.replace(path, f"{path}.1")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+
+    def _write(self, batch: List[Span]) -> None:
+        if "jsonl" in self.exporters:
+            self._append("spans.jsonl", [json.dumps(span.to_dict(), ensure_ascii=False, default=str) for span in batch])
+        if "otlp" in self.exporters:
+            self._append("spans.otlp.jsonl", [json.dumps(to_otlp_json(batch), ensure_ascii=False, default=str)])
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+_histogram = LatencyHistogram()
+
+
+@lru_cache()
+def get_span_exporter() -> Optional[SpanExporter]:
+    exporters = get_trace_exporters()
+    return SpanExporter(exporters) if exporters else None
+
+
+def get_stage_histogram() -> LatencyHistogram:
+    return _histogram
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def now_ns() -> int:
+    return time.time_ns()
+
+
+def _new_span(name: str, parent: Optional[Span], attributes: dict) -> Span:
+    return Span(
+        name=name,
+        trace_id=parent.trace_id if parent else secrets.token_hex(16),
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        attributes=attributes,
+    )
+
+
+def _finish(span: Span) -> None:
+    _histogram.observe(span.name, span.duration_seconds, error=span.error is not None)
+    exporter = get_span_exporter()
+    if exporter is not None:
+        exporter.submit(span)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """
+    Time the enclosed block as a child of the current span (or a new trace). The span is
+    current for the block, also in threads started with a copy of the context.
+    """
+    current = _new_span(name, _current_span.get(), attributes)
+    if not is_tracing_enabled():
+        yield current
+        return
+    token = _current_span.set(current)
+    started = time.perf_counter_ns()
+    current.start_ns = time.time_ns()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = current.start_ns + time.perf_counter_ns() - started
+        _current_span.reset(token)
+        _finish(current)
+
+
+def record_span(name: str,
+                start_ns: int,
+                end_ns: Optional[int] = None,
+                parent: Optional[Span] = None,
+                error: Optional[BaseException] = None,
+                **attributes) -> Optional[Span]:
+    """Record a step timed by the caller (e.g. from callbacks), under `parent` or the current span"""
+    if not is_tracing_enabled():
+        return None
+    finished = _new_span(name, parent or _current_span.get(), attributes)
+    finished.start_ns = start_ns
+    finished.end_ns = end_ns if end_ns is not None else time.time_ns()
+    if error is not None:
+        finished.error = f"{type(error).__name__}: {error}"
+    _finish(finished)
+    return finished
@@ -0,0 +1,200 @@
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .chatbot import answer_prompt, render_incident_prompt
+from .db_crud import (
+    get_incident_by_id,
+    get_kb_version,
+    list_incidents_to_triage,
+    set_incident_triage,
+)
+from .db_orm import get_session
+from .prepare_vectordb import add_knowledge_base_listener, open_vectorstore_user
+from .sla_scheduler import get_sla_due_at
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+TRIAGE_WORKERS         = int(os.getenv("TRIAGE_WORKERS", 2))
+TRIAGE_USERNAME        = os.getenv("TRIAGE_USERNAME", "admin")  # whose knowledge base answers incidents
+TRIAGE_RECOMPUTE_DELAY = 30.0  # coalesces bursts of knowledge base changes
+TRIAGE_POLL_SECONDS    = 60.0  # picks up incidents queued by other processes
+TRIAGE_OUTDATED_LIMIT  = int(os.getenv("TRIAGE_OUTDATED_LIMIT", 20))  # outdated answers re-queued per poll
+
+
+def is_triage_enabled() -> bool:
+    return os.getenv("INCIDENT_TRIAGE", "TRUE") == "TRUE"
+
+
+def is_retriage_on_kb_change_enabled() -> bool:
+    return os.getenv("TRIAGE_ON_KB_CHANGE", "FALSE") == "TRUE"
+
+
+class TriageWorker:
+    """
+    Bounded pool of threads that precompute AI answers for open incidents.
+
+    Incidents are served earliest SLA deadline first. The answer is stored on
+    the incident together with the knowledge base version it was based on.
+    With TRIAGE_ON_KB_CHANGE, answers based on an older knowledge base are
+    recomputed, at most `outdated_limit` per poll so that a busy knowledge base
+    does not turn into a flood of model calls.
+    """
+
+    def __init__(self,
+                 workers: int = TRIAGE_WORKERS,
+                 username: str = TRIAGE_USERNAME,
+                 retriage_on_kb_change: Optional[bool] = None,
+                 outdated_limit: int = TRIAGE_OUTDATED_LIMIT):
+        self.username = username
+        if retriage_on_kb_change is None:
+            retriage_on_kb_change = is_retriage_on_kb_change_enabled()
+        self.retriage_on_kb_change = retriage_on_kb_change
+        self.outdated_limit = outdated_limit
+        self._queue: "queue.PriorityQueue[Tuple[datetime, int, str]]" = queue.PriorityQueue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._seq = itertools.count()  # tie-breaker for equal deadlines
+        self._recompute_timer: Optional[threading.Timer] = None
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"triage-{i}", daemon=True)
+            for i in range(max(workers, 1))
+        ]
+        self._poller = threading.Thread(target=self._poll, name="triage-poll", daemon=True)
+
+    def start(self) -> "TriageWorker":
+        if self.retriage_on_kb_change:
+            add_knowledge_base_listener(self._on_knowledge_base_changed)
+        # Resume triage interrupted by a restart (and refresh answers based on an older knowledge base)
+        self.enqueue_stale()
+        for thread in self._threads:
+            thread.start()
+        self._poller.start()
+        return self
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        for _ in self._threads:
+            self._queue.put((datetime.max, next(self._seq), ""))
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def submit(self, incident_id: str, due_at: datetime) -> None:
+        with self._lock:
+            if incident_id in self._queued:
+                return
+            self._queued.add(incident_id)
+        self._queue.put((due_at, next(self._seq), incident_id))
+
+    def submit_many(self, entries: List[Tuple[str, datetime]]) -> None:
+        for incident_id, due_at in entries:
+            self.submit(incident_id, due_at)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._queued)
+
+    def enqueue_stale(self) -> int:
+        with get_session() as session:
+            kb_version = get_kb_version(self.username, session) if self.retriage_on_kb_change else None
+            rows = list_incidents_to_triage(kb_version, self.outdated_limit, session)
+        self.submit_many([
+            (incident_id, get_sla_due_at(created_at, sla_no_of_hours))
+            for incident_id, created_at, sla_no_of_hours in rows
+        ])
+        return len(rows)
+
+    def _on_knowledge_base_changed(self, username: str, version: int) -> None:
+        if username != self.username:
+            return
+        # Several documents are often added in a row; recompute once afterwards
+        with self._lock:
+            if self._recompute_timer is not None:
+                self._recompute_timer.cancel()
+            self._recompute_timer = threading.Timer(TRIAGE_RECOMPUTE_DELAY, self.enqueue_stale)
+            self._recompute_timer.daemon = True
+            self._recompute_timer.start()
+
+    def _poll(self):
+        while not self._stop.wait(TRIAGE_POLL_SECONDS):
+            try:
+                self.enqueue_stale()
+            except Exception:
+                logger.exception("Failed to look up incidents to triage")
+
+    def _worker(self):
+        vectordb = None
+        while not self._stop.is_set():
+            _, _, incident_id = self._queue.get()
+            if not incident_id:
+                continue
+            try:
+                if vectordb is None:
+                    vectordb = open_vectorstore_user(self.username)
+                self.triage(incident_id, vectordb)
+            except Exception:
+                logger.exception("Triage failed for incident %s", incident_id)
+            finally:
+                with self._lock:
+                    self._queued.discard(incident_id)
+
+    def triage(self, incident_id: str, vectordb) -> None:
+        with get_session() as session:
+            incident = get_incident_by_id(incident_id, session)
+            if incident is None or incident.status != "open":
+                return
+            kb_version = get_kb_version(self.username, session)
+            if incident.triage_status == "done" and incident.triage_kb_version == kb_version:
+                return
+            set_incident_triage(incident_id, "running", session=session)
+            prompt = render_incident_prompt(incident)
+
+        try:
+            answer, used_images = answer_prompt(prompt, vectordb, username=self.username)
+        except Exception:
+            logger.exception("Triage failed for incident %s", incident_id)
+            # Retried when the knowledge base changes, not on every poll
+            with get_session() as session:
+                set_incident_triage(incident_id, "failed", kb_version=kb_version, session=session)
+            return
+        with get_session() as session:
+            set_incident_triage(
+                incident_id,
+                "done",
+                answer=answer,
+                images_json=json.dumps(used_images) if used_images else None,
+                kb_version=kb_version,
+                session=session,
+            )
+
+
+@lru_cache()
+def get_triage_worker() -> TriageWorker:
+    """Process-wide triage pool; interrupted and outdated triage is resumed on first use."""
+    return TriageWorker().start()
+
+
+def start_incident_triage() -> None:
+    if is_triage_enabled():
+        get_triage_worker()
+
+
+def triage_incident_in_background(incident_id: str, due_at: datetime) -> None:
+    """Mark a new incident as pending and queue it for triage"""
+    if not is_triage_enabled():
+        return
+    with get_session() as session:
+        set_incident_triage(incident_id, "pending", session=session)
+    get_triage_worker().submit(incident_id, due_at)
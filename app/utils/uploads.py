@@ -0,0 +1,67 @@
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Constants ---
+UPLOAD_CHUNK_SIZE    = 1024 * 1024  # bytes copied per read, bounding memory per upload
+MAX_UPLOAD_BYTES     = int(os.getenv("MAX_UPLOAD_MB", 500)) * 1024 * 1024
+USER_QUOTA_BYTES     = int(os.getenv("USER_QUOTA_MB", 5000)) * 1024 * 1024
+
+
+@dataclass
+class SavedUpload:
+    path: str
+    size: int
+    sha256: str
+
+
+def get_docs_usage(docs_dir: str) -> int:
+    """Bytes used by the files in a user's docs folder (extracted images not counted)"""
+    if not os.path.isdir(docs_dir):
+        return 0
+    return sum(entry.stat().st_size for entry in os.scandir(docs_dir) if entry.is_file())
+
+
+def _format_mb(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+def save_upload(fileobj: BinaryIO,
+                path: str,
+                max_bytes: int = MAX_UPLOAD_BYTES) -> SavedUpload:
+    """
+    Copy `fileobj` to `path` in UPLOAD_CHUNK_SIZE pieces, hashing as it goes. The data
+    goes to a temporary file in the same folder, renamed into place once complete, so
+    `path` never holds a partial upload. Raises ValueError beyond `max_bytes`.
+    """
+    name = os.path.basename(path)
+    declared_size = getattr(fileobj, "size", None)
+    if declared_size is not None and declared_size > max_bytes:
+        raise ValueError(f"{name} is {_format_mb(declared_size)}, over the {_format_mb(max_bytes)} limit")
+
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        if hasattr(fileobj, "seek"):
+            fileobj.seek(0)
+        with os.fdopen(fd, "wb") as f:
+            for block in iter(lambda: fileobj.read(UPLOAD_CHUNK_SIZE), b""):
+                size += len(block)
+                if size > max_bytes:
+                    raise ValueError(f"{name} is over the {_format_mb(max_bytes)} limit")
+                digest.update(block)
+                f.write(block)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return SavedUpload(path=path, size=size, sha256=digest.hexdigest())
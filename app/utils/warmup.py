@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from .db_crud import list_recently_active_users
+from .db_orm import get_session, utcnow
+from .metrics import register_gauge
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+WARMUP_RECENT_USERS = int(os.getenv("WARMUP_RECENT_USERS", 5))
+WARMUP_ACTIVE_DAYS  = float(os.getenv("WARMUP_ACTIVE_DAYS", 7))
+WARMUP_OCR_LANGS    = [lang.strip() for lang in os.getenv("WARMUP_OCR_LANGS", "").split(",") if lang.strip()]
+
+
+def is_warmup_enabled() -> bool:
+    return os.getenv("STARTUP_WARMUP", "TRUE") == "TRUE"
+
+
+@dataclass
+class WarmupStatus:
+    state: str = "pending"  # pending, running, ready (also when some steps failed) or disabled
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    users: List[str] = field(default_factory=list)
+    step_seconds: Dict[str, float] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ready(self) -> bool:
+        return self.state in ("ready", "disabled")
+
+    @property
+    def duration_seconds(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+
+class Warmup:
+    """
+    One background thread that pays the cold-start costs before the first user does:
+    imports and client set-up for Chroma and the embedding model, the vector indexes of
+    recently active users (by chat history), and optionally the PaddleOCR models.
+
+    Each step is timed and may fail on its own; the app works either way, only slower.
+    """
+
+    def __init__(self,
+                 recent_users: int = WARMUP_RECENT_USERS,
+                 active_days: float = WARMUP_ACTIVE_DAYS,
+                 ocr_langs: List[str] = WARMUP_OCR_LANGS):
+        self.recent_users = recent_users
+        self.active_days = active_days
+        self.ocr_langs = ocr_langs
+        self.status = WarmupStatus()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+
+    def start(self) -> "Warmup":
+        if not is_warmup_enabled():
+            self.status.state = "disabled"
+            self._done.set()
+            return self
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.status.state,
+                "ready": self.status.ready,
+                "duration_seconds": self.status.duration_seconds,
+                "users": list(self.status.users),
+                "step_seconds": dict(self.status.step_seconds),
+                "errors": dict(self.status.errors),
+            }
+
+    def _step(self, name: str, func: Callable[[], object]) -> object:
+        """Run and time one step; its result, or None if it failed"""
+        started = time.monotonic()
+        try:
+            return func()
+        except Exception as e:
+            message = f"{type(e).__name__}: {(str(e).splitlines() or [''])[0]}"
+            logger.warning("Warm-up step %s failed: %s", name, message)
+            with self._lock:
+                self.status.errors[name] = message
+            return None
+        finally:
+            with self._lock:
+                self.status.step_seconds[name] = round(time.monotonic() - started, 3)
+
+    def _recent_users(self) -> List[str]:
+        with get_session() as session:
+            return list_recently_active_users(utcnow() - timedelta(days=self.active_days), self.recent_users, session)
+
+    def _run(self):
+        # Imported here: these modules are what the warm-up loads, off the page's import path
+        from .prepare_vectordb import get_embedding_function, warm_vectorstore_user
+
+        with self._lock:
+            self.status.state = "running"
+            self.status.started_at = time.monotonic()
+        try:
+            self._step("embedding_client", lambda: get_embedding_function().embed_query("warm-up"))
+
+            for username in self._step("recent_users", self._recent_users) or []:
+                if self._step(f"vectorstore_{username}", lambda: warm_vectorstore_user(username)):
+                    with self._lock:
+                        self.status.users.append(username)
+
+            if self.ocr_langs:
+                from .pdf_loader import get_ocr
+
+                for lang in self.ocr_langs:
+                    self._step(f"ocr_{lang}", lambda: get_ocr(lang))
+        finally:
+            with self._lock:
+                self.status.state = "ready"
+                self.status.finished_at = time.monotonic()
+            self._done.set()
+        status = self.snapshot()
+        logger.info("Warm-up ready in %.1fs: %d user indexes, steps %s, errors %s",
+                    status["duration_seconds"], len(status["users"]), status["step_seconds"], status["errors"] or "none")
+
+
+@lru_cache()
+def get_warmup() -> Warmup:
+    """Process-wide warm-up; started on first call, runs once"""
+    warmup = Warmup()
+    register_gauge("warmup_ready", "1 once the startup warm-up has finished", lambda: float(warmup.status.ready))
+    register_gauge("warmup_duration_seconds", "Time the startup warm-up took (so far)",
+                   lambda: warmup.status.duration_seconds)
+    return warmup.start()
+
+
+def start_warmup() -> None:
+    get_warmup()
+
+
+def get_warmup_status() -> dict:
+    """Readiness flag and timings of the startup warm-up"""
+    return get_warmup().snapshot()
@@ -0,0 +1,135 @@
+"""
+Crawl throughput: sequential `requests` crawl (previous implementation) vs the async crawler,
+then incremental recrawls after changing a few pages, with conditional GETs only and with
+sitemap lastmod.
+
+    python benchmarks/crawl_benchmark.py --pages 200 --latency 0.05 --changed 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Crawl records go to a throwaway database, never the app's
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'crawl_benchmark.db')}"
+
+from app.utils.crawler import (  # noqa: E402
+    USER_AGENT,
+    Crawler,
+    extract_all_visible_text,
+    extract_same_domain_links,
+)
+from app.utils.db_orm import create_all_tables  # noqa: E402
+from benchmarks.http_fixture import build_site, serve_site  # noqa: E402
+
+BENCHMARK_USER = "crawl-benchmark"
+
+
+def sequential_crawl(start_url: str, page_limit: int, docs_dir: str) -> int:
+    """One blocking requests.get per page with whole-body reads, as before the async crawler"""
+    frontier, visited, fetched = deque([start_url]), set(), 0
+    while frontier and len(visited) < page_limit:
+        url = frontier.popleft()
+        if url in visited:
+            continue
+        visited.add(url)
+        resp = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=10)
+        if resp.status_code != 200:
+            continue
+        fetched += 1
+        path = os.path.join(docs_dir, f"{fetched}.bin")
+        if url.endswith(".pdf"):
+            with open(path, "wb") as f:
+                f.write(resp.content)
+            continue
+        html = resp.content.decode(resp.encoding or "utf-8", errors="replace")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(extract_all_visible_text(html))
+        frontier.extend(extract_same_domain_links(html, url))
+    return fetched
+
+
+def _lastmod(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def change_pages(site: dict, paths: list, revision: int) -> None:
+    for path in paths:
+        ctype, body = site[path]
+        site[path] = (ctype, body.replace(b"</main>", f"<p>Revision {revision}: updated procedure.</p></main>".encode()))
+
+
+def timed_crawl(crawler: Crawler, start_url: str, status_counts: Counter, label: str) -> None:
+    status_counts.clear()
+    started = time.perf_counter()
+    results = crawler.run([start_url])
+    elapsed = time.perf_counter() - started
+    written = sum(1 for result in results if result.filename)
+    updated = sum(1 for result in results if result.updated)
+    unchanged = sum(1 for result in results if result.unchanged)
+    print(f"{label:<20}: {len(results):4d} pages in {elapsed:6.2f}s, {written} written ({updated} updated),"
+          f" {unchanged} unchanged; responses {dict(sorted(status_counts.items()))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated server latency per request (s)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--per-host", type=int, default=8)
+    parser.add_argument("--changed", type=int, default=10, help="pages changed before each recrawl")
+    args = parser.parse_args()
+
+    create_all_tables()
+    site = build_site(pages=args.pages)
+    html_paths = [path for path, (ctype, _) in site.items() if ctype.startswith("text/html") and "private" not in path]
+    sitemap = {}  # empty until the sitemap recrawl
+    status_counts = Counter()
+    with serve_site(site, latency=args.latency, sitemap=sitemap, status_counts=status_counts) as base_url:
+        with tempfile.TemporaryDirectory() as docs_dir:
+            started = time.perf_counter()
+            fetched = sequential_crawl(base_url + "/", args.pages, docs_dir)
+            elapsed = time.perf_counter() - started
+            print(f"sequential requests : {fetched:4d} pages in {elapsed:6.2f}s = {fetched / elapsed:7.1f} pages/s")
+
+        with tempfile.TemporaryDirectory() as docs_dir:
+            def new_crawler() -> Crawler:
+                return Crawler(
+                    docs_dir,
+                    crawl_links=True,
+                    page_limit=args.pages,
+                    concurrency=args.concurrency,
+                    per_host=args.per_host,
+                    delay=0.0,
+                    username=BENCHMARK_USER,
+                )
+
+            started = time.perf_counter()
+            results = new_crawler().run([base_url + "/"])
+            elapsed = time.perf_counter() - started
+            fetched = sum(1 for result in results if not result.error)
+            blocked = sum(1 for result in results if "robots" in result.error)
+            print(f"async crawler       : {fetched:4d} pages in {elapsed:6.2f}s = {fetched / elapsed:7.1f} pages/s"
+                  f" ({blocked} blocked by robots.txt)")
+
+            change_pages(site, html_paths[1:args.changed + 1], revision=1)
+            timed_crawl(new_crawler(), base_url + "/", status_counts, "recrawl (304s)")
+
+            # Sitemap says only the newly changed pages were modified after the last crawl
+            changed = html_paths[args.changed + 1:2 * args.changed + 1]
+            change_pages(site, changed, revision=2)
+            now = datetime.now(tz=timezone.utc)
+            sitemap.update({path: _lastmod(now - timedelta(days=1)) for path in html_paths})
+            sitemap.update({path: _lastmod(now + timedelta(seconds=1)) for path in changed})
+            timed_crawl(new_crawler(), base_url + "/", status_counts, "recrawl (sitemap)")
+
+
+if __name__ == "__main__":
+    main()
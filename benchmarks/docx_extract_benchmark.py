@@ -0,0 +1,139 @@
+"""
+DOCX extraction: python-docx object model with per-run XPath queries (previous implementation)
+vs the single-pass iterparse loader. Reports time, peak Python memory (tracemalloc) and output.
+
+    python benchmarks/docx_extract_benchmark.py --sections 300
+    python benchmarks/docx_extract_benchmark.py --docx manual.docx
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from docx import Document as DocxDocument
+from docx.oxml.ns import qn
+from docx.shared import Inches
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.utils.docx_loader import load_text_from_docx_file  # noqa: E402
+
+NS = {
+    "w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main",
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "v": "urn:schemas-microsoft-com:vml",
+}
+
+
+def python_docx_text(filepath: str) -> str:
+    """Previous extractor: paragraphs and images only (tables were skipped)"""
+    img_dir = os.path.join(os.path.dirname(filepath), "images", os.path.basename(filepath))
+    os.makedirs(img_dir, exist_ok=True)
+    doc = DocxDocument(filepath)
+    rels = doc.part.rels
+    text_list = []
+    img_counter = 0
+
+    def _save_image(rid: str):
+        nonlocal img_counter
+        img_counter += 1
+        img_name = f"image_{img_counter}.png"
+        with open(os.path.join(img_dir, img_name), "wb") as f:
+            f.write(rels[rid].target_part.blob)
+        text_list.append(f"[IMAGE:{img_name}]")
+
+    for para in doc.paragraphs:
+        para_text = ""
+        for run in para.runs:
+            if run.text:
+                para_text += run.text
+            drawings = run._element.findall(".//w:drawing", namespaces=NS)
+            picts = run._element.findall(".//w:pict", namespaces=NS)
+            for drawing in drawings:
+                para_text = para_text.strip()
+                if para_text:
+                    text_list.append(para_text)
+                    para_text = ""
+                for blip in drawing.findall(".//a:blip", namespaces=NS):
+                    if blip.get(qn("r:embed")):
+                        _save_image(blip.get(qn("r:embed")))
+            for pict in picts:
+                para_text = para_text.strip()
+                if para_text:
+                    text_list.append(para_text)
+                    para_text = ""
+                for img in pict.findall(".//v:imagedata", namespaces=NS):
+                    if img.get(qn("r:id")):
+                        _save_image(img.get(qn("r:id")))
+        para_text = para_text.strip()
+        if para_text:
+            text_list.append(para_text)
+    return "\n\n".join(text_list)
+
+
+def streaming_text(filepath: str) -> str:
+    return load_text_from_docx_file(filepath)[0].page_content
+
+
+def build_docx(path: str, sections: int, work_dir: str) -> None:
+    """Manual-like document: headings, paragraphs with several runs, a spec table and a figure per section"""
+    figures = []
+    for i in range(5):
+        figure = os.path.join(work_dir, f"figure_{i}.png")
+        Image.new("RGB", (800, 500), (40 * i, 90, 160)).save(figure)
+        figures.append(figure)
+
+    doc = DocxDocument()
+    for s in range(sections):
+        doc.add_heading(f"{s + 1}. Terminal maintenance procedure {s + 1}", level=2)
+        for k in range(12):
+            para = doc.add_paragraph(f"{s}.{k} Check the VSAT modem status LED ")
+            para.add_run("and the BUC power ").bold = True
+            para.add_run("before restarting the terminal; record the readings in the site log.")
+        table = doc.add_table(rows=6, cols=4)
+        for r in range(6):
+            for c in range(4):
+                table.cell(r, c).text = f"param {r}.{c}" if r else f"Column {c}"
+        doc.add_picture(figures[s % len(figures)], width=Inches(4))
+    doc.save(path)
+
+
+def measure(label: str, extract, path: str) -> None:
+    started = time.perf_counter()
+    text = extract(path)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    extract(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<22}: {elapsed:6.2f}s, peak {peak / 2 ** 20:7.1f} MiB, {len(text):>9} chars, "
+          f"{text.count('[IMAGE:')} image placeholders")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sections", type=int, default=300, help="sections of the generated manual")
+    parser.add_argument("--docx", help="benchmark this document instead of a generated one")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(work_dir, "manual.docx")
+        if args.docx:
+            shutil.copy(args.docx, path)
+        else:
+            build_docx(path, args.sections, work_dir)
+        print(f"{os.path.basename(args.docx or path)}: {os.path.getsize(path) / 2 ** 20:.1f} MiB")
+        measure("python-docx + XPath", python_docx_text, path)
+        measure("iterparse single pass", streaming_text, path)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Excel extraction: `pd.read_excel(sheet_name=None)` + `to_string` (previous implementation) vs the
+streaming row-group loader. Reports time, peak Python memory (tracemalloc) and characters produced.
+
+    python benchmarks/excel_extract_benchmark.py --rows 50000
+    python benchmarks/excel_extract_benchmark.py --xlsx inventory.xlsx
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.utils.excel_loader import load_text_from_excel_file  # noqa: E402
+
+COLUMNS = ["Site", "Equipment", "Model", "Serial", "IP address", "Firmware",
+           "Installed", "Status", "Rack", "Owner", "Notes"]
+
+
+def build_workbook(path: str, rows: int, sheets: int = 3) -> None:
+    """Equipment-inventory-like workbook, written in write-only mode"""
+    workbook = openpyxl.Workbook(write_only=True)
+    started = datetime(2020, 1, 1)
+    for s in range(sheets):
+        sheet = workbook.create_sheet(f"Region {s + 1}")
+        sheet.append(COLUMNS)
+        for i in range(rows // sheets):
+            sheet.append([
+                f"SITE-{i % 400:04d}", "VSAT modem" if i % 3 else "BUC", f"MDM-{i % 7}000",
+                f"SN{s}{i:08d}", f"10.{s}.{i // 256 % 256}.{i % 256}", f"4.{i % 5}.{i % 11}",
+                started + timedelta(days=i % 1500), "active" if i % 9 else "spare",
+                f"R{i % 40}-U{i % 42}", f"team-{i % 12}",
+                "" if i % 4 else "PSU replaced after repeated brown-outs, see maintenance ticket " + str(i),
+            ])
+    workbook.save(path)
+
+
+def pandas_text(path: str) -> str:
+    text = ""
+    for sheet, data in pd.read_excel(path, sheet_name=None).items():
+        text += f"Sheet: {sheet}\n"
+        text += data.to_string(index=False)
+        text += "\n\n"
+    return text
+
+
+def streaming_text(path: str) -> str:
+    return "\n\n".join(doc.page_content for doc in load_text_from_excel_file(path))
+
+
+def measure(label: str, extract, path: str) -> None:
+    started = time.perf_counter()
+    text = extract(path)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    extract(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<22}: {elapsed:6.2f}s, peak {peak / 2 ** 20:7.1f} MiB, {len(text):>10} chars")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000, help="data rows of the generated workbook")
+    parser.add_argument("--xlsx", help="benchmark this workbook instead of a generated one")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(work_dir, "inventory.xlsx")
+        if args.xlsx:
+            shutil.copy(args.xlsx, path)
+        else:
+            build_workbook(path, args.rows)
+        measure("pandas + to_string", pandas_text, path)
+        measure("streaming row groups", streaming_text, path)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Local HTTP site used by the crawler benchmarks."""
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional
+
+
+def build_site(pages: int = 200, links_per_page: int = 5, pdf_every: int = 20, pdf_kb: int = 256) -> Dict[str, tuple]:
+    """path -> (content type, body) for a site where every page is reachable from /"""
+    site = {
+        "/robots.txt": ("text/plain", b"User-agent: *\nDisallow: /private/\n"),
+        "/private/secret.html": ("text/html", b"<html><body>secret</body></html>"),
+    }
+    nav = "".join(f'<li><a href="/section/{s}.html">Section {s}</a></li>' for s in range(10))
+    for i in range(pages):
+        links = "".join(
+            f'<a href="/page/{(i * links_per_page + j + 1) % pages}.html">Page {(i * links_per_page + j + 1) % pages}</a> '
+            for j in range(links_per_page)
+        )
+        pdf_link = f'<a href="/docs/{i}.pdf">Manual {i}</a>' if i % pdf_every == 0 else ""
+        body = (
+            f"<html><head><title>Page {i}</title><style>p {{color: red}}</style></head><body>"
+            f"<header><nav><ul>{nav}</ul></nav></header>"
+            f"<main><h1>Page {i}</h1>"
+            + "".join(f"<p>Paragraph {k} of page {i}: VSAT terminal troubleshooting step {k}.</p>" for k in range(20))
+            + f"<p>{links} {pdf_link} <a href='/private/secret.html'>secret</a></p></main>"
+            f"<footer>Copyright VSAT Operations Center. All rights reserved.</footer></body></html>"
+        )
+        site["/" if i == 0 else f"/page/{i}.html"] = ("text/html; charset=utf-8", body.encode("utf-8"))
+        if i % pdf_every == 0:
+            site[f"/docs/{i}.pdf"] = ("application/pdf", b"%PDF-1.4\n" + b"0" * (pdf_kb * 1024))
+    return site
+
+
+@contextmanager
+def serve_site(site: Dict[str, tuple],
+               latency: float = 0.0,
+               sitemap: Optional[Dict[str, str]] = None,
+               status_counts: Optional[Counter] = None) -> Iterator[str]:
+    """
+    Serve `site` on a free localhost port; yields the base URL. `latency` simulates a remote server.
+    `sitemap` (path -> lastmod) is served as /sitemap.xml; `status_counts` counts responses by status.
+    """
+    mtime = formatdate(time.time() - 3600, usegmt=True)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            path = self.path.split("?")[0]
+            entry = site.get(path)
+            if path == "/sitemap.xml" and sitemap is not None:
+                base = f"http://{self.headers.get('Host')}"
+                urls = "".join(
+                    f"<url><loc>{base}{page}</loc><lastmod>{lastmod}</lastmod></url>"
+                    for page, lastmod in sitemap.items()
+                )
+                entry = ("application/xml", (
+                    '<?xml version="1.0" encoding="UTF-8"?>'
+                    f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+                ).encode("utf-8"))
+            if entry is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            ctype, body = entry
+            etag = f'"{zlib.crc32(body):x}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", mtime)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_response(self, code, message=None):
+            if status_counts is not None:
+                status_counts[code] += 1
+            super().send_response(code, message)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        def handle_error(self, request, client_address):
+            pass  # clients aborting oversized downloads are expected
+
+    server = Server(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
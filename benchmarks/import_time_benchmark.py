@@ -0,0 +1,86 @@
+"""
+Cold-start import cost of the chat page (`python -X importtime`), which has to finish before the
+first render. Document extractors (PyMuPDF, lxml, openpyxl, xlrd, PaddleOCR...) should not show up:
+the loader registry imports them when a file of their format is processed.
+
+    python benchmarks/import_time_benchmark.py
+    python benchmarks/import_time_benchmark.py --module app.utils.chat_app --runs 5 --target-ms 2500
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Top-level packages that only document processing needs
+EXTRACTION_PACKAGES = ["fitz", "pymupdf", "openpyxl", "xlrd", "lxml", "docx", "spire", "paddleocr",
+                       "paddle", "cv2", "pandas", "PIL", "chromadb", "unstructured"]
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure_imports(module: str) -> Tuple[int, Dict[str, int]]:
+    """Total wall time (us) of importing `module` in a fresh interpreter, and cumulative us per top-level package"""
+    env = dict(os.environ)
+    # The app opens its database on import; keep it away from the real one
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'import_benchmark.db')}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    total = 0
+    packages: Dict[str, int] = defaultdict(int)
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        if indent == 1:
+            # Outermost imports only; nested ones are already in their parent's cumulative time
+            total += cumulative
+        packages[name.split(".")[0]] = max(packages[name.split(".")[0]], cumulative)
+    return total, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.utils.chat_app", help="module the page imports")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters to measure (median reported)")
+    parser.add_argument("--top", type=int, default=15, help="slowest top-level packages to list")
+    parser.add_argument("--target-ms", type=float, default=2500,
+                        help="first-page render budget for the import; exit status 1 above it")
+    args = parser.parse_args()
+
+    totals: List[int] = []
+    packages: Dict[str, int] = {}
+    for _ in range(max(args.runs, 1)):
+        total, packages = measure_imports(args.module)
+        totals.append(total)
+    median_ms = statistics.median(totals) / 1000
+
+    print(f"import {args.module}: median {median_ms:.0f} ms over {len(totals)} runs "
+          f"(min {min(totals) / 1000:.0f}, max {max(totals) / 1000:.0f})")
+    print("\nSlowest top-level packages (cumulative ms, last run):")
+    for name, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<28}{cumulative / 1000:8.1f}")
+
+    loaded = [name for name in EXTRACTION_PACKAGES if name in packages]
+    print(f"\nExtraction packages imported at start: {', '.join(loaded) if loaded else 'none'}")
+
+    if median_ms > args.target_ms:
+        print(f"Over the {args.target_ms:.0f} ms target")
+        sys.exit(1)
+    print(f"Within the {args.target_ms:.0f} ms target")
+
+
+if __name__ == "__main__":
+    main()
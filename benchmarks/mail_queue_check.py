@@ -0,0 +1,199 @@
+"""
+Delivery checks for the outbound mail queue against a local SMTP server: plain delivery,
+retry with backoff, giving up after the last attempt, no double sends across workers,
+requeueing emails left in "sending" by a crash, and reconnecting after the server drops
+the connection.
+
+    python benchmarks/mail_queue_check.py
+"""
+import os
+import smtplib
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Queued emails go to a throwaway database, never the app's
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'mail_queue_check.db')}"
+
+from sqlalchemy import delete, update  # noqa: E402
+
+from app.utils.db_crud import create_incident  # noqa: E402
+from app.utils.db_orm import (  # noqa: E402
+    Incident,
+    IncidentSlaCheck,
+    OutboundEmail,
+    create_all_tables,
+    get_session,
+    utcnow,
+)
+from app.utils.mail_queue import RENOTIFY_SECONDS, MailQueue, get_backoff_delay  # noqa: E402
+from benchmarks.smtp_fixture import SmtpMailbox, serve_smtp  # noqa: E402
+
+
+def _emails(count: int, prefix: str, incident_ids=()) -> list:
+    return [
+        {"recipient": f"{prefix}-{i}@example.com", "subject": f"{prefix} {i}", "body": "<p>check</p>",
+         "incident_ids": list(incident_ids)}
+        for i in range(count)
+    ]
+
+
+def _outbound() -> list:
+    with get_session() as session:
+        return session.query(OutboundEmail).order_by(OutboundEmail.recipient).all()
+
+
+def _wait_until(predicate, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return predicate()
+
+
+def _statuses() -> dict:
+    counts = {}
+    for email in _outbound():
+        counts[email.status] = counts.get(email.status, 0) + 1
+    return counts
+
+
+def _reset() -> None:
+    with get_session() as session:
+        session.execute(delete(OutboundEmail))
+        session.commit()
+
+
+def _factory(port: int):
+    return lambda: smtplib.SMTP("127.0.0.1", port, timeout=10)
+
+
+def check(name: str, condition: bool, detail: str = "") -> bool:
+    print(f"{'ok  ' if condition else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+    return condition
+
+
+def check_delivery() -> bool:
+    mailbox = SmtpMailbox()
+    with serve_smtp(mailbox) as port:
+        queue = MailQueue(workers=1, smtp_factory=_factory(port)).start()
+        queue.enqueue(_emails(5, "deliver"))
+        _wait_until(lambda: _statuses() == {"sent": 5})
+        queue.stop()
+    received = sorted(mailbox.recipients())
+    return check("delivery", received == [f"deliver-{i}@example.com" for i in range(5)]
+                 and mailbox.connections == 1, f"{len(received)} received over {mailbox.connections} connection(s)")
+
+
+def check_retry_backoff() -> bool:
+    mailbox = SmtpMailbox(fail_next=1)
+    with serve_smtp(mailbox) as port:
+        queue = MailQueue(workers=1, smtp_factory=_factory(port)).start()
+        before = utcnow()
+        queue.enqueue(_emails(1, "retry"))
+        _wait_until(lambda: _outbound()[0].attempts == 1)
+        email = _outbound()[0]
+        delay = email.next_attempt_at - before
+        expected = get_backoff_delay(1)
+        ok = check("retry: failed send is requeued with backoff",
+                   email.status == "pending" and expected <= delay <= expected + timedelta(seconds=5),
+                   f"status {email.status}, retry in {delay.total_seconds():.0f}s, expected {expected.total_seconds():.0f}s")
+
+        # Make the retry due now instead of waiting out the backoff
+        with get_session() as session:
+            session.execute(update(OutboundEmail).values(next_attempt_at=utcnow()))
+            session.commit()
+        queue._wakeup.set()
+        _wait_until(lambda: _statuses() == {"sent": 1})
+        queue.stop()
+    email = _outbound()[0]
+    return check("retry: sent on the next attempt", email.status == "sent" and mailbox.recipients() == ["retry-0@example.com"],
+                 f"status {email.status}, attempts {email.attempts}") and ok
+
+
+def check_give_up() -> bool:
+    with get_session() as session:
+        incident = create_incident("Mail check", "Give-up check", "give-up-0@example.com", session=session)
+    mailbox = SmtpMailbox(fail_next=2)
+    with serve_smtp(mailbox) as port:
+        queue = MailQueue(workers=1, max_attempts=2, smtp_factory=_factory(port)).start()
+        queue.enqueue(_emails(1, "give-up", [incident.id]))
+        _wait_until(lambda: _outbound()[0].attempts == 1)
+        with get_session() as session:
+            session.execute(update(OutboundEmail).values(next_attempt_at=utcnow()))
+            session.commit()
+        queue._wakeup.set()
+        given_up_at = utcnow()
+        _wait_until(lambda: _statuses() == {"failed": 1})
+        queue.stop()
+    email = _outbound()[0]
+    with get_session() as session:
+        notified = session.get(Incident, incident.id).notified
+        check_row = session.get(IncidentSlaCheck, incident.id)
+    ok = check("give up after max attempts", email.status == "failed" and email.attempts == 2
+               and not notified and mailbox.recipients() == [],
+               f"status {email.status}, attempts {email.attempts}, incident notified {notified}")
+    # The incident must be notified again later, not wait for a restart
+    renotify_in = (check_row.due_at - given_up_at).total_seconds() if check_row else None
+    return check("give up: incident gets a new SLA check",
+                 renotify_in is not None and abs(renotify_in - RENOTIFY_SECONDS) < 5,
+                 f"notified again in {renotify_in:.0f}s" if renotify_in is not None else "no SLA check queued") and ok
+
+
+def check_claim() -> bool:
+    mailbox = SmtpMailbox()
+    with serve_smtp(mailbox) as port:
+        queue = MailQueue(workers=4, batch_size=5, smtp_factory=_factory(port)).start()
+        queue.enqueue(_emails(60, "claim"))
+        _wait_until(lambda: _statuses() == {"sent": 60}, timeout=30)
+        queue.stop()
+    received = mailbox.recipients()
+    return check("claim: every email sent exactly once with 4 workers",
+                 len(received) == 60 and len(set(received)) == 60, f"{len(received)} sends, {len(set(received))} distinct")
+
+
+def check_stuck_reset() -> bool:
+    # Emails a crashed process left in "sending"
+    mailbox = SmtpMailbox()
+    with serve_smtp(mailbox) as port:
+        idle = MailQueue(workers=0)
+        idle.enqueue(_emails(3, "stuck"))
+        with get_session() as session:
+            session.execute(update(OutboundEmail).values(status="sending"))
+            session.commit()
+        queue = MailQueue(workers=1, smtp_factory=_factory(port)).start()
+        _wait_until(lambda: _statuses() == {"sent": 3})
+        queue.stop()
+    return check("stuck sending emails are requeued on start", len(mailbox.recipients()) == 3,
+                 f"{len(mailbox.recipients())} of 3 sent")
+
+
+def check_reconnect() -> bool:
+    mailbox = SmtpMailbox(drop_after=2)
+    with serve_smtp(mailbox) as port:
+        queue = MailQueue(workers=1, smtp_factory=_factory(port)).start()
+        queue.enqueue(_emails(5, "reconnect"))
+        _wait_until(lambda: _statuses() == {"sent": 5})
+        queue.stop()
+    emails = _outbound()
+    return check("reconnect after the server drops the connection",
+                 len(mailbox.recipients()) == 5 and all(email.attempts == 0 for email in emails),
+                 f"{len(mailbox.recipients())} of 5 sent over {mailbox.connections} connections")
+
+
+def main() -> int:
+    create_all_tables()
+    results = []
+    for run in (check_delivery, check_retry_backoff, check_give_up, check_claim, check_stuck_reset, check_reconnect):
+        _reset()
+        results.append(run())
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
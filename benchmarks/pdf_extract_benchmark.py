@@ -0,0 +1,78 @@
+"""
+PDF extraction throughput: LangChain `PyPDFLoader` (previous loader, text only) vs the PyMuPDF
+loader, which also extracts embedded images as [IMAGE:name] placeholders.
+
+    python benchmarks/pdf_extract_benchmark.py --pages 200
+    python benchmarks/pdf_extract_benchmark.py --pdf manual.pdf
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import fitz
+from langchain_community.document_loaders import PyPDFLoader
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# The loader module opens the app database on import; keep it away from the real one
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pdf_benchmark.db')}"
+
+from app.utils.pdf_loader import load_text_from_pdf_file  # noqa: E402
+
+
+def build_pdf(path: str, pages: int, figure_every: int = 3) -> None:
+    """Manual-like PDF: a logo on every page, paragraphs of text, a figure every few pages"""
+    logo = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 120, 40), 0)
+    logo.clear_with(90)
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_image(fitz.Rect(40, 20, 160, 60), pixmap=logo)
+        text = "\n".join(
+            f"{i}.{k} Check the VSAT modem status LED and the BUC power before restarting the terminal."
+            for k in range(30)
+        )
+        page.insert_textbox(fitz.Rect(40, 80, 560, 520), text, fontsize=8)
+        if i % figure_every == 0:
+            figure = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 320, 200), 0)
+            figure.clear_with(i % 256)
+            page.insert_image(fitz.Rect(40, 540, 360, 740), pixmap=figure)
+    doc.save(path)
+
+
+def timed(label: str, load, path: str, pages: int) -> None:
+    started = time.perf_counter()
+    docs = load(path)
+    elapsed = time.perf_counter() - started
+    chars = sum(len(doc.page_content) for doc in docs)
+    images = len({name for doc in docs for name in doc.metadata.get("img_list", "").split(", ") if name})
+    print(f"{label:<14}: {pages / elapsed:7.1f} pages/s ({elapsed:6.2f}s), {chars} chars, {images} images")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200, help="pages of the generated PDF")
+    parser.add_argument("--pdf", help="benchmark this PDF instead of a generated one")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(work_dir, "manual.pdf")
+        if args.pdf:
+            shutil.copy(args.pdf, path)
+        else:
+            build_pdf(path, args.pages)
+        with fitz.open(path) as doc:
+            pages = doc.page_count
+
+        timed("PyPDFLoader", lambda p: PyPDFLoader(p).load(), path, pages)
+        timed("PyMuPDF", load_text_from_pdf_file, path, pages)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
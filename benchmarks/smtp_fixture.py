@@ -0,0 +1,113 @@
+"""Local SMTP server used by the mail queue checks."""
+import socketserver
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from email import message_from_string
+from typing import Iterator, List, Optional
+
+
+@dataclass
+class SmtpMailbox:
+    """
+    What the server received, and how it misbehaves: `fail_next` rejects that many
+    DATA commands with a temporary 451 error, `drop_after` closes every connection
+    after that many accepted messages (like a server dropping idle clients).
+    """
+    fail_next: int = 0
+    drop_after: Optional[int] = None
+    messages: List[dict] = field(default_factory=list)  # {sender, recipients, subject, to}
+    connections: int = 0
+    rejected: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def recipients(self) -> List[str]:
+        with self.lock:
+            return [rcpt for message in self.messages for rcpt in message["recipients"]]
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode("utf-8"))
+
+    def handle(self):
+        mailbox: SmtpMailbox = self.server.mailbox
+        with mailbox.lock:
+            mailbox.connections += 1
+        accepted = 0
+        sender, recipients = None, []
+        self._reply("220 localhost SMTP fixture")
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            command = line[:4].upper()
+            if command in ("EHLO", "HELO"):
+                self._reply("250 localhost")
+            elif command == "MAIL":
+                sender, recipients = line.split(":", 1)[1].strip().strip("<>"), []
+                self._reply("250 OK")
+            elif command == "RCPT":
+                recipients.append(line.split(":", 1)[1].strip().strip("<>"))
+                self._reply("250 OK")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data_line = self.rfile.readline().decode("utf-8", "replace")
+                    if data_line in (".\r\n", ".\n", ""):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith("..") else data_line)
+                with mailbox.lock:
+                    if mailbox.fail_next > 0:
+                        mailbox.fail_next -= 1
+                        mailbox.rejected += 1
+                        reject = True
+                    else:
+                        reject = False
+                        parsed = message_from_string("".join(lines))
+                        mailbox.messages.append({
+                            "sender": sender,
+                            "recipients": recipients,
+                            "subject": parsed["Subject"],
+                            "to": parsed["To"],
+                        })
+                if reject:
+                    self._reply("451 Temporary failure, try again later")
+                    continue
+                self._reply("250 OK queued")
+                accepted += 1
+                if mailbox.drop_after is not None and accepted >= mailbox.drop_after:
+                    return  # close without QUIT; the client sees SMTPServerDisconnected next time
+            elif command == "RSET":
+                sender, recipients = None, []
+                self._reply("250 OK")
+            elif command == "NOOP":
+                self._reply("250 OK")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+@contextmanager
+def serve_smtp(mailbox: SmtpMailbox) -> Iterator[int]:
+    """Serve SMTP on a free localhost port; yields the port"""
+
+    class Server(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    server = Server(("127.0.0.1", 0), _SmtpHandler)
+    server.mailbox = mailbox
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()